@@ -0,0 +1,96 @@
+import json
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class DecisionLog:
+    """ `fund-load --decisions` file: one json line per processed load with decision, reason and rule timings.
+        The main loop only appends to a deque, a writer thread appends whole batches to the file, so output
+        of loads is not held up by disk writes. Batch is written when it is full or `interval` seconds old.
+        Before a batch that would grow the file over max_bytes the file becomes path.1 (path.1 becomes
+        path.2 ... up to path.<backups>), a batch always lands in one file.
+        A full deque makes the main loop wait, memory stays bounded on a slow disk.
+        Failed write (disk full, removed folder) loses that batch only, it is logged and counted;
+        if the writer thread is gone, record() counts the decision as dropped and returns."""
+
+    def __init__(self, path, capacity=65536, batch=1024, interval=1.0, max_bytes=64 * 2 ** 20, backups=5):
+        self.path, self.max_bytes, self.backups = Path(path), max_bytes, backups
+        self.capacity, self.batch, self.interval = capacity, batch, interval
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.flushable, self.writable = threading.Condition(self.lock), threading.Condition(self.lock)
+        self.closed, self.stopped, self.waits, self.written, self.dropped = False, False, 0, 0, 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, name='decision-log', daemon=True)
+        self.thread.start()
+
+    def record(self, decision):
+        """Puts decision (json serializable dict) into buffer, waits only if buffer is full"""
+        with self.lock:
+            if len(self.buffer) >= self.capacity and not self.stopped:
+                self.waits += 1
+                self.writable.wait_for(lambda: len(self.buffer) < self.capacity or self.closed or self.stopped)
+            if self.closed:
+                raise ValueError('Decision log is closed')
+            if self.stopped:
+                self.dropped += 1
+                return
+            self.buffer.append(decision)
+            if len(self.buffer) >= self.batch:
+                self.flushable.notify()
+
+    def run(self):
+        """Writer thread: takes all buffered decisions at once and writes them as one batch"""
+        try:
+            while True:
+                with self.lock:
+                    self.flushable.wait_for(lambda: len(self.buffer) >= self.batch or self.closed, timeout=self.interval)
+                    batch, closed = list(self.buffer), self.closed
+                    self.buffer.clear()
+                    self.writable.notify_all()
+                if batch:
+                    try:
+                        self.write(batch)
+                    except Exception:
+                        logger.exception('Decision log dropped batch of %d decisions', len(batch))
+                        with self.lock:
+                            self.dropped += len(batch)
+                elif closed:
+                    return
+        finally:
+            with self.lock:
+                self.stopped = True
+                self.writable.notify_all()
+
+    def write(self, batch):
+        data = ''.join(json.dumps(decision) + '\n' for decision in batch)
+        if self.path.exists() and self.path.stat().st_size + len(data) > self.max_bytes:
+            self.rotate()
+        with self.path.open('a') as target:
+            target.write(data)
+        self.written += len(batch)
+
+    def rotate(self):
+        for number in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f'{self.path.name}.{number}')
+            if source.exists():
+                source.replace(self.path.with_name(f'{self.path.name}.{number + 1}'))
+        self.path.replace(self.path.with_name(f'{self.path.name}.1'))
+
+    def close(self):
+        """Writes rest of buffered decisions and stops writer thread"""
+        with self.lock:
+            self.closed = True
+            self.flushable.notify()
+            self.writable.notify_all()
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
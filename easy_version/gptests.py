@@ -1,27 +1,48 @@
+import bz2
+import gzip
+import lzma
 import unittest
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from decimal import Decimal
+import subprocess
+import sys
+import io
+import time
 import tempfile
+import tracemalloc
 import json
 import os
-
-from plain import parse, main
+import threading
+
+import plain
+from plain import parse, main, cli
+from decision_log import DecisionLog
+from profiler import Profiler
+from pipeline import Pipeline, batches
+import simulate
 from plain import (
-    get_divider_by_day, daily, daily_amount, weekly_amount, by_customer,
+    Calendar, CALENDAR, epoch_day, get_divider_by_day,
+    compile_rules, load_config, reload_config, get_rules, override, daily_count, daily_amount, weekly_amount, by_customer,
     validate_min_amount, validate_max_amount, validate_prime_max_amount,
     validate_loads_per_day, validate_primes_per_day, validate_daily_amount,
-    validate_weekly_amount, clean, store, is_valid, prepare_response
+    validate_weekly_amount, clean, store, is_valid, prepare_response, serialize, open_output, remember, correct,
+    Load, Usage
 )
 
 from pathlib import Path
 from unittest.mock import patch
 
 
+def make_load(id=17, customer_id=123, amount='100.00', time=datetime(2025, 7, 10), prime=False):
+    """Load record as clean() makes it, amount is in dollars"""
+    return Load(id, customer_id, int(Decimal(amount).scaleb(2)), epoch_day(time=time), prime)
+
+
 class TestStorageFunctions(unittest.TestCase):
 
     def setUp(self):
         self.customer_id = 1
-        self.time = datetime(2025, 7, 10, tzinfo=timezone.utc)
+        self.day = epoch_day(time=datetime(2025, 7, 10, tzinfo=timezone.utc))
         by_customer(customer_id=self.customer_id).clear()
 
     def test_get_divider_by_day(self):
@@ -30,106 +51,197 @@ class TestStorageFunctions(unittest.TestCase):
         time = datetime(2023, 10, 10)  # Not Monday
         self.assertEqual(get_divider_by_day(time=time), 1)
 
-    def test_daily(self):
-        time = datetime(2023, 10, 9)
-        self.assertEqual(daily(time=time, customer_id=1), [])
-
-    def test_by_customer(self):
-        self.assertEqual(by_customer(customer_id=1), {})
+    def test_daily_count(self):
+        self.assertEqual(daily_count(1, epoch_day(time=datetime(2023, 10, 9))), 0)
 
     def test_by_customer_default(self):
         storage = by_customer(customer_id=self.customer_id)
-        self.assertIsInstance(storage, dict)
-
-    def test_daily_storage_returns_list(self):
-        result = daily(customer_id=self.customer_id, time=self.time)
-        self.assertIsInstance(result, list)
+        self.assertIsInstance(storage, Usage)
+        self.assertIs(by_customer(customer_id=self.customer_id), storage)
 
     def test_daily_amount_calculation(self):
-        data = {"customer_id": self.customer_id, "time": self.time, 'prime': False}
-        store(data | {'load_amount': Decimal('10.00')})
-        store(data | {'load_amount': Decimal('5.00')})
-        self.assertEqual(daily_amount(**data), Decimal('15.00'))
+        store(Load(1, self.customer_id, 1000, self.day))
+        store(Load(2, self.customer_id, 500, self.day))
+        self.assertEqual(daily_count(self.customer_id, self.day), 2)
+        self.assertEqual(daily_amount(self.customer_id, self.day), 1500)
 
     def test_weekly_amount_calculation(self):
-        data = {"customer_id": self.customer_id, "time": self.time, 'load_amount': Decimal('10.00'), 'prime': False}
         for i in range(-6, 6):
-            store(data | {'time': self.time + timedelta(days=i)})
-        total = weekly_amount(**data)
+            store(Load(i, self.customer_id, 1000, self.day + i))
+        total = weekly_amount(self.customer_id, self.day)
         # we have 10.00 every day, but monday has a divider of 2
-        self.assertEqual(total, Decimal('80.00'))
+        self.assertEqual(total, 8000)
+
+    def test_usage_days_are_sorted(self):
+        usage = Usage()
+        for day, cents in ((5, 100), (3, 10), (5, 1), (9, 1000)):
+            usage.add(day, cents)
+        self.assertEqual((list(usage.days), list(usage.counts), list(usage.cents)), ([3, 5, 9], [1, 2, 1], [10, 101, 1000]))
+        usage.clear(4, 9)
+        self.assertEqual((list(usage.days), usage.count(5), usage.amount(9)), ([3, 9], 0, 1000))
+
+
+class TestCalendar(unittest.TestCase):
+
+    def test_epoch_day(self):
+        self.assertEqual(epoch_day(time=datetime(1970, 1, 1, 23, 59)), 0)
+        self.assertEqual(epoch_day(time=datetime(2023, 10, 9, tzinfo=timezone.utc)), 19639)
+        self.assertEqual(epoch_day(time=datetime(2023, 10, 9), day=5), 5)
+
+    def test_lookup(self):
+        day = epoch_day(time=datetime(2000, 1, 3))  # Monday of 2000-W01
+        self.assertEqual(CALENDAR[day], (datetime(2000, 1, 3).date(), 200001, 0, 2))
+        self.assertEqual(CALENDAR[day - 1], (datetime(2000, 1, 2).date(), 199952, 6, 1))
+
+    def test_out_of_range_matches_tables(self):
+        calendar = Calendar(start=datetime(2000, 1, 1).date(), end=datetime(2000, 2, 1).date())
+        for day in range(calendar.first - 10, calendar.last + 10):
+            self.assertEqual(calendar[day], CALENDAR[day])
+
+    def test_custom_dividers(self):
+        calendar = Calendar(dividers={'Sunday': 3})
+        self.assertEqual(calendar.multiplier(epoch_day(time=datetime(2000, 1, 2))), 3)
+        self.assertEqual(calendar.multiplier(epoch_day(time=datetime(2000, 1, 3))), 1)
+
+
+class TestLimitsConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.config = Path(self.folder.name) / 'limits.json'
+
+    def tearDown(self):
+        reload_config(plain.CONFIG_PATH, force=True)
+        self.folder.cleanup()
+
+    def write(self, version, customers=None, **tiers):
+        self.config.write_text(json.dumps({'version': version, 'tiers': tiers, 'customers': customers or {}}))
+
+    def test_compile_rules_defaults(self):
+        rules = compile_rules()
+        self.assertEqual((rules.version, rules.tier), (0, 'default'))
+        self.assertEqual(rules.daily, 500000)
+        self.assertEqual(rules.min_amount, 1)
+        self.assertEqual(rules.loads_per_day, 3)
+        with self.assertRaises(TypeError):
+            rules.limits['DAILY'] = 1
+
+    def test_tiers_are_based_on_default(self):
+        self.write(3, default={'limits': {'DAILY': 6000}, 'dividers': {'Monday': 3}}, verified={'limits': {'WEEKLY': 40000}})
+        rules, _ = load_config(self.config)
+        self.assertEqual(rules['verified'].version, 3)
+        self.assertEqual(rules['verified'].daily, 600000)
+        self.assertEqual(rules['verified'].weekly, 4000000)
+        self.assertEqual(rules['default'].weekly, 2000000)
+        self.assertEqual(rules['verified'].calendar.multiplier(epoch_day(time=datetime(2000, 1, 3))), 3)
+
+    def test_get_rules_unknown_tier(self):
+        self.assertIs(get_rules(tier='unknown'), get_rules())
+
+    def test_reload_on_change(self):
+        self.write(1, default={'limits': {'LOADS_PER_DAY': 1}})
+        reload_config(self.config, force=True)
+        self.assertEqual(get_rules().loads_per_day, 1)
+        self.assertIs(reload_config(self.config), reload_config(self.config))
+
+        self.write(2, default={'limits': {'LOADS_PER_DAY': 5}})
+        os.utime(self.config, ns=(0, 10 ** 9))
+        with patch('plain.CONFIG_CHECK_INTERVAL', 0):
+            reload_config(self.config)
+        self.assertEqual((get_rules().version, get_rules().loads_per_day), (2, 5))
+
+    def test_decision_records_version(self):
+        plain._DECISIONS.clear()
+        self.write(7, default={'limits': {'MAX_AMOUNT': 50}})
+        reload_config(self.config, force=True)
+        load = make_load(4, 31)
+        self.assertFalse(prepare_response(load)['accepted'])
+        self.assertEqual(load.version, 7)
+
+    def test_customer_overrides(self):
+        self.write(5, customers={'42': {'tier': 'verified'}, '43': {'tier': 'verified', 'limits': {'DAILY': 100}}},
+                   verified={'limits': {'WEEKLY': 40000}})
+        reload_config(self.config, force=True)
+        self.assertEqual(get_rules(customer_id=42).weekly, 4000000)
+        self.assertEqual((get_rules(customer_id=43).weekly, get_rules(customer_id=43).daily), (4000000, 10000))
+        self.assertIs(get_rules(customer_id=44), get_rules())
+
+        load = make_load(4, 43, '200.00')
+        by_customer(customer_id=43).clear()
+        self.assertFalse(is_valid(load))
+
+    def test_incremental_override(self):
+        self.write(6, verified={'limits': {'WEEKLY': 40000}})
+        reload_config(self.config, force=True)
+        tiers, customers = plain._RULES
+        untouched = override(50, tier='verified', limits={'DAILY': 1})
+        override(51, tier='verified')
+        self.assertIs(customers[50], untouched)
+        self.assertIs(customers[51], tiers['verified'])
+        self.assertEqual(get_rules(customer_id=50).daily, 100)
+
+        override(51)
+        self.assertNotIn(51, customers)
+        self.assertIs(customers[50], untouched)
 
 
 class TestBusinessLogicFunctions(unittest.TestCase):
 
     def setUp(self):
-        self.time = datetime(2025, 7, 10)
-        self.valid_load = {
-            "id": 17,
-            "customer_id": 123,
-            "load_amount": Decimal('100.00'),
-            "time": self.time,
-            "prime": False
-        }
+        self.valid_load = make_load()
+        for customer_id in (self.valid_load.customer_id, 'prime'):
+            by_customer(customer_id=customer_id).clear()
 
     def test_validate_min_amount_ok(self):
         validate_min_amount(self.valid_load)
 
     def test_validate_min_amount_fail(self):
-        load = self.valid_load.copy()
-        load["load_amount"] = Decimal('0.001')
         with self.assertRaises(ValueError):
-            validate_min_amount(load)
+            validate_min_amount(make_load(amount='0.00'))
 
     def test_validate_max_amount_ok(self):
         validate_max_amount(self.valid_load)
 
     def test_validate_max_amount_fail(self):
-        load = self.valid_load.copy()
-        load["load_amount"] = Decimal('6000.00')
         with self.assertRaises(ValueError):
-            validate_max_amount(load)
+            validate_max_amount(make_load(amount='6000.00'))
 
     def test_validate_prime_max_amount_fail(self):
-        load = self.valid_load.copy()
-        load["prime"] = True
-        load["load_amount"] = Decimal('10000.00')
         with self.assertRaises(ValueError):
-            validate_prime_max_amount(load)
+            validate_prime_max_amount(make_load(amount='10000.00', prime=True))
 
     def test_validate_loads_per_day_fail(self):
-        load = self.valid_load.copy()
+        load = self.valid_load
         for _ in range(3):
-            daily(**load).append(Decimal('10.00'))
+            by_customer(load.customer_id).add(load.day, 1000)
         with self.assertRaises(ValueError):
             validate_loads_per_day(load)
 
     def test_validate_primes_per_day_fail(self):
-        load = self.valid_load.copy()
-        load["prime"] = True
-        for _ in range(1):
-            daily(customer_id="prime", time=load["time"]).append(Decimal('10.00'))
+        load = make_load(prime=True)
+        by_customer('prime').add(load.day, 1000)
         with self.assertRaises(ValueError):
             validate_primes_per_day(load)
 
     def test_validate_daily_amount_fail(self):
-        load = self.valid_load.copy()
-        daily(**load).extend([Decimal('3000.00'), Decimal('2500.00')])
+        load = self.valid_load
+        by_customer(load.customer_id).add(load.day, 300000)
+        by_customer(load.customer_id).add(load.day, 250000)
         with self.assertRaises(ValueError):
             validate_daily_amount(load)
 
     def test_validate_weekly_amount_fail(self):
-        load = self.valid_load.copy()
+        load = self.valid_load
+        monday = load.day - CALENDAR.weekday(load.day)
         for i in range(7):
-            day = load['time'] - timedelta(days=i)
-            daily(customer_id=load["customer_id"], time=day).append(Decimal('3000.00'))
+            by_customer(load.customer_id).add(monday + i, 300000)
         with self.assertRaises(ValueError):
             validate_weekly_amount(load)
 
     def test_validate_min_amount(self):
         sentinel = ValueError("validate_max_amount raised ValueError unexpectedly!")
         with self.assertRaises(ValueError) as error:
-            validate_min_amount({'load_amount': Decimal('0.01')})
+            validate_min_amount(make_load(amount='0.01'))
             raise sentinel
         self.assertIs(error.exception, sentinel)
 
@@ -137,62 +249,79 @@ class TestBusinessLogicFunctions(unittest.TestCase):
     def test_validate_max_amount(self):
         sentinel = ValueError("validate_max_amount raised ValueError unexpectedly!")
         with self.assertRaises(ValueError) as error:
-            validate_max_amount({'load_amount': Decimal('5000')})
+            validate_max_amount(make_load(amount='5000'))
             raise sentinel
         self.assertIs(error.exception, sentinel)
 
     def test_is_valid(self):
-        load = { 'id': 1, 'customer_id': 1, 'load_amount': Decimal('100'), 'time': datetime(2023, 10, 9, tzinfo=timezone.utc), 'prime': False }
+        load = make_load(1, 1, '100', datetime(2023, 10, 9, tzinfo=timezone.utc))
+        by_customer(customer_id=1).clear()
         self.assertTrue(is_valid(load))
+        self.assertIsNone(load.reason)
+
+    def test_is_valid_reason_and_timings(self):
+        load = make_load(amount='0.00')
+        timings = {}
+        self.assertFalse(is_valid(load, timings=timings))
+        self.assertEqual(load.reason, 'MIN_AMOUNT')
+        self.assertEqual(list(timings), ['MIN_AMOUNT'])
 
 
 class TestGeneralFunctions(unittest.TestCase):
     def setUp(self):
         self.customer_id = 1
-        self.time = datetime.now()
         by_customer(customer_id=self.customer_id).clear()
         by_customer(customer_id="prime").clear()
+        plain._DECISIONS.clear()
 
     def test_clean_valid_input(self):
         load = { "id": "7", "customer_id": "10", "load_amount": "$12.34", "time": "2025-07-10T10:00:00Z" }
         result = clean(**load)
-        self.assertEqual(result["id"], 7)
-        self.assertEqual(result["customer_id"], 10)
-        self.assertEqual(result["load_amount"], Decimal('12.34'))
-        self.assertTrue(isinstance(result["time"], datetime))
+        self.assertEqual(result.id, 7)
+        self.assertEqual(result.customer_id, 10)
+        self.assertEqual(result.cents, 1234)
+        self.assertEqual(result.load_amount, Decimal('12.34'))
+        self.assertTrue(result.prime)
 
     def test_store_adds_to_storage(self):
-        load = { "id": 2, "customer_id": 5, "load_amount": Decimal('50.00'), "time": datetime(2025, 7, 10), "prime": False }
+        load = make_load(2, 5, '50.00')
+        by_customer(customer_id=5).clear()
         store(load)
-        result = daily(**load)
-        self.assertIn(Decimal('50.00'), result)
+        self.assertEqual(daily_amount(5, load.day), 5000)
 
     def test_prime_value_is_stored(self):
-        load = { "id": 7, "customer_id": 10, "load_amount": Decimal('12.34'), "time": datetime(2025, 7, 10), "prime": True }
+        load = make_load(7, 10, '12.34', prime=True)
         store(load)
 
         # check "prime" storage
-        prime_bucket_loads = daily(customer_id="prime",time=load['time'])
-        self.assertIn(load['load_amount'], prime_bucket_loads)
+        self.assertEqual((daily_count('prime', load.day), daily_amount('prime', load.day)), (1, 1234))
 
     def test_is_valid_true(self):
-        load = { "id": 4, "customer_id": 9, "load_amount": Decimal('10.00'), "time": datetime(2025, 7, 10), "prime": False }
-        self.assertTrue(is_valid(load))
+        self.assertTrue(is_valid(make_load(4, 9, '10.00')))
 
     def test_prepare_response_false(self):
         # too high amount
-        load = { "id": 1, "customer_id": 99, "load_amount": Decimal('1000000.00'), "time": datetime(2025, 7, 10), "prime": False }
-        result = prepare_response(load)
+        result = prepare_response(make_load(1, 99, '1000000.00'))
         self.assertEqual(result["accepted"], False)
 
     def test_clean(self):
         load = clean(id='1', load_amount='$100.00', time='2023-10-09T00:00:00Z', customer_id='1')
-        expected = { 'id': 1, 'customer_id': 1, 'load_amount': Decimal('100.00'), 'time': datetime(2023, 10, 9, 0, 0, tzinfo=timezone.utc), 'prime': False }
-        self.assertEqual(load, expected)
+        self.assertEqual(load, Load(1, 1, 10000, 19639, False))
+        self.assertFalse(hasattr(load, '__dict__'))
+
+    def test_retry_gets_original_decision(self):
+        load = make_load(3, 12, '4000', datetime(2023, 10, 10, tzinfo=timezone.utc))
+        by_customer(customer_id=12).clear()
+        plain._DECISIONS.pop((3, 12), None)
+        self.assertTrue(prepare_response(load)['accepted'])
+        store(load)
+        retry = make_load(3, 12, '4000', datetime(2023, 10, 10, tzinfo=timezone.utc))
+        self.assertTrue(prepare_response(retry)['accepted'])
+        self.assertTrue(retry.retry)
+        self.assertFalse(prepare_response(make_load(5, 12, '4000', datetime(2023, 10, 10)))['accepted'])  # new load over daily limit
 
     def test_prepare_response(self):
-        load = { 'id': 1, 'customer_id': 1, 'load_amount': Decimal('100'), 'time': datetime(2023, 10, 9, tzinfo=timezone.utc), 'prime': False }
-        response = prepare_response(load)
+        response = prepare_response(make_load(1, 1, '100', datetime(2023, 10, 9, tzinfo=timezone.utc)))
         expected = {"id": 1, "customer_id": 1, "accepted": True}
         self.assertEqual(response, expected)
 
@@ -203,8 +332,9 @@ class TestFileFunctions(unittest.TestCase):
         self.temp_output = Path(self.temp_input.name).parent / 'output.txt'
         self.sample_data = { "id": "2", "customer_id": "99", "load_amount": "$100.00", "time": "2025-07-10T12:00:00Z" }
         self.sample_load = clean(**self.sample_data)
-        by_customer(customer_id=self.sample_load['customer_id']).clear()
+        by_customer(customer_id=self.sample_load.customer_id).clear()
         by_customer(customer_id="prime").clear()
+        plain._DECISIONS.clear()
 
 
     def tearDown(self):
@@ -221,10 +351,10 @@ class TestFileFunctions(unittest.TestCase):
             result = list(parse(filename=Path(self.temp_input.name).name))
             self.assertEqual(len(result), 1)
             cleaned = result[0]
-            self.assertEqual(cleaned['id'], 2)
-            self.assertEqual(cleaned['customer_id'], 99)
-            self.assertEqual(cleaned['load_amount'], Decimal('100.00'))
-            self.assertIsInstance(cleaned['time'], datetime)
+            self.assertEqual(cleaned.id, 2)
+            self.assertEqual(cleaned.customer_id, 99)
+            self.assertEqual(cleaned.load_amount, Decimal('100.00'))
+            self.assertEqual(cleaned.day, epoch_day(time=datetime(2025, 7, 10)))
 
     def test_main_creates_output_file(self):
         self.temp_input.write(json.dumps(self.sample_data) + '\n')
@@ -244,5 +374,468 @@ class TestFileFunctions(unittest.TestCase):
             self.assertIn('accepted', response)
 
 
+class TestDecisionLog(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / 'decisions.jsonl'
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_records_are_written_in_batches(self):
+        with DecisionLog(self.path, batch=100, interval=10) as log:
+            for i in range(250):
+                log.record({'id': i, 'accepted': True})
+        lines = self.path.read_text().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], list(range(250)))
+
+    def test_flush_interval(self):
+        with DecisionLog(self.path, batch=100, interval=0.01) as log:
+            log.record({'id': 1})
+            for _ in range(100):
+                if log.written:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(log.written, 1)
+
+    def test_rotation(self):
+        with DecisionLog(self.path, max_bytes=200, backups=2) as log:
+            for i in range(0, 100, 5):
+                log.write([{'id': id} for id in range(i, i + 5)])
+        files = sorted(self.path.parent.iterdir())
+        self.assertEqual([file.name for file in files], ['decisions.jsonl', 'decisions.jsonl.1', 'decisions.jsonl.2'])
+        self.assertTrue(all(file.stat().st_size <= 200 for file in files))
+
+    def test_backpressure(self):
+        log = DecisionLog(self.path, capacity=5, batch=5, interval=10)
+        slow_write, log.write = log.write, lambda batch: (time.sleep(0.01), slow_write(batch))
+        for i in range(50):
+            log.record({'id': i})
+        log.close()
+        self.assertGreater(log.waits, 0)
+        self.assertEqual(len(self.path.read_text().splitlines()), 50)
+        with self.assertRaises(ValueError):
+            log.record({'id': 51})
+
+    def test_failed_batch_is_dropped(self):
+        log = DecisionLog(self.path, batch=1, interval=10)
+        write, failed = log.write, []
+
+        def flaky_write(batch):
+            if batch[0]['id'] == 0:
+                failed.append(batch)
+                raise OSError('No space left on device')
+            write(batch)
+        log.write = flaky_write
+        with self.assertLogs('decision_log', 'ERROR'):
+            log.record({'id': 0})
+            while not failed:
+                time.sleep(0.01)
+            log.record({'id': 1})
+            log.close()
+        self.assertEqual([json.loads(line)['id'] for line in self.path.read_text().splitlines()], [1])
+        self.assertEqual((log.written, log.dropped), (1, 1))
+
+    def test_gone_writer_does_not_block(self):
+        log = DecisionLog(self.path, capacity=1, batch=1, interval=10)
+
+        def gone(batch):
+            raise SystemExit  # not an Exception, writer thread ends
+        log.write = gone
+        with patch.object(threading, 'excepthook', lambda args: None):
+            log.record({'id': 0})
+            log.thread.join(2)
+        for i in range(1, 5):  # buffer is full, record() would wait for writer forever
+            log.record({'id': i})
+        self.assertEqual(log.dropped, 4)
+
+    def test_main_logs_every_decision(self):
+        source = Path(self.folder.name) / 'input.txt'
+        source.write_text('{"id":"4","customer_id":"81","load_amount":"$100.00","time":"2025-07-10T12:00:00Z"}\n'
+                          '{"id":"6","customer_id":"81","load_amount":"$6000.00","time":"2025-07-10T12:00:00Z"}\n')
+        by_customer(customer_id=81).clear()
+        plain._DECISIONS.clear()
+        main(filename=source, output=Path(self.folder.name) / 'output.txt', decisions=self.path)
+        first, second = map(json.loads, self.path.read_text().splitlines())
+        self.assertEqual((first['accepted'], first['reason']), (True, None))
+        self.assertEqual((second['accepted'], second['reason']), (False, 'MAX_AMOUNT'))
+        self.assertEqual(list(second['timings']), ['MIN_AMOUNT', 'MAX_AMOUNT'])
+
+
+class TestOutput(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / 'output.txt'
+        self.responses = [{'id': 15887, 'customer_id': 528, 'accepted': True}, {'id': 1, 'customer_id': 2, 'accepted': False}]
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_serialize_matches_json(self):
+        for response in self.responses:
+            self.assertEqual(serialize(response), json.dumps(response) + '\n')
+
+    def test_plain_output(self):
+        with open_output(self.path, buffer_size=16) as result:
+            for response in self.responses:
+                result.write(serialize(response))
+        self.assertEqual([json.loads(line) for line in self.path.read_text().splitlines()], self.responses)
+
+    def test_compressed_output(self):
+        for compression, module in (('gzip', gzip), ('bz2', bz2), ('xz', lzma)):
+            with open_output(self.path, compression) as result:
+                result.write(serialize(self.responses[0]))
+            self.assertEqual(module.decompress(self.path.read_bytes()).decode(), json.dumps(self.responses[0]) + '\n')
+
+    def test_stdout_output(self):
+        statement = 'import plain, sys; from plain import open_output\nwith open_output("-", "gzip") as result: result.write("line\\n")'
+        result = subprocess.run([sys.executable, '-c', statement], cwd=plain.BASE_PATH, capture_output=True, check=True)
+        self.assertEqual(gzip.decompress(result.stdout), b'line\n')
+
+    def test_cli_compressed_stdout(self):
+        source = Path(self.folder.name) / 'in.txt'
+        source.write_text('{"id":"2","customer_id":"77","load_amount":"$100.00","time":"2025-07-10T12:00:00Z"}\n')
+        result = subprocess.run([sys.executable, 'plain.py', str(source), '-o', '-', '-z', 'gzip'],
+                                cwd=plain.BASE_PATH, capture_output=True, check=True)
+        self.assertEqual(json.loads(gzip.decompress(result.stdout)), {'id': 2, 'customer_id': 77, 'accepted': True})
+        self.assertEqual(result.stderr.strip(), b'Success')
+
+
+class TestCorrections(unittest.TestCase):
+
+    def setUp(self):
+        plain._DECISIONS.clear()
+        plain._STORAGE['prime'].clear()
+        plain._HISTORY.clear()
+        plain._HISTORY['prime'] = {}
+        for customer_id in (801, 802):
+            by_customer(customer_id=customer_id).clear()
+
+    def process(self, id, customer_id, amount, time='2025-07-10T12:00:00Z'):
+        load = clean(id=id, customer_id=customer_id, load_amount=f'${amount}', time=time)
+        response = prepare_response(load)
+        remember(load)
+        if response['accepted']:
+            store(load)
+        return response['accepted']
+
+    def test_amended_amount_flips_later_loads_of_week(self):
+        self.assertTrue(self.process('10', '801', '4000.00'))
+        self.assertFalse(self.process('12', '801', '2000.00'))  # daily limit
+        self.assertTrue(self.process('14', '801', '4000.00', '2025-07-11T12:00:00Z'))
+        self.assertEqual(correct(id='10', customer_id='801', load_amount='$100.00'),
+                         [{'id': 12, 'customer_id': 801, 'accepted': True}])
+        self.assertEqual(plain.daily_amount(801, epoch_day(time=datetime(2025, 7, 10))), 210000)
+
+    def test_removed_load(self):
+        self.assertTrue(self.process('10', '801', '4000.00'))
+        self.assertFalse(self.process('12', '801', '2000.00'))
+        self.assertEqual(correct(id='10', customer_id='801', removed=True), [{'id': 12, 'customer_id': 801, 'accepted': True}])
+        self.assertNotIn((10, 801), plain._DECISIONS)
+
+    def test_prime_slot_dependents(self):
+        self.assertTrue(self.process('10', '801', '4000.00'))
+        self.assertFalse(self.process('3', '801', '2000.00'))  # prime, daily limit
+        self.assertTrue(self.process('5', '802', '100.00'))  # prime slot is free
+        self.assertTrue(self.process('7', '802', '100.00', '2025-07-11T12:00:00Z'))  # next day slot
+        self.assertEqual(correct(id='10', customer_id='801', load_amount='100.00'), [
+            {'id': 3, 'customer_id': 801, 'accepted': True},
+            {'id': 5, 'customer_id': 802, 'accepted': False},
+        ])
+        self.assertEqual(sum(plain._STORAGE['prime'].counts), 2)
+
+    def test_other_weeks_are_not_replayed(self):
+        self.assertTrue(self.process('10', '801', '4000.00'))
+        self.assertTrue(self.process('12', '801', '4000.00', '2025-07-14T12:00:00Z'))  # next Monday
+        plain._DECISIONS[(12, 801)] = None  # would be recomputed if replayed
+        self.assertEqual(correct(id='10', customer_id='801', load_amount='$5000.00'), [])
+        self.assertIsNone(plain._DECISIONS[(12, 801)])
+
+    def test_unknown_load(self):
+        with self.assertRaises(KeyError):
+            correct(id='1', customer_id='801', removed=True)
+
+    def test_main_writes_diff(self):
+        with tempfile.TemporaryDirectory() as folder:
+            folder = Path(folder)
+            (folder / 'in.txt').write_text(
+                '{"id":"10","customer_id":"801","load_amount":"$4000.00","time":"2025-07-10T12:00:00Z"}\n'
+                '{"id":"12","customer_id":"801","load_amount":"$2000.00","time":"2025-07-10T13:00:00Z"}\n')
+            (folder / 'corrections.txt').write_text('{"id":"10","customer_id":"801","load_amount":"$100.00"}\n')
+            main(filename=folder / 'in.txt', output=folder / 'out.txt', corrections=folder / 'corrections.txt', diff=folder / 'diff.txt')
+            self.assertEqual(json.loads((folder / 'diff.txt').read_text()), {'id': 12, 'customer_id': 801, 'accepted': True})
+
+
+class TestSimulation(unittest.TestCase):
+    SCENARIOS = {'current': {}, 'daily 1000': {'limits': {'DAILY': 1000}}, 'no monday': {'dividers': {'Monday': 1}}}
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.source = Path(self.folder.name) / 'in.txt'
+        self.source.write_text(
+            '{"id":"10","customer_id":"901","load_amount":"$3000.00","time":"2025-07-14T10:00:00Z"}\n'
+            '{"id":"12","customer_id":"901","load_amount":"$1500.00","time":"2025-07-14T11:00:00Z"}\n'
+            '{"id":"14","customer_id":"901","load_amount":"$9000.00","time":"2025-07-15T11:00:00Z"}\n'
+            '{"id":"10","customer_id":"901","load_amount":"$3000.00","time":"2025-07-14T10:00:00Z"}\n')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_scenarios(self):
+        current, daily, monday = simulate.run(self.SCENARIOS, self.source, processes=1)
+        self.assertEqual(current, {'scenario': 'current', 'loads': 3, 'accepted': 1, 'acceptance': 0.3333,
+                                   'rejected': {'DAILY': 1, 'MAX_AMOUNT': 1}, 'accepted_amount': '3000.00',
+                                   'rejected_amount': '10500.00', 'retries': 1})
+        self.assertEqual(daily['accepted'], 0)
+        self.assertEqual(monday['accepted'], 2)
+
+    def test_processes_give_same_results(self):
+        self.assertEqual(simulate.run(self.SCENARIOS, self.source, processes=2),
+                         simulate.run(self.SCENARIOS, self.source, processes=1))
+
+    def test_customer_rules(self):
+        config = Path(self.folder.name) / 'limits.json'
+        config.write_text(json.dumps({'customers': {'901': {'limits': {'MAX_AMOUNT': 10000, 'DAILY': 10000, 'WEEKLY': 50000}}}}))
+        current, daily, monday = simulate.run(self.SCENARIOS, self.source, config, processes=1)
+        self.assertEqual(current['accepted'], 3)
+        self.assertEqual(daily['accepted'], 3)  # own limits of customer are kept in scenario
+        self.assertEqual(monday['accepted'], 3)
+
+    def test_current_limits_match_main(self):
+        output = Path(self.folder.name) / 'out.txt'
+        plain._DECISIONS.clear()
+        by_customer(customer_id=901).clear()
+        main(filename=self.source, output=output)
+        accepted = sum(json.loads(line)['accepted'] for line in output.read_text().splitlines()[:3])
+        self.assertEqual(simulate.run({'current': {}}, self.source)[0]['accepted'], accepted)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.source, self.path = Path(self.folder.name) / 'in.txt', Path(self.folder.name) / 'profile.txt'
+        self.source.write_text(''.join(
+            f'{{"id":"{id}","customer_id":"851","load_amount":"$100.00","time":"2025-08-14T12:00:00Z"}}\n' for id in range(10, 30)))
+        self.clear()
+
+    def tearDown(self):
+        self.clear()
+        self.folder.cleanup()
+
+    def clear(self):
+        for customer_id in (851, 'prime'):
+            by_customer(customer_id=customer_id).clear()
+        plain._DECISIONS.clear()
+        plain._HISTORY.clear()
+        plain._HISTORY['prime'] = {}
+
+    def run_main(self, **kwargs):
+        output = Path(self.folder.name) / 'out.txt'
+        main(filename=self.source, output=output, profile=self.path, **kwargs)
+        return output.read_text()
+
+    def test_no_history_without_corrections(self):
+        with patch('sys.stdout'):
+            self.run_main(profile_fraction=1)
+        self.assertEqual(plain._HISTORY, {'prime': {}})
+
+    def test_sampling_is_deterministic(self):
+        profiler = Profiler(fraction=0.25)
+        self.assertEqual([profiler.sample() is not None for _ in range(8)], [False, False, False, True] * 2)
+
+    def test_stages_and_rules(self):
+        with patch('sys.stdout'):
+            output = self.run_main(profile_fraction=0.5)
+        self.assertEqual(output.count('"accepted": true'), 3)  # loads per day limit
+        stacks = dict(line.rsplit(' ', 1) for line in self.path.read_text().splitlines())
+        self.assertTrue({f'fund-load;{stage}' for stage in ('parse', 'clean', 'validate', 'store', 'serialize')} <= set(stacks))
+        self.assertIn('fund-load;validate;MIN_AMOUNT', stacks)
+        self.assertTrue(all(int(ns) > 0 for ns in stacks.values()))
+
+    def test_report(self):
+        profiler = Profiler(fraction=1)
+        sample = profiler.sample()
+        with sample.stage('validate'):
+            pass
+        sample.add_rules('validate', {'DAILY': 0})
+        sample.finish()
+        report = profiler.report()
+        self.assertEqual((report['loads'], report['samples'], report['stages']['validate']['count']), (1, 1, 1))
+        self.assertEqual(list(report['rules']), ['validate;DAILY'])
+
+    def test_traced_stacks(self):
+        with patch('sys.stdout'):
+            self.run_main(profile_fraction=1, profile_stacks=True)
+        stacks = self.path.read_text()
+        self.assertIn('fund-load;validate;plain.prepare_response;plain.is_valid;plain.validate_daily_amount', stacks)
+        self.assertIn('fund-load;parse;json.loads', stacks)
+
+    def test_decisions_are_same(self):
+        with patch('sys.stdout'):
+            profiled = self.run_main(profile_fraction=0.3)
+        self.clear()
+        with patch('sys.stdout'):
+            main(filename=self.source, output=Path(self.folder.name) / 'plain.txt')
+        self.assertEqual(profiled, (Path(self.folder.name) / 'plain.txt').read_text())
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.source = Path(self.folder.name) / 'in.txt'
+        lines = [f'{{"id":"{id}","customer_id":"{861 + id % 3}","load_amount":"${id * 150}.00","time":"2025-09-{1 + id // 8:02d}T12:00:00Z"}}'
+                 for id in range(1, 60)]
+        self.source.write_text('\n'.join(lines + lines[:5]) + '\n')  # last loads are retries
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def clear(self):
+        for customer_id in (861, 862, 863, 'prime'):
+            by_customer(customer_id=customer_id).clear()
+        plain._DECISIONS.clear()
+
+    def run_main(self, name, **kwargs):
+        self.clear()
+        output = Path(self.folder.name) / name
+        with patch('sys.stdout'):
+            main(filename=self.source, output=output, **kwargs)
+        return output.read_text()
+
+    def test_batches(self):
+        source = io.StringIO('a\nbb\nccc\ndddd')
+        self.assertEqual(list(batches(source, block_size=3, batch_size=2)), [['a', 'bb'], ['ccc', 'dddd']])
+
+    def test_same_output_as_sequential(self):
+        sequential = self.run_main('sequential.txt', jobs=0)
+        with patch('pipeline.BATCH_SIZE', 7), patch('pipeline.BLOCK_SIZE', 100), patch('pipeline.DEPTH', 2):
+            self.assertEqual(self.run_main('pipelined.txt', jobs=3), sequential)
+        self.assertEqual(len(sequential.splitlines()), 64)
+
+    def test_order_with_slow_parse(self):
+        def parse(lines):
+            time.sleep(0.01 * (int(lines[0]) % 3))  # later batches are parsed first
+            return lines
+        written = []
+        pipeline = Pipeline(parse, lambda lines: [int(line) for line in lines], written.extend, jobs=4, batch_size=2, depth=3)
+        self.source.write_text('\n'.join(map(str, range(40))))
+        self.assertEqual(pipeline.run(self.source), 40)
+        self.assertEqual(written, list(range(40)))
+
+    def test_parse_error_stops_pipeline(self):
+        self.source.write_text(self.source.read_text() + 'not json\n')
+        self.clear()
+        with self.assertRaises(ValueError):
+            main(filename=self.source, output=Path(self.folder.name) / 'out.txt', jobs=2)
+
+    def test_default_jobs(self):
+        with patch('sys._is_gil_enabled', lambda: False, create=True):
+            self.assertEqual(plain.default_jobs(), os.cpu_count())
+        with patch('sys._is_gil_enabled', lambda: True, create=True):
+            self.assertEqual(plain.default_jobs(), 0)
+
+
+class TestMemory(unittest.TestCase):
+    """ Memory benchmark: traced bytes per cleaned load record, per customer storage and kept per decided load.
+        Dict records with Decimal and datetime took about 520 bytes per load and 1270 bytes per customer of 10 days,
+        about 274 bytes were kept per decided load (decisions, storage)"""
+    CUSTOMERS, DAYS = 1000, 10
+    LOAD_BUDGET, CUSTOMER_BUDGET = 300, 800  # bytes
+    DECIDED_BUDGET, HISTORY_BUDGET = 250, 600  # bytes kept per decided load without and with corrections history
+
+    def setUp(self):
+        self.raw = [{'id': str(i), 'customer_id': str(100000 + i % self.CUSTOMERS), 'load_amount': f'${i % 900}.{i % 100:02d}',
+                     'time': f'2000-01-{1 + i // self.CUSTOMERS:02d}T10:00:00Z'} for i in range(self.CUSTOMERS * self.DAYS)]
+        plain.is_prime(3)
+        plain.decide(clean(id='1', customer_id='99999', load_amount='$1.00', time='2000-01-03T10:00:00Z'))  # calendar
+        tracemalloc.start()
+
+    def tearDown(self):
+        tracemalloc.stop()
+        plain._CORRECTIONS['enabled'] = False
+        plain._HISTORY.clear()
+        plain._HISTORY['prime'] = {}
+        for customer_id in range(99999, 100000 + self.CUSTOMERS):
+            plain._STORAGE.pop(customer_id, None)
+        for load in self.raw:
+            plain._DECISIONS.pop((int(load['id']), int(load['customer_id'])), None)
+        plain._DECISIONS.pop((1, 99999), None)
+
+    def measure(self, action):
+        """Returns bytes kept by result of action"""
+        before = tracemalloc.get_traced_memory()[0]
+        self.kept = action()  # result must live while memory is measured
+        return tracemalloc.get_traced_memory()[0] - before
+
+    def test_bytes_per_load(self):
+        size = self.measure(lambda: [clean(**load) for load in self.raw])
+        self.assertLess(size / len(self.raw), self.LOAD_BUDGET)
+
+    def test_bytes_per_customer(self):
+        loads = [clean(**load) for load in self.raw]
+        loads = [load for load in loads if not load.prime]
+
+        def fill():
+            for load in loads:
+                store(load)
+        size = self.measure(fill)
+        self.assertLess(size / self.CUSTOMERS, self.CUSTOMER_BUDGET)
+
+    def decide_all(self):
+        for load in self.raw:
+            plain.decide(clean(**load))
+
+    def test_bytes_per_decided_load(self):
+        """Only decision and usage are kept, load records are not referenced after decide()"""
+        size = self.measure(self.decide_all)
+        self.assertLess(size / len(self.raw), self.DECIDED_BUDGET)
+        self.assertEqual(plain._HISTORY, {'prime': {}})
+
+    def test_bytes_per_decided_load_with_history(self):
+        plain._CORRECTIONS['enabled'] = True
+        size = self.measure(self.decide_all)
+        self.assertLess(size / len(self.raw), self.HISTORY_BUDGET)
+
+
+class TestStartup(unittest.TestCase):
+    """Laziness of imports is checked in every run, wall-clock import budget with FUNDS_BENCHMARK=1 only"""
+    IMPORT_BUDGET = 100_000  # microseconds, cumulative `python -X importtime` for plain module
+
+    def importtime(self, statement='import plain'):
+        """Returns {module: cumulative import time in us} for statement run in fresh interpreter"""
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                                cwd=plain.BASE_PATH, capture_output=True, text=True, check=True)
+        lines = (line.split('|') for line in result.stderr.splitlines() if line.startswith('import time:'))
+        return {name.strip(): int(cumulative) for _, cumulative, name in lines if cumulative.strip().isdigit()}
+
+    def test_import_is_lazy(self):
+        modules = self.importtime()
+        self.assertNotIn('sympy', modules)
+        self.assertNotIn('argparse', modules)
+
+    @unittest.skipUnless(os.environ.get('FUNDS_BENCHMARK'), 'wall-clock benchmark, set FUNDS_BENCHMARK=1 to run it')
+    def test_import_budget(self):
+        self.assertLess(min(self.importtime()['plain'] for _ in range(3)), self.IMPORT_BUDGET)
+
+    def test_is_prime_imports_on_first_call(self):
+        modules = self.importtime('import plain; plain.is_prime(13)')
+        self.assertIn('sympy', modules)
+        self.assertTrue(plain.is_prime(13))
+        self.assertFalse(plain.is_prime(15))
+
+    def test_cli(self):
+        with tempfile.TemporaryDirectory() as folder:
+            source, target = Path(folder) / 'in.txt', Path(folder) / 'out.txt'
+            source.write_text('{"id":"2","customer_id":"77","load_amount":"$100.00","time":"2025-07-10T12:00:00Z"}\n')
+            by_customer(customer_id=77).clear()
+            plain._DECISIONS.clear()
+            cli([str(source), '-o', str(target)])
+            self.assertEqual(json.loads(target.read_text()), {'id': 2, 'customer_id': 77, 'accepted': True})
+
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
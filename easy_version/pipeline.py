@@ -0,0 +1,110 @@
+"""
+Staged pipeline of plain.py main: reader -> parse pool -> ordered validation -> writer.
+Reader thread reads input in large blocks, splits them into batches of lines and hands every batch to parse pool.
+Futures of parsed batches are queued in input order, caller thread validates records one by one in this order
+(validation is stateful and sequential), writer thread serializes and writes validated batches.
+Stages are connected by bounded queues of batches, so memory is bounded and slow stage holds back others.
+With GIL parse pool overlaps only with I/O and compression, on free-threaded Python (3.13t) workers parse in parallel.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from queue import Empty, Full, Queue
+
+BLOCK_SIZE = 2 ** 20  # bytes read from input at once
+BATCH_SIZE = 1024  # records passed between stages at once
+DEPTH = 8  # batches waiting between two stages
+
+_DONE = object()
+
+
+def batches(source, block_size=BLOCK_SIZE, batch_size=BATCH_SIZE):
+    """Lines of text stream in batches, stream is read in blocks"""
+    tail, batch = '', []
+    while block := source.read(block_size):
+        lines = (tail + block).split('\n')
+        tail = lines.pop()
+        for line in lines:
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if tail:
+        batch.append(tail)
+    if batch:
+        yield batch
+
+
+def put(queue, item, stop):
+    """Puts item unless pipeline is stopped, returns False if stopped"""
+    while not stop.is_set():
+        try:
+            queue.put(item, timeout=0.1)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def get(queue, stop):
+    """Next item, _DONE if pipeline is stopped"""
+    while True:
+        try:
+            return queue.get(timeout=0.1)
+        except Empty:
+            if stop.is_set():
+                return _DONE
+
+
+class Pipeline:
+    """ Runs stages for one input file, every stage gets whole batch: parse(lines) -> records runs on pool,
+        validate(records) -> results on caller thread, write(results) on writer thread.
+        First error of any stage stops all stages and is raised by run()"""
+
+    def __init__(self, parse, validate, write, jobs=None, block_size=None, batch_size=None, depth=None):
+        self.parse, self.validate, self.write, self.jobs = parse, validate, write, jobs
+        self.block_size, self.batch_size, self.depth = block_size or BLOCK_SIZE, batch_size or BATCH_SIZE, depth or DEPTH
+        self.stop, self.errors = threading.Event(), []
+
+    def run(self, path):
+        """Processes input file, returns number of records"""
+        parsed, validated, count = Queue(self.depth), Queue(self.depth), 0
+        with ThreadPoolExecutor(self.jobs, thread_name_prefix='parse') as pool:
+            reader = threading.Thread(target=self.reader, args=(path, pool, parsed), name='reader', daemon=True)
+            writer = threading.Thread(target=self.writer, args=(validated,), name='writer', daemon=True)
+            reader.start()
+            writer.start()
+            try:
+                while (future := get(parsed, self.stop)) is not _DONE:
+                    results = self.validate(future.result())
+                    count += len(results)
+                    if not put(validated, results, self.stop):
+                        break
+            except BaseException as error:
+                self.fail(error)
+            put(validated, _DONE, self.stop)
+            reader.join()
+            writer.join()
+        if self.errors:
+            raise self.errors[0]
+        return count
+
+    def reader(self, path, pool, parsed):
+        try:
+            with open(path, 'r') as source:
+                for batch in batches(source, self.block_size, self.batch_size):
+                    if not put(parsed, pool.submit(self.parse, batch), self.stop):
+                        return
+            put(parsed, _DONE, self.stop)
+        except BaseException as error:
+            self.fail(error)
+
+    def writer(self, validated):
+        try:
+            while (results := get(validated, self.stop)) is not _DONE and not self.stop.is_set():
+                self.write(results)
+        except BaseException as error:
+            self.fail(error)
+
+    def fail(self, error):
+        self.errors.append(error)
+        self.stop.set()
@@ -1,144 +1,628 @@
+import io
 import json
-from datetime import datetime, timedelta
+import os
+import sys
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from contextlib import ExitStack, contextmanager
+from copy import copy
+from datetime import date, datetime
 from decimal import Decimal
+from functools import cached_property
+from importlib import import_module
+from itertools import count
+from operator import attrgetter, itemgetter
 from pathlib import Path
-from sympy.ntheory import isprime as is_prime
+from time import monotonic, perf_counter_ns
+from types import MappingProxyType
 
 BASE_PATH = Path(__file__).parent.resolve()
+CONFIG_PATH = BASE_PATH / 'limits.json'
+CONFIG_CHECK_INTERVAL = 1.0  # seconds between checks of config file modification
+OUTPUT_BUFFER_SIZE = 2 ** 20  # bytes collected before write to output file or compressor
+COMPRESSORS = {'gzip': 'gzip', 'bz2': 'bz2', 'xz': 'lzma'}  # stdlib stream codecs for output
+RESPONSE_TEMPLATE = '{{"id": {}, "customer_id": {}, "accepted": {}}}\n'  # same text as json.dumps(response)
+PROFILE_FRACTION = 0.01  # part of loads profiled in --profile mode
 
 LIMITS = {'MIN_AMOUNT': 0.01, 'MAX_AMOUNT': 5000, 'DAILY': 5000, 'WEEKLY': 20000, 'PRIME': 9999, 'LOADS_PER_DAY': 3, 'PRIMES_PER_DAY': 1 }
 DIVIDER_PER_DAY = {'Monday':2, 'Tuesday':1, 'Wednesday':1, 'Thursday':1, 'Friday':1, 'Saturday':1, 'Sunday':1}
 
-_STORAGE = {'prime':{}}
+CALENDAR_RANGE = (date(2000, 1, 1), date(2100, 1, 1))
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+EPOCH = date(1970, 1, 1).toordinal()
+
+# records of loads and usage of customers:
+class Load:
+    """ Compact load record: amount in integer cents, day as epoch-day integer, no per-instance dict.
+        reason, version, retry and seq are filled by adjudication"""
+    __slots__ = ('id', 'customer_id', 'cents', 'day', 'prime', 'reason', 'version', 'retry', 'seq')
+
+    def __init__(self, id, customer_id, cents, day, prime=False):
+        self.id, self.customer_id, self.cents, self.day, self.prime = id, customer_id, cents, day, prime
+        self.reason = self.version = self.seq = None
+        self.retry = False
+
+    @property
+    def load_amount(self):
+        return Decimal(self.cents).scaleb(-2)
+
+    def __eq__(self, other):
+        return isinstance(other, Load) and self.key() == other.key()
+
+    def key(self):
+        return self.id, self.customer_id, self.cents, self.day, self.prime
+
+    def __repr__(self):
+        return f'Load{self.key()}'
+
+class Usage:
+    """ Loads count and amount in cents per epoch-day of one customer (or of all prime loads).
+        Days are kept in sorted arrays, loads come mostly in time order, so a new day is appended"""
+    __slots__ = ('days', 'counts', 'cents')
+
+    def __init__(self):
+        self.days, self.counts, self.cents = array('i'), array('i'), array('q')
+
+    def index(self, day):
+        """Position of day in arrays, -1 if there are no loads on day"""
+        index = bisect_left(self.days, day)
+        return index if index < len(self.days) and self.days[index] == day else -1
+
+    def count(self, day):
+        index = self.index(day)
+        return self.counts[index] if index >= 0 else 0
+
+    def amount(self, day):
+        index = self.index(day)
+        return self.cents[index] if index >= 0 else 0
+
+    def total(self, first, last, calendar=None):
+        """Amount of days in [first, last), every day is counted with its multiplier"""
+        days, cents, multiplier = self.days, self.cents, (calendar or CALENDAR).multiplier
+        return sum(cents[index] * multiplier(days[index]) for index in range(bisect_left(days, first), bisect_left(days, last)))
+
+    def add(self, day, cents):
+        index = bisect_left(self.days, day)
+        if index < len(self.days) and self.days[index] == day:
+            self.counts[index] += 1
+            self.cents[index] += cents
+        else:
+            self.days.insert(index, day)
+            self.counts.insert(index, 1)
+            self.cents.insert(index, cents)
+
+    def clear(self, first=None, last=None):
+        """Forgets loads of days in [first, last), all loads by default"""
+        start = 0 if first is None else bisect_left(self.days, first)
+        stop = len(self.days) if last is None else bisect_left(self.days, last)
+        for values in (self.days, self.counts, self.cents):
+            del values[start:stop]
+
+_STORAGE = {'prime': Usage()}  # customer id -> Usage, 'prime' is usage of prime loads of all customers
+_DECISIONS = {}  # (load id, customer id) -> accepted, for retried loads
+_HISTORY = {'prime':{}}  # customer id -> epoch-day -> processed Load records in processing order, for corrections
+_SEQUENCE = count()  # processing order of loads
+_CORRECTIONS = {'enabled': False}  # history is kept only when corrections are applied after input, see main
+
+# calendar lookup tables:
+class Calendar:
+    """ Per-day values of Usage buckets: load.day is epoch-day, index of the day in lookup tables of
+        date, ISO year-week, weekday and multiplier. Every table of CALENDAR_RANGE is filled once, when a rule first
+        needs it; loads dated out of that range are computed per call."""
+
+    def __init__(self, start=None, end=None, dividers=None):
+        start, end = start or CALENDAR_RANGE[0], end or CALENDAR_RANGE[1]
+        self.first, self.last = start.toordinal() - EPOCH, end.toordinal() - EPOCH
+        self.dividers = dividers or DIVIDER_PER_DAY
+
+    @cached_property
+    def dates(self):
+        return [date.fromordinal(day + EPOCH) for day in range(self.first, self.last)]
+
+    @cached_property
+    def weeks(self):
+        """ISO year-week encoded as integer, e.g. 200052 for 2000-W52"""
+        return array('l', (year * 100 + week for year, week, _ in map(date.isocalendar, self.dates)))
+
+    @cached_property
+    def weekdays(self):
+        return array('b', ((day + 3) % 7 for day in range(self.first, self.last)))  # 1970-01-01 is Thursday
+
+    @cached_property
+    def multipliers(self):
+        by_weekday = [self.dividers.get(name, 1) for name in WEEKDAYS]
+        return [by_weekday[weekday] for weekday in self.weekdays]
+
+    def with_dividers(self, dividers):
+        """Returns calendar with other multipliers, already computed date tables are shared"""
+        calendar = copy(self)
+        calendar.dividers = dividers
+        calendar.__dict__.pop('multipliers', None)
+        return calendar
+
+    def __getitem__(self, day):
+        """Returns (date, ISO year-week, weekday, multiplier) for given epoch-day"""
+        return self.date(day), self.week(day), self.weekday(day), self.multiplier(day)
+
+    def date(self, day):
+        if self.first <= day < self.last:
+            return self.dates[day - self.first]
+        return date.fromordinal(day + EPOCH)
+
+    def week(self, day):
+        if self.first <= day < self.last:
+            return self.weeks[day - self.first]
+        year, week, _ = self.date(day).isocalendar()
+        return year * 100 + week
+
+    def weekday(self, day):
+        if self.first <= day < self.last:
+            return self.weekdays[day - self.first]
+        return (day + 3) % 7
+
+    def multiplier(self, day):
+        if self.first <= day < self.last:
+            return self.multipliers[day - self.first]
+        return self.dividers.get(WEEKDAYS[self.weekday(day)], 1)
+
+CALENDAR = Calendar()
+
+# limits config:
+Rules = namedtuple('Rules', 'version tier limits min_amount max_amount daily weekly prime loads_per_day primes_per_day calendar')
+
+def compile_rules(version=0, tier='default', limits=None, dividers=None, base=None):
+    """ Compiles limits and weekday multipliers into immutable rule parameters, amounts are in integer cents.
+        Not given values are taken from base rules, or from LIMITS and DIVIDER_PER_DAY"""
+    limits = MappingProxyType(dict(base.limits if base else LIMITS) | (limits or {}))
+    calendar = base.calendar if base and not dividers else CALENDAR.with_dividers(
+        MappingProxyType(dict(base.calendar.dividers if base else DIVIDER_PER_DAY) | (dividers or {})))
+    amount = lambda name: int(Decimal(limits[name]).quantize(Decimal('0.01')).scaleb(2))
+    return Rules(version, tier, limits, amount('MIN_AMOUNT'), amount('MAX_AMOUNT'), amount('DAILY'), amount('WEEKLY'),
+                 amount('PRIME'), limits['LOADS_PER_DAY'], limits['PRIMES_PER_DAY'], calendar)
+
+def load_config(path=None):
+    """ Reads versioned config file, compiles rules for every tier and index of customer overrides.
+        Format: {"version": 1, "tiers": {"default": {"limits": {...}, "dividers": {...}}, "<tier>": {...}},
+                 "customers": {"<customer_id>": {"tier": "<tier>", "limits": {...}}}}
+        Default tier is based on LIMITS and DIVIDER_PER_DAY, other tiers are based on default tier,
+        customer limits are based on customer tier"""
+    return compile_config(json.loads(Path(path or CONFIG_PATH).read_text()))
+
+def compile_config(config):
+    """Compiles parsed config of load_config format into (rules by tier, rules by customer id) index"""
+    version, tiers = config.get('version', 0), config.get('tiers', {})
+    default = compile_rules(version, **tiers.get('default', {}))
+    index = {'default': default} | {tier: compile_rules(version, tier, base=default, **params)
+                                    for tier, params in tiers.items() if tier != 'default'}, {}
+    for customer_id, params in config.get('customers', {}).items():
+        override(customer_id, index=index, **params)
+    return index
+
+_RULES = ({'default': compile_rules()}, {})  # (rules by tier, rules by customer id)
+_CONFIG = {'source': None, 'checked': 0.0}
+
+def reload_config(path=None, force=False):
+    """ Reloads rules if config file was changed, checks file not often than CONFIG_CHECK_INTERVAL.
+        New rules replace old ones by single assignment, so every decision uses one consistent version"""
+    global _RULES
+    if not force and monotonic() - _CONFIG['checked'] < CONFIG_CHECK_INTERVAL:
+        return _RULES
+    _CONFIG['checked'] = monotonic()
+    path = Path(path or CONFIG_PATH)
+    try:
+        source = (path, path.stat().st_mtime_ns)
+    except FileNotFoundError:
+        return _RULES
+    if force or source != _CONFIG['source']:
+        _RULES, _CONFIG['source'] = load_config(path), source
+    return _RULES
+
+def override(customer_id, tier='default', limits=None, index=None):
+    """ Sets tier and own limits of one customer in index, other entries are not recompiled.
+        Customer without tier and limits falls back to default rules"""
+    tiers, customers = index or _RULES
+    rules = tiers.get(tier) or tiers['default']
+    if limits:
+        rules = compile_rules(rules.version, rules.tier, limits, base=rules)
+    if rules is tiers['default']:
+        customers.pop(int(customer_id), None)
+    else:
+        customers[int(customer_id)] = rules
+    return rules
+
+def get_rules(customer_id=None, tier='default', index=None, **kwargs):
+    """Returns compiled rules of customer: own override, given tier or default tier, no scan or file access"""
+    tiers, customers = index or _RULES
+    return customers.get(customer_id) or tiers.get(tier) or tiers['default']
+
+def epoch_day(time=None, day=None, **kwargs):
+    """Returns epoch-day for a given load, calculated from time if not stored yet"""
+    return (time.toordinal() - EPOCH) if day is None else day
+
+def is_prime(number):
+    """ Checks if number is prime.
+        sympy is heavy, it is imported on first call only, after that is_prime is sympy function itself."""
+    global is_prime
+    from sympy.ntheory import isprime as is_prime
+    return is_prime(number)
 
 # work with storage:
-def get_divider_by_day(time=None,**kwargs):
+def get_divider_by_day(calendar=None, **kwargs):
     """ Returns multiplier by day of week for given time.
         Multiplier is used to calculate daily load amount."""
-    return DIVIDER_PER_DAY.setdefault(time.strftime('%A'), 1)
+    return (calendar or CALENDAR).multiplier(epoch_day(**kwargs))
 
-def daily(default=list, time=None, **kwargs):
-    """Returns daily loads for a given customer and time or empty list"""
-    return by_customer(**kwargs).setdefault(time.date(), default())
+def daily_count(customer_id, day):
+    """Returns number of stored loads of customer on epoch-day"""
+    return by_customer(customer_id).count(day)
 
-def daily_amount(**kwargs):
-    """Returns daily load amount for a given customer and time
+def daily_amount(customer_id, day, calendar=None):
+    """Returns daily load amount in cents for a given customer and epoch-day
         For different days are used different multipliers"""
-    return sum(amount * get_divider_by_day(**kwargs) for amount in daily(**kwargs))
+    return by_customer(customer_id).amount(day) * (calendar or CALENDAR).multiplier(day)
 
-def weekly_amount(*args, time=None, **kwargs):
-    """Returns weekly load amount for a given customer and time"""
-    weekday = time.weekday()
-    week = [time + timedelta(days=i) for i in range(-weekday, 7 - weekday)]
-    return sum(daily_amount(*args, time=day, **kwargs) for day in week)
+def weekly_amount(customer_id, day, calendar=None):
+    """Returns weekly load amount in cents for a given customer and epoch-day, week starts on Monday"""
+    monday = day - CALENDAR.weekday(day)
+    return by_customer(customer_id).total(monday, monday + 7, calendar)
 
-def by_customer(*args, default=dict, customer_id=None, **kwargs):
-    """Returns dict with daily loads for a given customer, keys are dates"""
-    customer = customer_id
-    return _STORAGE.setdefault(getattr(customer, 'pk', None) or customer or 0, default())
+def by_customer(customer_id=None):
+    """Returns usage of a given customer, 'prime' is usage of prime loads of all customers"""
+    usage = _STORAGE.get(customer_id)
+    if usage is None:
+        usage = _STORAGE[customer_id] = Usage()
+    return usage
 
-# validators:
-def validate_min_amount(load):
+# validators, rules are compiled config of customer tier, amounts are in cents:
+def validate_min_amount(load, rules=None):
     """Validate min value of load amount"""
-    limit = LIMITS['MIN_AMOUNT']
-    if load['load_amount'] < Decimal(limit).quantize(Decimal('0.01')):
-        raise ValueError(f"Load amount cannot be less than {limit}")
+    rules = rules or get_rules(load.customer_id)
+    if load.cents < rules.min_amount:
+        raise ValueError(f"Load amount cannot be less than {rules.limits['MIN_AMOUNT']}")
 
-def validate_max_amount(load):
+def validate_max_amount(load, rules=None):
     """Validate max value of load amount"""
-    limit = LIMITS['MAX_AMOUNT']
-    if load['load_amount'] > Decimal(limit).quantize(Decimal('0.01')):
-        raise ValueError(f"Load amount cannot exceed {limit}")
+    rules = rules or get_rules(load.customer_id)
+    if load.cents > rules.max_amount:
+        raise ValueError(f"Load amount cannot exceed {rules.limits['MAX_AMOUNT']}")
 
-def validate_prime_max_amount(load):
+def validate_prime_max_amount(load, rules=None):
     """Validate max value of load amount for prime IDs"""
-    limit = LIMITS['PRIME']
-    if load['prime'] and load['load_amount'] > Decimal(limit).quantize(Decimal('0.01')):
-            raise ValueError(f"Load amount exceeds {limit} limit for prime IDs")
+    rules = rules or get_rules(load.customer_id)
+    if load.prime and load.cents > rules.prime:
+            raise ValueError(f"Load amount exceeds {rules.limits['PRIME']} limit for prime IDs")
 
-def validate_loads_per_day(load):
+def validate_loads_per_day(load, rules=None):
     """Validate max number of loads per day per customer"""
-    limit = LIMITS['LOADS_PER_DAY']
-    if len(daily(**load)) >= limit:
-        raise ValueError(f"Exceeded {limit} load attempts per day")
+    rules = rules or get_rules(load.customer_id)
+    if daily_count(load.customer_id, load.day) >= rules.loads_per_day:
+        raise ValueError(f"Exceeded {rules.loads_per_day} load attempts per day")
 
-def validate_primes_per_day(load):
+def validate_primes_per_day(load, rules=None):
     """Validate max number of prime IDs per day for all customers"""
-    limit = LIMITS['PRIMES_PER_DAY']
-    if load['prime'] and len(daily(**(load | {'customer_id':'prime'}))) >= limit:
-        raise ValueError(f"Exceeded {limit} prime IDs per day")
+    rules = rules or get_rules(load.customer_id)
+    if load.prime and daily_count('prime', load.day) >= rules.primes_per_day:
+        raise ValueError(f"Exceeded {rules.primes_per_day} prime IDs per day")
 
 # calculated limits validators
-def validate_daily_amount(load):
+def validate_daily_amount(load, rules=None):
     """Validate maximum allowed daily load amount for customer"""
-    limit = LIMITS['DAILY']
-    if (daily_amount(**load) + load['load_amount']) > Decimal(limit).quantize(Decimal('0.01')):
-        raise ValueError(f"Daily limit of {limit} exceeded")
+    rules = rules or get_rules(load.customer_id)
+    if (daily_amount(load.customer_id, load.day, rules.calendar) + load.cents) > rules.daily:
+        raise ValueError(f"Daily limit of {rules.limits['DAILY']} exceeded")
 
-def validate_weekly_amount(load):
+def validate_weekly_amount(load, rules=None):
     """Validate maximum allowed weekly load amount for customer"""
-    limit = LIMITS['WEEKLY']
-    if (weekly_amount(**load) + load['load_amount']) > Decimal(limit).quantize(Decimal('0.01')):
-        raise ValueError(f"Weekly limit of {limit} exceeded")
+    rules = rules or get_rules(load.customer_id)
+    if (weekly_amount(load.customer_id, load.day, rules.calendar) + load.cents) > rules.weekly:
+        raise ValueError(f"Weekly limit of {rules.limits['WEEKLY']} exceeded")
 
 # clean an store entity
+def clean_amount(load_amount):
+    """Amount in dollars as integer cents, '$' prefix is optional"""
+    return int(Decimal(load_amount.rpartition('$')[-1]).quantize(Decimal('0.01')).scaleb(2))
+
 def clean(id=None, load_amount=None, time=None, customer_id=None, **kwargs):
-    """Clean input data and returns dictionary with validated fields"""
-    return {"id": int(id),
-            "customer_id": int(customer_id),
-            "load_amount": Decimal(load_amount.rpartition('$')[-1]).quantize(Decimal('0.01')),
-            "time": datetime.fromisoformat(f"{time.rstrip('Z')}+00:00"),
-            "prime": is_prime(int(id))
-            }
+    """Clean input data and returns compact Load record, only epoch-day of time is kept"""
+    return Load(int(id), int(customer_id), clean_amount(load_amount),
+                epoch_day(datetime.fromisoformat(f"{time.rstrip('Z')}+00:00")), is_prime(int(id)))
 
 def store(load):
     """Store load entity in storage"""
-    daily(**load).append(load.get('load_amount'))
-    if load['prime']:
-        daily(**(load | {'customer_id':'prime'})).append(load.get('load_amount'))
+    by_customer(load.customer_id).add(load.day, load.cents)
+    if load.prime:
+        _STORAGE['prime'].add(load.day, load.cents)
+
+def remember(load):
+    """Keeps processed load (accepted or not) in history in processing order, history is used by corrections"""
+    load.seq = next(_SEQUENCE)
+    _HISTORY.setdefault(load.customer_id, {}).setdefault(load.day, []).append(load)
+    if load.prime:
+        _HISTORY['prime'].setdefault(load.day, []).append(load)
+
+# Business logic implementation, rules are checked in given order, reason code of rejection is limit name
+BUSINESS_RULES = [
+    # mix/max validators
+    ('MIN_AMOUNT', validate_min_amount),
+    ('MAX_AMOUNT', validate_max_amount),
+    ('PRIME', validate_prime_max_amount),
+
+    # counters validators
+    ('LOADS_PER_DAY', validate_loads_per_day),
+    ('PRIMES_PER_DAY', validate_primes_per_day),
 
-# Business logic implementation
-def is_valid(load):
-    """Validates load entity against business rules"""
+    # calculated limits validators
+    ('DAILY', validate_daily_amount),
+    ('WEEKLY', validate_weekly_amount),
+]
+
+def is_valid(load, rules=None, timings=None):
+    """ Validates load entity against business rules, reason code of rejection is recorded in load.
+        If timings dict is given, nanoseconds spent in every checked rule are recorded in it"""
+    rules = rules or get_rules(load.customer_id)
     try:
-        # mix/max validators
-        validate_min_amount(load)
-        validate_max_amount(load)
-        validate_prime_max_amount(load)
-
-        # counters validators
-        validate_loads_per_day(load)
-        validate_primes_per_day(load)
-
-        # calculated limits validators
-        validate_daily_amount(load)
-        validate_weekly_amount(load)
+        for load.reason, validator in BUSINESS_RULES:
+            if timings is None:
+                validator(load, rules)
+            else:
+                start = perf_counter_ns()
+                try:
+                    validator(load, rules)
+                finally:
+                    timings[load.reason] = perf_counter_ns() - start
+        load.reason = None
         return True
 
     except Exception as error:  # noqa
         ...
 
-def prepare_response(load):
-    """Prepares response for output file"""
-    return {"id": load['id'], "customer_id": load['customer_id'], "accepted": bool(is_valid(load))}
+def prepare_response(load, timings=None):
+    """ Prepares response for output file, config version used for decision is recorded in load.
+        Retried load (same id and customer) gets original decision without validation and is marked as retry"""
+    key = (load.id, load.customer_id)
+    accepted = _DECISIONS.get(key)
+    if accepted is None:
+        rules = get_rules(load.customer_id)
+        load.version = rules.version
+        accepted = _DECISIONS[key] = bool(is_valid(load, rules, timings))
+    else:
+        load.retry = True
+    return {"id": load.id, "customer_id": load.customer_id, "accepted": accepted}
+
+# corrections of processed loads:
+def correct(id=None, customer_id=None, load_amount=None, removed=False, **kwargs):
+    """ Amends amount of processed load or removes it (chargeback) and re-adjudicates affected loads.
+        Returns responses of loads with flipped decision, in processing order"""
+    key = (int(id), int(customer_id))
+    load = next((load for loads in _HISTORY.get(key[1], {}).values() for load in loads if load.id == key[0]), None)
+    if load is None:
+        raise KeyError(f'Load {key[0]} of customer {key[1]} was not processed')
+    if removed:
+        for history in (_HISTORY[key[1]], _HISTORY['prime']):
+            if load.day in history:
+                history[load.day] = [item for item in history[load.day] if item is not load]
+        _DECISIONS.pop(key)
+    else:
+        load.cents = clean_amount(load_amount)
+    return readjudicate(key[1], load.day)
+
+def readjudicate(customer_id, day):
+    """ Replays loads of customer from given day through the end of its ISO week.
+        Prime loads of other customers on these days are checked against replayed prime slots, when slot result
+        differs from original decision, that customer is replayed too. Returns responses of flipped decisions"""
+    days = range(day, day - CALENDAR.weekday(day) + 7)
+    affected, before = {customer_id}, {}
+    while (dependent := replay(affected, days, before)) is not None:
+        affected.add(dependent)
+    return [{"id": key[0], "customer_id": key[1], "accepted": not accepted}
+            for key, (seq, accepted) in sorted(before.items(), key=itemgetter(1)) if _DECISIONS[key] != accepted]
+
+def replay(affected, days, before):
+    """ Re-adjudicates loads of affected customers on given days in processing order, original decisions are
+        collected in before. Returns customer whose prime load depends on changed prime slot, None when done"""
+    primes, first, last = _STORAGE['prime'], days.start, days.stop
+    primes.clear(first, last)
+    for customer in affected:
+        by_customer(customer).clear(first, last)
+    loads = [load for day in days for customer in affected for load in _HISTORY.get(customer, {}).get(day, ())]
+    loads += [load for day in days for load in _HISTORY['prime'].get(day, ()) if load.customer_id not in affected]
+    for load in sorted(loads, key=attrgetter('seq')):
+        if load.customer_id in affected:
+            key, rules = (load.id, load.customer_id), get_rules(load.customer_id)
+            before.setdefault(key, (load.seq, _DECISIONS[key]))
+            load.version = rules.version
+            accepted = _DECISIONS[key] = bool(is_valid(load, rules))
+            if accepted:
+                store(load)
+        elif load.reason in (None, 'PRIMES_PER_DAY', 'DAILY', 'WEEKLY'):  # decision passed prime slot check
+            if (primes.count(load.day) < get_rules(load.customer_id).primes_per_day) != (load.reason != 'PRIMES_PER_DAY'):
+                return load.customer_id
+            if load.reason is None:
+                primes.add(load.day, load.cents)
+    return None
+
+def serialize(response):
+    """Output line of response, fixed template is filled instead of json.dumps"""
+    return RESPONSE_TEMPLATE.format(response['id'], response['customer_id'], ('false', 'true')[response['accepted']])
+
+@contextmanager
+def open_output(output='output.txt', compression=None, buffer_size=OUTPUT_BUFFER_SIZE):
+    """ Opens text stream for results: file or stdout ('-'), optionally compressed by stdlib codec.
+        Writes are collected in large buffer, compressor and file get them in big chunks"""
+    with ExitStack() as stack:
+        if str(output) == '-':
+            target = stack.enter_context(open(sys.stdout.fileno(), 'wb', buffering=0, closefd=False))
+        else:
+            target = stack.enter_context((BASE_PATH / output).open('wb', buffering=0))
+        if compression:
+            target = stack.enter_context(import_module(COMPRESSORS[compression]).open(target, 'wb'))
+        yield stack.enter_context(io.TextIOWrapper(io.BufferedWriter(target, buffer_size), encoding='utf-8'))
+
+def read(filename='input.txt'):
+    """Reads input file iterative, line by line"""
+    with (BASE_PATH / filename).open('r') as source:
+        yield from source
 
 def parse(filename='input.txt'):
     """Parses input file iterative, line by line"""
+    for line in read(filename):
+        yield clean(**json.loads(line))
+
+def parse_lines(lines):
+    """Parses batch of input lines, parse stage of pipeline"""
+    return [clean(**json.loads(line)) for line in lines]
+
+def parse_corrections(filename):
+    """Parses corrections file: json lines with id, customer_id and new load_amount or "removed": true"""
     with (BASE_PATH / filename).open('r') as source:
         for line in source:
+            yield json.loads(line)
+
+def record(log, load, response, timings):
+    """Puts decision with reason code and rule timings into decision log"""
+    log.record(response | {'reason': load.reason, 'version': load.version, 'retry': load.retry, 'timings': timings})
+
+def keep(load, response):
+    """Keeps decided load: usage of accepted load and, only when corrections are applied, history; retries are kept once"""
+    if not load.retry:
+        if _CORRECTIONS['enabled']:
+            remember(load)
+        if response['accepted']:
+            store(load)
+
+def decide(load, log=None):
+    """Adjudicates cleaned load: decision, history and storage of accepted load and decision log, returns response"""
+    timings = {} if log else None
+    response = prepare_response(load, timings)
+    keep(load, response)
+    if log:
+        record(log, load, response, timings)
+    return response
+
+def handle(load, result, log=None):
+    """Adjudicates cleaned load and writes output line"""
+    result.write(serialize(decide(load, log)))
+
+# staged pipeline, see pipeline.py:
+def default_jobs():
+    """Parse workers of pipelined main: every core on free-threaded Python, with GIL main is sequential (0)"""
+    return 0 if getattr(sys, '_is_gil_enabled', lambda: True)() else os.cpu_count()
+
+def pipelined(result, filename='input.txt', config=None, log=None, jobs=None):
+    """ Runs input through reader, parse pool and writer threads, validation stays on current thread in input order.
+        Limits config is checked for changes once per batch"""
+    from pipeline import Pipeline
+
+    def validate(loads):
+        reload_config(config)
+        return [decide(load, log) for load in loads]
+
+    write = lambda responses: result.write(''.join(map(serialize, responses)))
+    Pipeline(parse_lines, validate, write, jobs).run(BASE_PATH / filename)
+
+# profiling of sampled loads, see profiler.py:
+def profiled_parse(profiler, filename='input.txt'):
+    """Parses input like parse, stages of sampled load are profiled, its sample is kept as profiler.current"""
+    for line in read(filename):
+        sample = profiler.current = profiler.sample()
+        if sample is None:
             yield clean(**json.loads(line))
+            continue
+        with sample.stage('parse'):
+            data = json.loads(line)
+        with sample.stage('clean'):
+            load = clean(**data)
+        yield load
 
-def main(*args, **kwargs):
+def profiled_handle(sample, load, result, log=None):
+    """Handles load like handle, every stage is profiled and time of business rules is aggregated by rule"""
+    timings = {}
+    with sample.stage('validate'):
+        response = prepare_response(load, timings)
+    sample.add_rules('validate', timings)
+    with sample.stage('store'):
+        keep(load, response)
+    with sample.stage('serialize'):
+        result.write(serialize(response))
+    if log:
+        with sample.stage('record'):
+            record(log, load, response, timings)
+    sample.finish()
+
+def main(*args, output='output.txt', config=None, decisions=None, compression=None, corrections=None, diff='diff.txt',
+         profile=None, profile_fraction=PROFILE_FRACTION, profile_stacks=False, jobs=None, **kwargs):
     """ Main entry point.
         Loads input file into memory
-        validates each load-record and stores responses line by line"""
-    with (BASE_PATH / 'output.txt').open('w') as result:
-        for load in parse(*args, **kwargs):
-            response = prepare_response(load)
-            if response['accepted']:
-                store(load)
-            result.writelines(json.dumps(response) + '\n')
-    print('Success')
+        validates each load-record and stores responses line by line, output '-' is stdout
+        limits config is reloaded on the fly when config file changes
+        if decisions path is given, every decision is written there by background decision log
+        if corrections file is given, it is applied after input and flipped decisions are written to diff file
+        if profile path is given, profile_fraction of loads is profiled by stages and rules, collapsed stacks
+        (of every call with profile_stacks) are written to profile path and report is printed
+        with parse jobs (default_jobs() if not given) input goes through staged pipeline, profiling is sequential"""
+    reload_config(config, force=True)
+    _CORRECTIONS['enabled'] = bool(corrections)
+    log = profiler = None
+    if decisions:
+        from decision_log import DecisionLog
+        log = DecisionLog(BASE_PATH / decisions)
+    if profile:
+        from profiler import Profiler
+        profiler = Profiler(BASE_PATH / profile, profile_fraction, profile_stacks)
+    jobs = 0 if profiler else default_jobs() if jobs is None else jobs
+    try:
+        with open_output(output, compression) as result:
+            if jobs:
+                pipelined(result, *args, config=config, log=log, jobs=jobs, **kwargs)
+            elif profiler:
+                for load in profiled_parse(profiler, *args, **kwargs):
+                    reload_config(config)
+                    if profiler.current is None:
+                        handle(load, result, log)
+                    else:
+                        profiled_handle(profiler.current, load, result, log)
+            else:
+                for load in parse(*args, **kwargs):
+                    reload_config(config)
+                    handle(load, result, log)
+    finally:
+        if log:  # decisions made before an error are written too
+            log.close()
+    if corrections:
+        with open_output(diff) as result:
+            for correction in parse_corrections(corrections):
+                result.writelines(map(serialize, correct(**correction)))
+    console = sys.stderr if str(output) == '-' else sys.stdout
+    if profiler:
+        print(json.dumps(profiler.close()), file=console)
+    print('Success', file=console)
+
+def cli(argv=None):
+    """ Console entry point `fund-load [input] [-o output] [-z codec]`.
+        Relative paths are resolved against current directory, defaults are input.txt and output.txt near the script"""
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog='fund-load', description='Adjudicates fund load attempts from input file')
+    parser.add_argument('filename', nargs='?', type=Path, default=BASE_PATH / 'input.txt')
+    parser.add_argument('-o', '--output', type=Path, default=BASE_PATH / 'output.txt', help="output file, '-' is stdout")
+    parser.add_argument('-z', '--compress', choices=COMPRESSORS, help='compress output stream')
+    parser.add_argument('-c', '--config', type=Path, default=CONFIG_PATH, help='limits config, reloaded on change')
+    parser.add_argument('-d', '--decisions', type=Path, help='decision log file, rotated by size')
+    parser.add_argument('-r', '--corrections', type=Path, help='amended or removed loads, applied after input')
+    parser.add_argument('--diff', type=Path, default=BASE_PATH / 'diff.txt', help='flipped decisions of corrections')
+    parser.add_argument('--profile', type=Path, nargs='?', const=BASE_PATH / 'profile.txt',
+                        help='profile sampled loads, collapsed stacks for flame graph are written to file')
+    parser.add_argument('--profile-fraction', type=float, default=PROFILE_FRACTION, help='part of loads to profile')
+    parser.add_argument('--profile-stacks', action='store_true', help='trace every call of profiled loads')
+    parser.add_argument('-j', '--jobs', type=int, help='parse threads of staged pipeline, 0 is sequential, '
+                                                       'default is every core on free-threaded Python else 0')
+    args = parser.parse_args(argv)
+    output = args.output if str(args.output) == '-' else args.output.resolve()
+    main(filename=args.filename.resolve(), output=output, config=args.config.resolve(),
+         decisions=args.decisions and args.decisions.resolve(), compression=args.compress,
+         corrections=args.corrections and args.corrections.resolve(), diff=args.diff.resolve(),
+         profile=args.profile and args.profile.resolve(), profile_fraction=args.profile_fraction,
+         profile_stacks=args.profile_stacks, jobs=args.jobs)
 
 if __name__ == '__main__':
-    main()  # pragma: no cover
\ No newline at end of file
+    cli()  # pragma: no cover
\ No newline at end of file
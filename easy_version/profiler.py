@@ -0,0 +1,120 @@
+import sys
+import threading
+from collections import Counter
+from math import floor
+from pathlib import Path
+from time import perf_counter_ns
+
+
+class Sample:
+    """ Timings of one sampled load of the input file, taken by `with sample.stage(name):` around parse, clean,
+        validate, store, serialize and record. `stages` is time of a stage including stages inside it,
+        `stacks` is time spent in a frame itself, keyed fund-load;stage[;inner stage] or fund-load;stage;rule.
+        profile_stacks mode hooks sys.setprofile for the outermost stage, every function called there
+        becomes a frame below the stage."""
+
+    def __init__(self, profiler):
+        self.profiler, self.frames, self.floors, self.starts = profiler, [profiler.root], [], []
+        self.stacks, self.stages, self.rules = Counter(), Counter(), Counter()
+        self.mark = 0
+
+    def stage(self, name):
+        self.frames.append(name)
+        return self
+
+    def __enter__(self):
+        now = perf_counter_ns()
+        if self.floors:  # time before nested stage belongs to parent stage
+            self.stacks[';'.join(self.frames[:-1])] += now - self.mark
+        self.floors.append(len(self.frames))
+        self.starts.append(now)
+        self.mark = now
+        if self.profiler.traced and len(self.floors) == 1:
+            sys.setprofile(self.trace)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler.traced and len(self.floors) == 1:
+            sys.setprofile(None)
+        now = perf_counter_ns()
+        del self.frames[self.floors.pop():]
+        self.stacks[';'.join(self.frames)] += now - self.mark
+        self.stages[self.frames.pop()] += now - self.starts.pop()
+        self.mark = now
+
+    def trace(self, frame, event, arg):
+        """Profile hook of profile_stacks mode: nanoseconds since previous call or return go to the frame on top"""
+        module = frame.f_globals.get('__name__')
+        if module == __name__:  # calls of profiler itself are not profiled
+            return
+        self.stacks[';'.join(self.frames)] += perf_counter_ns() - self.mark
+        if event == 'call':
+            self.frames.append(f'{module}.{frame.f_code.co_qualname}')
+        elif event == 'c_call':
+            self.frames.append(f"{getattr(arg, '__module__', None) or 'builtins'}.{getattr(arg, '__qualname__', arg)}")
+        elif len(self.frames) > self.floors[-1]:  # return of call made before stage is not in the stack
+            self.frames.pop()
+        self.mark = perf_counter_ns()  # time of hook itself is not counted
+
+    def add_rules(self, stage, timings):
+        """Adds is_valid rule timings of the load, in collapsed stacks rule time is moved from stage to its rule frame"""
+        path = ';'.join(self.frames + [stage])
+        for rule, ns in timings.items():
+            self.rules[f'{stage};{rule}'] += ns
+            if not self.profiler.traced:  # traced stacks have validator calls already
+                self.stacks[path] -= ns
+                self.stacks[f'{path};{rule}'] += ns
+
+    def finish(self):
+        self.profiler.merge(self)
+
+
+class Profiler:
+    """ `fund-load --profile`: samples `fraction` of input loads, evenly spaced (fraction 0.01 is every 100th load)
+        so the same input gives the same samples. Samples are summed into totals per stage and per rule,
+        close() writes the summed stacks as "frame;frame ns" lines, the input format of flamegraph.pl,
+        speedscope and inferno, and returns the report printed by main.
+        A load which is not sampled costs one sample() call."""
+
+    def __init__(self, path=None, fraction=0.01, traced=False, root='fund-load'):
+        self.path, self.fraction, self.traced, self.root = path and Path(path), fraction, traced, root
+        self.seen, self.samples, self.current = 0, 0, None
+        self.stacks, self.stages, self.rules, self.counts = Counter(), Counter(), Counter(), Counter()
+        self.lock = threading.Lock()
+
+    def sample(self):
+        """New Sample if this load is sampled, else None"""
+        with self.lock:
+            self.seen += 1
+            if floor(self.seen * self.fraction) == floor((self.seen - 1) * self.fraction):
+                return None
+        return Sample(self)
+
+    def merge(self, sample):
+        with self.lock:
+            self.samples += 1
+            self.stacks.update(sample.stacks)
+            self.stages.update(sample.stages)
+            self.rules.update(sample.rules)
+            self.counts.update(sample.stages.keys() | sample.rules.keys())
+
+    def report(self):
+        """Total and mean nanoseconds of every stage and rule over sampled loads"""
+        with self.lock:
+            totals = lambda values: {name: {'total_ns': ns, 'mean_ns': ns // self.counts[name], 'count': self.counts[name]}
+                                     for name, ns in sorted(values.items())}
+            return {'loads': self.seen, 'samples': self.samples, 'stages': totals(self.stages), 'rules': totals(self.rules)}
+
+    def write(self, path=None):
+        """Writes collapsed stacks, heaviest first"""
+        with self.lock:
+            lines = [f'{stack} {ns}\n' for stack, ns in self.stacks.most_common() if ns > 0]
+        path = Path(path or self.path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(''.join(lines))
+
+    def close(self):
+        """Writes collapsed stacks to path if given, returns report"""
+        if self.path:
+            self.write()
+        return self.report()
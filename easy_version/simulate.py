@@ -0,0 +1,102 @@
+"""
+What-if simulation of limit changes over processed history.
+Input file is parsed and cleaned once, every scenario (candidate limits and multipliers for default tier)
+replays all loads in own worker process and returns acceptance, rejections by rule and amount totals.
+Scenario changes default tier of config, other tiers and customer overrides keep own values on top of it,
+so every customer is adjudicated with own rules as in main.
+"""
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from pathlib import Path
+
+import plain
+
+_SHARED = {'loads': (), 'config': {}, 'customers': ()}  # parsed loads, config and customers, set once per worker process
+
+
+def prepare(filename='input.txt'):
+    """ Parses and cleans input once for all scenarios.
+        Retries (same id and customer) repeat original decision in every scenario, they are counted only"""
+    loads, keys, retries = [], set(), 0
+    for load in plain.parse(filename):
+        key = (load.id, load.customer_id)
+        if key in keys:
+            retries += 1
+        else:
+            keys.add(key)
+            loads.append(load)
+    return loads, retries
+
+
+def share(loads, config=None):
+    """Worker initializer: keeps parsed loads, parsed config and customers of loads in worker process"""
+    _SHARED['loads'] = loads
+    _SHARED['config'] = json.loads(Path(config).read_text()) if config else {}
+    _SHARED['customers'] = {load.customer_id for load in loads}
+
+
+def with_scenario(config, limits=None, dividers=None):
+    """Copy of config with limits and dividers of scenario applied to its default tier"""
+    tiers = config.get('tiers', {})
+    default = tiers.get('default', {})
+    default = {'limits': default.get('limits', {}) | (limits or {}),
+               'dividers': default.get('dividers', {}) | (dividers or {})}
+    return config | {'tiers': tiers | {'default': default}}
+
+
+def simulate(scenario):
+    """Replays shared loads against one scenario (name, {"limits": {...}, "dividers": {...}}) in fresh storage"""
+    name, params = scenario
+    index = plain.compile_config(with_scenario(_SHARED['config'], **params))
+    rules = {customer_id: plain.get_rules(customer_id, index=index) for customer_id in _SHARED['customers']}
+    plain._STORAGE.clear()
+    plain._STORAGE['prime'] = plain.Usage()
+    rejected, amounts = Counter(), Counter(accepted=0, rejected=0)
+    for load in _SHARED['loads']:
+        if plain.is_valid(load, rules[load.customer_id]):
+            plain.store(load)
+            amounts['accepted'] += load.cents
+        else:
+            rejected[load.reason] += 1
+            amounts['rejected'] += load.cents
+    total = len(_SHARED['loads'])
+    accepted = total - rejected.total()
+    return {'scenario': name, 'loads': total, 'accepted': accepted, 'acceptance': round(accepted / (total or 1), 4),
+            'rejected': dict(rejected), 'accepted_amount': str(Decimal(amounts['accepted']).scaleb(-2)),
+            'rejected_amount': str(Decimal(amounts['rejected']).scaleb(-2))}
+
+
+def run(scenarios, filename='input.txt', config=None, processes=None):
+    """ Simulates every scenario of {name: params} dict, returns results in scenarios order.
+        Scenarios are fanned out to worker processes, processes=1 runs them in current process"""
+    loads, retries = prepare(filename)
+    scenarios = list(scenarios.items())
+    processes = processes or min(len(scenarios), os.cpu_count() or 1)
+    if processes == 1:
+        share(loads, config)
+        results = list(map(simulate, scenarios))
+    else:
+        with ProcessPoolExecutor(processes, initializer=share, initargs=(loads, config)) as executor:
+            results = list(executor.map(simulate, scenarios))
+    return [result | {'retries': retries} for result in results]
+
+
+def cli(argv=None):
+    """Console entry point `fund-load-simulate scenarios.json [input] [-c limits.json] [-p processes]`"""
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog='fund-load-simulate', description='Replays fund loads against candidate limits')
+    parser.add_argument('scenarios', type=Path, help='{"name": {"limits": {...}, "dividers": {...}}, ...}')
+    parser.add_argument('filename', nargs='?', type=Path, default=plain.BASE_PATH / 'input.txt')
+    parser.add_argument('-c', '--config', type=Path, help='limits config, its default tier is base of scenarios')
+    parser.add_argument('-p', '--processes', type=int, help='worker processes, default one per scenario up to cpu count')
+    args = parser.parse_args(argv)
+    scenarios = json.loads(args.scenarios.read_text())
+    for result in run(scenarios, args.filename.resolve(), args.config and args.config.resolve(), args.processes):
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    cli()  # pragma: no cover
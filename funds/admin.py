@@ -1,3 +1,93 @@
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.urls import reverse
+from django.utils.html import format_html
 
-# Register your models here.
+from .calendars import CALENDAR
+from .models import CustomerDay, FundLoad
+from .reports import EstimatedCountPaginator, keyset_page
+
+AFTER_VAR = 'after'
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paged by key of the last row (?after=<id>) instead of page number: a page is read after that key
+    in admin ordering, no OFFSET rows are read and skipped, so deep pages cost as the first one.
+    Links go to the first and the next page only, count of results is estimated by the paginator.
+    """
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(AFTER_VAR, None)
+        return params
+
+    def get_results(self, request):
+        try:
+            self.after = int(request.GET[AFTER_VAR]) if AFTER_VAR in request.GET else None
+        except ValueError:
+            raise IncorrectLookupParameters
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.result_list, self.next_after = keyset_page(
+            self.queryset, self.model_admin.ordering[0], self.after, self.list_per_page)
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.full_result_count = None
+        self.can_show_all = False
+        self.multi_page = self.after is not None or self.next_after is not None
+        self.paginator = paginator
+
+    @property
+    def first_page_url(self):
+        return self.get_query_string(remove=[AFTER_VAR]) if self.after is not None else None
+
+    @property
+    def next_page_url(self):
+        return self.get_query_string({AFTER_VAR: self.next_after}) if self.next_after is not None else None
+
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    """
+    Browsing of large tables: keyset pages, estimated counts without full COUNT(*), fixed ordering by indexed
+    unique key, search by exact ids. Rows are written by fund load requests only, admin does not change them.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    sortable_by = ()
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(FundLoad)
+class FundLoadAdmin(ReadOnlyAdmin):
+    list_display = ('id', 'customer_id', 'load_amount', 'time', 'is_prime', 'config_version', 'usage')
+    ordering = ('-id',)
+    search_fields = ('=id', '=customer_id')
+
+    @admin.display(description='usage')
+    def usage(self, obj):
+        return format_html('<a href="{}">daily and weekly</a>', reverse('customer-usage-report', args=[obj.customer_id]))
+
+
+@admin.register(CustomerDay)
+class CustomerDayAdmin(ReadOnlyAdmin):
+    list_display = ('customer_id', 'date', 'week', 'count', 'amount')
+    ordering = ('-id',)
+    search_fields = ('=customer_id',)
+
+    @admin.display(description='date')
+    def date(self, obj):
+        return CALENDAR.date(obj.day)
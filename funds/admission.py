@@ -0,0 +1,154 @@
+import threading
+from collections import Counter
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+from django.urls import Resolver404, resolve
+
+
+class AdaptiveLimit:
+    """
+    AIMD concurrency limit driven by observed latency. Request finished within `target` seconds adds 1/limit,
+    so limit grows by one per limit of fast requests. Slow or failed request multiplies limit by `backoff`,
+    at most once per `target` seconds, so one burst of slow requests is one decrease.
+    """
+
+    def __init__(self, initial=20, minimum=1, maximum=200, target=0.05, backoff=0.9):
+        self.value, self.minimum, self.maximum = float(initial), minimum, maximum
+        self.target, self.backoff = target, backoff
+        self.decreased = float('-inf')
+
+    @property
+    def current(self):
+        return int(self.value)
+
+    def update(self, latency, failed=False, now=None):
+        now = monotonic() if now is None else now
+        if failed or latency > self.target:
+            if now - self.decreased >= self.target:
+                self.value = max(self.minimum, self.value * self.backoff)
+                self.decreased = now
+        else:
+            self.value = min(self.maximum, self.value + 1 / self.value)
+        return self.current
+
+
+class AdmissionController:
+    """
+    Admits at most limit concurrent requests, others wait up to `queue_timeout` seconds for a free slot.
+    Request is shed at once when `queue` requests wait already (429) and when its wait runs out (503),
+    so queued requests never wait longer than their clients would.
+    """
+    STATUS = {'queue_full': (429, 'Too many requests'), 'timeout': (503, 'Service overloaded')}
+
+    def __init__(self, queue=50, queue_timeout=0.1, retry_after=1, **limit):
+        self.limit = AdaptiveLimit(**limit)
+        self.queue, self.queue_timeout, self.retry_after = queue, queue_timeout, retry_after
+        self.inflight, self.waiting, self.admitted = 0, 0, 0
+        self.shed = Counter()
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """None if request is admitted, else reason it is shed: 'queue_full' or 'timeout'"""
+        with self.condition:
+            if self.inflight >= self.limit.current:
+                if self.waiting >= self.queue:
+                    self.shed['queue_full'] += 1
+                    return 'queue_full'
+                self.waiting += 1
+                deadline = monotonic() + self.queue_timeout
+                try:
+                    while self.inflight >= self.limit.current:
+                        remaining = deadline - monotonic()
+                        if remaining <= 0:
+                            self.shed['timeout'] += 1
+                            return 'timeout'
+                        self.condition.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.inflight += 1
+            self.admitted += 1
+            return None
+
+    def release(self, latency, failed=False):
+        """Frees slot of admitted request, its latency adapts the limit"""
+        with self.condition:
+            self.inflight -= 1
+            free = self.limit.update(latency, failed) - self.inflight
+            if free > 0:
+                self.condition.notify(free)
+
+    def rejection(self, reason):
+        status, error = self.STATUS[reason]
+        response = JsonResponse({'error': error}, status=status)
+        response['Retry-After'] = str(self.retry_after)
+        response['X-Concurrency-Limit'] = str(self.limit.current)
+        return response
+
+    def stats(self):
+        with self.condition:
+            return {'limit': self.limit.current, 'inflight': self.inflight, 'waiting': self.waiting,
+                    'admitted': self.admitted, 'shed': dict(self.shed)}
+
+
+_ADMISSION = []
+_LOCK = threading.Lock()
+
+
+def get_admission():
+    """Admission controller configured by FUNDS_ADMISSION setting, created on first use, None if not configured"""
+    if not _ADMISSION:
+        with _LOCK:
+            if not _ADMISSION:
+                options = getattr(settings, 'FUNDS_ADMISSION', None)
+                admission = None
+                if options:
+                    options = dict(options)
+                    options.pop('urls', None)
+                    admission = AdmissionController(**options)
+                _ADMISSION.append(admission)
+    return _ADMISSION[0]
+
+
+def reset_admission():
+    """Next get_admission() reads settings again"""
+    with _LOCK:
+        _ADMISSION.clear()
+
+
+class AdmissionMiddleware:
+    """
+    Overload protection of fund load requests: add 'funds.admission.AdmissionMiddleware' to MIDDLEWARE
+    and configure FUNDS_ADMISSION. Requests to views named in 'urls' pass AdmissionController,
+    latency of admitted requests and their 5xx responses adapt the concurrency limit.
+    Without FUNDS_ADMISSION middleware is not used at all.
+    """
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'FUNDS_ADMISSION', None)
+        if not options:
+            raise MiddlewareNotUsed
+        self.get_response, self.urls = get_response, set(options.get('urls', ['fund-load']))
+
+    def __call__(self, request):
+        admission = get_admission()
+        if not self.controlled(request):
+            return self.get_response(request)
+        reason = admission.acquire()
+        if reason:
+            return admission.rejection(reason)
+        start, failed = perf_counter(), True
+        try:
+            response = self.get_response(request)
+            failed = response.status_code >= 500
+            return response
+        finally:
+            admission.release(perf_counter() - start, failed)
+
+    def controlled(self, request):
+        try:
+            return resolve(request.path_info).url_name in self.urls
+        except Resolver404:
+            return False
@@ -0,0 +1,76 @@
+from array import array
+from copy import copy
+from datetime import date
+from functools import cached_property
+
+from django.conf import settings
+
+EPOCH = date(1970, 1, 1).toordinal()
+WEEKDAYS = 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday'
+DIVIDER_PER_DAY = {'Monday': 2, 'Tuesday': 1, 'Wednesday': 1, 'Thursday': 1, 'Friday': 1, 'Saturday': 1, 'Sunday': 1}
+
+
+class Calendar:
+    """
+    Day arithmetic of fund loads: `day` and `week` columns of FundLoad and CustomerDay are epoch-days
+    (days since 1970-01-01) and ISO year-weeks (200052), the calendar turns a day into date, week, weekday
+    and amount multiplier. Lookup tables cover FUNDS_CALENDAR_RANGE and are built by the first lookup,
+    days out of range are computed by every call.
+    """
+
+    def __init__(self, start=date(2000, 1, 1), end=date(2100, 1, 1), dividers=None):
+        self.first, self.last = start.toordinal() - EPOCH, end.toordinal() - EPOCH
+        self.dividers = dividers or DIVIDER_PER_DAY
+
+    @cached_property
+    def dates(self):
+        return [date.fromordinal(day + EPOCH) for day in range(self.first, self.last)]
+
+    @cached_property
+    def weeks(self):
+        return array('l', (year * 100 + week for year, week, _ in map(date.isocalendar, self.dates)))
+
+    @cached_property
+    def weekdays(self):
+        return array('b', ((day + 3) % 7 for day in range(self.first, self.last)))  # 1970-01-01 is Thursday
+
+    @cached_property
+    def multipliers(self):
+        by_weekday = [self.dividers.get(name, 1) for name in WEEKDAYS]
+        return [by_weekday[weekday] for weekday in self.weekdays]
+
+    def with_dividers(self, dividers):
+        calendar = copy(self)
+        calendar.dividers = dividers
+        calendar.__dict__.pop('multipliers', None)
+        return calendar
+
+    def __getitem__(self, day):
+        return self.date(day), self.week(day), self.weekday(day), self.multiplier(day)
+
+    def day(self, time):
+        return time.toordinal() - EPOCH
+
+    def date(self, day):
+        if self.first <= day < self.last:
+            return self.dates[day - self.first]
+        return date.fromordinal(day + EPOCH)
+
+    def week(self, day):
+        if self.first <= day < self.last:
+            return self.weeks[day - self.first]
+        year, week, _ = self.date(day).isocalendar()
+        return year * 100 + week
+
+    def weekday(self, day):
+        if self.first <= day < self.last:
+            return self.weekdays[day - self.first]
+        return (day + 3) % 7
+
+    def multiplier(self, day):
+        if self.first <= day < self.last:
+            return self.multipliers[day - self.first]
+        return self.dividers.get(WEEKDAYS[self.weekday(day)], 1)
+
+
+CALENDAR = Calendar(*getattr(settings, 'FUNDS_CALENDAR_RANGE', ()))
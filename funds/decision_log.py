@@ -0,0 +1,138 @@
+import atexit
+import json
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+
+from .models import LoadDecision
+
+logger = logging.getLogger(__name__)
+
+class DecisionLog:
+    """
+    Audit trail of FundLoadView decisions, kept off the request path: a request only appends its decision
+    to a bounded buffer and a daemon thread of the worker process hands batches to the sink
+    (bulk insert into LoadDecision or FileSink). A batch goes out as soon as `batch` decisions are waiting,
+    or after `interval` seconds for a quiet worker. A request finding the buffer full waits for the writer,
+    so a slow sink slows requests instead of growing memory.
+    Sink errors (database down, disk full) cost the failed batch only, it is logged and counted in `dropped`.
+    If the writer thread dies anyway, requests stop waiting and their decisions are counted as dropped.
+    """
+
+    def __init__(self, sink, capacity=65536, batch=1024, interval=1.0):
+        self.sink, self.capacity, self.batch, self.interval = sink, capacity, batch, interval
+        self.buffer = deque()
+        self.lock = threading.Lock()
+        self.flushable, self.writable = threading.Condition(self.lock), threading.Condition(self.lock)
+        self.closed, self.stopped, self.waits, self.written, self.dropped = False, False, 0, 0, 0
+        self.thread = threading.Thread(target=self.run, name='decision-log', daemon=True)
+        self.thread.start()
+
+    def record(self, decision):
+        with self.lock:
+            if len(self.buffer) >= self.capacity and not self.stopped:
+                self.waits += 1
+                self.writable.wait_for(lambda: len(self.buffer) < self.capacity or self.closed or self.stopped)
+            if self.closed:
+                raise ValueError('Decision log is closed')
+            if self.stopped:
+                self.dropped += 1
+                return
+            self.buffer.append(decision)
+            if len(self.buffer) >= self.batch:
+                self.flushable.notify()
+
+    def run(self):
+        try:
+            while True:
+                with self.lock:
+                    self.flushable.wait_for(lambda: len(self.buffer) >= self.batch or self.closed, timeout=self.interval)
+                    batch, closed = [self.buffer.popleft() for _ in range(min(self.batch, len(self.buffer)))], self.closed
+                    self.writable.notify_all()
+                if batch:
+                    self.write(batch)
+                if closed and not self.buffer:
+                    return
+        finally:
+            with self.lock:
+                self.stopped = True
+                self.writable.notify_all()
+            connections.close_all()  # connections of writer thread
+
+    def write(self, batch):
+        try:
+            self.sink(batch)
+            self.written += len(batch)
+        except Exception:
+            logger.exception('Decision log dropped batch of %d decisions', len(batch))
+            with self.lock:
+                self.dropped += len(batch)
+            for connection in connections.all(initialized_only=True):  # broken connection is opened again
+                connection.close_if_unusable_or_obsolete()
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.flushable.notify()
+            self.writable.notify_all()
+        self.thread.join()
+
+
+def model_sink(batch):
+    LoadDecision.objects.bulk_create([LoadDecision(**decision) for decision in batch])
+
+
+class FileSink:
+    """Appends decisions as json lines, file is rotated before a batch which would make it bigger than max_bytes"""
+
+    def __init__(self, path, max_bytes=64 * 2 ** 20, backups=5):
+        self.path, self.max_bytes, self.backups = Path(path), max_bytes, backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def __call__(self, batch):
+        data = ''.join(json.dumps(decision, default=str) + '\n' for decision in batch)
+        if self.path.exists() and self.path.stat().st_size + len(data) > self.max_bytes:
+            self.rotate()
+        with self.path.open('a') as target:
+            target.write(data)
+
+    def rotate(self):
+        for number in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f'{self.path.name}.{number}')
+            if source.exists():
+                source.replace(self.path.with_name(f'{self.path.name}.{number + 1}'))
+        self.path.replace(self.path.with_name(f'{self.path.name}.1'))
+
+
+_LOG = []
+_LOCK = threading.Lock()
+
+
+def get_decision_log():
+    """Decision log configured by FUNDS_DECISION_LOG setting, started on first use, None if not configured"""
+    if not _LOG:
+        with _LOCK:
+            if not _LOG:
+                options = dict(getattr(settings, 'FUNDS_DECISION_LOG', None) or {'sink': None})
+                sink = options.pop('sink')
+                if sink == 'db':
+                    sink = model_sink
+                elif sink == 'file':
+                    sink = FileSink(options.pop('path'), options.pop('max_bytes', 64 * 2 ** 20), options.pop('backups', 5))
+                _LOG.append(sink and DecisionLog(sink, **options))
+    return _LOG[0]
+
+
+def reset_decision_log():
+    """Writes buffered decisions and stops writer, next get_decision_log() reads settings again"""
+    with _LOCK:
+        if _LOG and _LOG[0]:
+            _LOG[0].close()
+        _LOG.clear()
+
+
+atexit.register(reset_decision_log)  # buffered decisions are written on interpreter shutdown
@@ -1,59 +1,166 @@
+from time import perf_counter_ns
+
 from django import forms
-from django.core.validators import MaxValueValidator
-from .models import FundLoad
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import IntegrityError, transaction
+from .idempotency import decision_key, stored
+from .limits import RULES
+from .models import CustomerUsage, DecidedLoad, FundLoad
+from .profiling import add_rules, stage
+from .slots import PRIME_SLOTS
+
+
+class AmountField(forms.DecimalField):
+
+    def to_python(self, value):
+        return super().to_python(value.rpartition('$')[-1] if isinstance(value, str) else value)
+
+
+def usage(obj):
+    """
+    Loads of customer: in-memory usage given by owning routing worker,
+    else usage of the load week read from CustomerDay aggregates once for all validators
+    """
+    if getattr(obj, 'usage', None) is None:
+        obj.usage = CustomerUsage(obj.customer_id, obj.week)
+    return obj.usage
+
+
+class MinAmountValidator(MinValueValidator):
+    code = 'MIN_AMOUNT'
+
+    def clean(self, obj):
+        return obj.load_amount
+
+
+class MaxAmountValidator(MaxValueValidator):
+    code = 'MAX_AMOUNT'
+
+    def clean(self, obj):
+        return obj.load_amount
+
 
 class LoadsPerDayValidator(MaxValueValidator):
     message = "Exceeded %(limit_value)s load attempts per day"
+    code = 'LOADS_PER_DAY'
 
     def clean(self, obj):
-        self.limit_value = obj.LIMITS[self.limit_value]
-        return type(obj).objects.by_customer(obj).daily_count(obj) + 1
+        return usage(obj).daily_count(obj) + 1
 
 
 class WeeklyAmountValidator(MaxValueValidator):
     message = "Weekly limit of %(limit_value)s exceeded"
+    code = 'WEEKLY'
 
     def clean(self, obj):
-        self.limit_value = obj.LIMITS[self.limit_value]
-        return type(obj).objects.by_customer(obj).weekly_total(obj) + obj.load_amount
+        return usage(obj).weekly_total(obj, calendar=obj.rules.calendar) + obj.load_amount
 
 
 class DailyAmountValidator(MaxValueValidator):
     message = "Daily limit of %(limit_value)s exceeded"
+    code = 'DAILY'
 
     def clean(self, obj):
-        self.limit_value = obj.LIMITS[self.limit_value]
-        return type(obj).objects.by_customer(obj).daily_total(obj) + obj.load_amount
+        return usage(obj).daily_total(obj, calendar=obj.rules.calendar) + obj.load_amount
 
 
 class PrimedAmountValidator(MaxValueValidator):
     message = "Load amount exceeds %(limit_value)s limit for prime IDs"
+    code = 'PRIME'
 
     def clean(self, obj):
-        self.limit_value = obj.LIMITS[self.limit_value]
         return obj.load_amount if obj.is_prime else 0
 
 
 class PrimesPerDayValidator(MaxValueValidator):
     message = "Exceeded %(limit_value)s prime IDs per day"
+    code = 'PRIMES_PER_DAY'
 
     def clean(self, obj):
-        self.limit_value = obj.LIMITS[self.limit_value]
-        return (type(obj).objects.daily_primes_count(obj) - 1) if obj.is_prime else 0
+        # prime load claims slot of the day, taken slot counts as limit exceeded
+        if not obj.is_prime or PRIME_SLOTS.claim(obj.day, self.limit_value):
+            return 0
+        return self.limit_value + 1
 
 
 class FundLoadForm(forms.ModelForm):
+    # validators are checked in given order with limit from customer rules, error code is reason of rejection
+    business_rules = [
+        (MinAmountValidator, 'min_amount'),
+        (MaxAmountValidator, 'max_amount'),
+        (LoadsPerDayValidator, 'loads_per_day'),
+        (DailyAmountValidator, 'daily'),
+        (WeeklyAmountValidator, 'weekly'),
+        (PrimedAmountValidator, 'prime'),
+        (PrimesPerDayValidator, 'primes_per_day'),
+    ]
 
     class Meta:
         model = FundLoad
         fields = 'id', 'load_amount', 'time', 'customer_id'
+        field_classes = {'load_amount': AmountField}
 
     def _post_clean(self):
         super()._post_clean()
+        self.timings = {}
+        if self.errors:
+            return
         instance = self.instance
-
-        LoadsPerDayValidator('LOADS_PER_DAY')(instance)
-        DailyAmountValidator('DAILY')(instance)
-        WeeklyAmountValidator('WEEKLY')(instance)
-        PrimedAmountValidator('PRIME')(instance)
-        PrimesPerDayValidator('PRIMES_PER_DAY')(instance)
+        rules = instance.rules = RULES.for_customer(instance.customer_id)
+        instance.config_version = rules.version
+
+        try:
+            for validator, limit in self.business_rules:
+                start = perf_counter_ns()
+                try:
+                    validator(getattr(rules, limit))(instance)
+                finally:
+                    self.timings[validator.code] = perf_counter_ns() - start
+        except ValidationError as error:
+            self.add_error(None, error)
+
+    def validate_unique(self):
+        """Id is not checked by query: new load is inserted and duplicate id fails the INSERT, see adjudicate"""
+
+    def reason(self):
+        """Code of first error: limit name for business rules, field error code for invalid data"""
+        for errors in self.errors.as_data().values():
+            return errors[0].code
+
+
+def adjudicate(data, decision, usage=None):
+    """
+    Validates load and stores the decision: DecidedLoad of load with valid key and accepted load in FundLoad.
+    Reason, timings and config version are put into decision.
+    Validation and storing are one transaction: prime slot claimed by validation is released if load is not stored.
+    Load already decided by concurrent request or other worker fails the DecidedLoad INSERT and gets the stored
+    decision, even if limits changed since and the load would be decided otherwise now.
+    Given in-memory usage of customer is used by validators instead of queries and gets stored load.
+    """
+    form = FundLoadForm(data=data)
+    form.instance.usage = usage
+    key = decision_key(data)
+    try:
+        with transaction.atomic():
+            with stage('validate'):
+                valid = form.is_valid()
+            add_rules('validate', form.timings)
+            decision.update(reason=form.reason(), timings=form.timings,
+                            config_version=getattr(form.instance, 'config_version', None))
+            with stage('store'):
+                if key:
+                    DecidedLoad.objects.create(load_id=key[0], customer_id=key[1], accepted=valid,
+                                               reason=decision['reason'], config_version=decision['config_version'])
+                if valid:
+                    form.instance.save(force_insert=True)  # new load, no UPDATE attempt before INSERT
+    except IntegrityError:  # decided by concurrent request or other worker first
+        accepted = stored(key)
+        if accepted is None:  # id is taken by load of other customer
+            decision.update(reason='unique')
+            return False
+        decision.update(retry=True, reason=None if accepted else decision['reason'])
+        return accepted
+    if valid and usage is not None:
+        usage.add(form.instance)
+    return valid
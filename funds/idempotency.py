@@ -0,0 +1,94 @@
+from collections import OrderedDict
+from math import ceil, log
+from threading import Lock
+
+from django.conf import settings
+
+from .models import DecidedLoad
+
+
+class BloomFilter:
+    """
+    Memory bounded set of keys without false negatives: `key in bloom` is False only for keys never added.
+    Size is calculated for expected capacity and false positive rate, positions are taken by double hashing.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001):
+        self.size = ceil(-capacity * log(error_rate) / log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.lock = Lock()
+
+    def positions(self, key):
+        first, second = hash(key), hash((key, 0x9E3779B9)) | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+    def add(self, key):
+        with self.lock:  # bit update is read-modify-write, lost bit would be a false negative
+            for position in self.positions(key):
+                self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class Decisions:
+    """
+    Decisions by (load id, customer id) for idempotent load submission.
+    Bloom filter answers "never seen" for new loads without any query; possible duplicates are checked
+    in bounded cache of recent decisions and then in DecidedLoad table.
+    Filter is warmed on first use by one scan of the table. Filter of other worker does not know loads
+    decided here, its retry is caught by the INSERT of the decision, see forms.adjudicate.
+    """
+
+    def __init__(self, capacity=None, error_rate=0.001, recent=None):
+        self.capacity = capacity or getattr(settings, 'FUNDS_IDEMPOTENCY_CAPACITY', 1_000_000)
+        self.error_rate, self.bloom = error_rate, None
+        self.recent, self.limit = OrderedDict(), recent or getattr(settings, 'FUNDS_IDEMPOTENCY_RECENT', 100_000)
+
+    def warm(self):
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        keys = DecidedLoad.objects.values_list('load_id', 'customer_id')
+        for key in keys.iterator(chunk_size=10_000):
+            bloom.add(key)
+        self.bloom = bloom
+
+    def get(self, key):
+        """Returns original decision for a retried load, None for a new one"""
+        if self.bloom is None:
+            self.warm()
+        if key not in self.bloom:
+            return None
+        decision = self.recent.get(key)
+        if decision is not None:
+            return decision
+        return stored(key)
+
+    def add(self, key, accepted):
+        if self.bloom is None:
+            self.warm()
+        self.bloom.add(key)
+        self.recent[key] = accepted
+        if len(self.recent) > self.limit:
+            self.recent.popitem(last=False)
+
+    def reset(self):
+        self.bloom = None
+        self.recent.clear()
+
+
+DECISIONS = Decisions()
+
+
+def stored(key):
+    """Stored decision of load: True if it is accepted, False if rejected, None if it is not decided yet"""
+    return DecidedLoad.objects.filter(load_id=key[0], customer_id=key[1]).values_list('accepted', flat=True).first()
+
+
+def decision_key(data):
+    """Returns (load id, customer id) of request data, None if it can not be a key"""
+    try:
+        return int(data['id']), int(data['customer_id'])
+    except (KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,120 @@
+from collections import namedtuple
+from datetime import datetime, timezone
+from decimal import Decimal
+from time import monotonic
+from types import MappingProxyType
+
+from django.conf import settings
+from django.db.models import Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .calendars import CALENDAR, DIVIDER_PER_DAY
+from .models import FundLoad, LimitConfig, LimitOverride
+
+Rules = namedtuple('Rules', 'version tier limits min_amount max_amount daily weekly prime loads_per_day primes_per_day calendar')
+
+
+def compile_rules(version=0, tier='default', limits=None, dividers=None, base=None):
+    """Compiles limits and weekday multipliers into immutable rule parameters, missed values are taken from base"""
+    limits = MappingProxyType(dict(base.limits if base else FundLoad.LIMITS) | (limits or {}))
+    calendar = base.calendar if base and not dividers else CALENDAR.with_dividers(
+        MappingProxyType(dict(base.calendar.dividers if base else DIVIDER_PER_DAY) | (dividers or {})))
+    amount = lambda name: Decimal(limits[name]).quantize(Decimal('0.01'))
+    return Rules(version, tier, limits, amount('MIN_AMOUNT'), amount('MAX_AMOUNT'), amount('DAILY'), amount('WEEKLY'),
+                 amount('PRIME'), limits['LOADS_PER_DAY'], limits['PRIMES_PER_DAY'], calendar)
+
+
+class RuleBook:
+    """
+    Compiled rules per customer tier for the latest LimitConfig version and index of customer overrides.
+    Index is warmed by the first lookup of a worker. After that the latest version and overrides changed since
+    last refresh are queried not often than once per interval, so workers pick up changes without restart,
+    and lookups between refreshes are dict lookups without queries.
+    A new version replaces whole index by single assignment: a decision never sees half of a config.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = getattr(settings, 'FUNDS_LIMITS_RELOAD_INTERVAL', 5) if interval is None else interval
+        self.index = {'default': compile_rules()}, {}  # (rules by tier, rules by customer id)
+        self.checked = self.updated = None
+
+    def __getitem__(self, tier):
+        self.refresh()
+        tiers, _ = self.index
+        return tiers.get(tier) or tiers['default']
+
+    def for_customer(self, customer_id):
+        self.refresh()
+        tiers, customers = self.index
+        return customers.get(customer_id) or tiers['default']
+
+    def refresh(self, force=False):
+        if not force and self.checked is not None and monotonic() - self.checked < self.interval:
+            return
+        self.checked = monotonic()
+        version = LimitConfig.objects.aggregate(version=Max('version'))['version'] or 0
+        if force or self.updated is None or version != self.index[0]['default'].version:
+            self.index = self.load(version)
+        else:
+            self.update(self.read(LimitOverride.objects.filter(updated__gte=self.updated)))
+
+    def load(self, version):
+        rows = {row.tier: row for row in LimitConfig.objects.filter(version=version)}
+        default = rows.pop('default', None)
+        default = compile_rules(version, limits=default and default.limits, dividers=default and default.dividers)
+        tiers = {'default': default} | {
+            tier: compile_rules(version, tier, row.limits, row.dividers, base=default) for tier, row in rows.items()}
+        self.updated = None
+        index = self.update(self.read(LimitOverride.objects.filter(active=True)), index=(tiers, {}))
+        self.updated = self.updated or datetime.min.replace(tzinfo=timezone.utc)
+        return index
+
+    def read(self, overrides):
+        """
+        Fetches overrides from database and moves watermark of incremental refresh to the latest of them.
+        Only rows read here move it: an override saved by this process is compiled by the signal, but
+        overrides saved meanwhile by other processes may be older and must still be picked by next refresh.
+        """
+        overrides = list(overrides)
+        for override in overrides:
+            self.updated = max(self.updated or override.updated, override.updated)
+        return overrides
+
+    def update(self, overrides, index=None):
+        """Compiles given overrides into index, other customers are not touched"""
+        tiers, customers = index or self.index
+        for override in overrides:
+            rules = tiers.get(override.tier) or tiers['default']
+            if override.limits:
+                rules = compile_rules(rules.version, rules.tier, override.limits, base=rules)
+            if not override.active or rules is tiers['default']:
+                customers.pop(override.customer_id, None)
+            else:
+                customers[override.customer_id] = rules
+        return tiers, customers
+
+    def invalidate(self):
+        self.checked = None
+
+    def reset(self):
+        """Drops index without query, next lookup loads it again"""
+        self.checked = self.updated = None
+
+
+RULES = RuleBook()
+
+
+@receiver([post_save, post_delete], sender=LimitConfig)
+def invalidate_rules(**kwargs):
+    RULES.invalidate()
+
+
+@receiver(post_save, sender=LimitOverride)
+def update_override(instance=None, **kwargs):
+    RULES.update([instance])
+
+
+@receiver(post_delete, sender=LimitOverride)
+def delete_override(instance=None, **kwargs):
+    RULES.index[1].pop(instance.customer_id, None)
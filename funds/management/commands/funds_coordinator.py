@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from funds.routing import CoordinatorManager
+
+
+class Command(BaseCommand):
+    help = 'Runs local stand-in coordinator of routing workers at FUNDS_ROUTING coordinator address'
+
+    def handle(self, **options):
+        routing = settings.FUNDS_ROUTING
+        server = CoordinatorManager(tuple(routing['coordinator']), routing.get('authkey', '').encode()).get_server()
+        self.stdout.write(f'Coordinator is listening on {server.address}')
+        server.serve_forever()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from funds.routing import serve
+
+
+class Command(BaseCommand):
+    help = 'Runs routing worker owning part of customers, joins FUNDS_ROUTING coordinator and leaves it on stop'
+
+    def add_arguments(self, parser):
+        parser.add_argument('node', help='unique worker name, position on hash ring depends on it')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=0, help='listening port, any free port by default')
+
+    def handle(self, node, host, port, **options):
+        self.stdout.write(f'Worker {node} is starting')
+        serve(node, address=(host, port))
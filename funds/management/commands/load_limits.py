@@ -0,0 +1,27 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+from funds.models import LimitConfig
+
+
+class Command(BaseCommand):
+    help = 'Loads limits config file as new LimitConfig version, running workers pick it up without restart'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='config file: {"version": 2, "tiers": {"default": {"limits": {...}, "dividers": {...}}}}')
+
+    @transaction.atomic
+    def handle(self, path, **options):
+        with open(path) as source:
+            config = json.load(source)
+        latest = LimitConfig.objects.aggregate(version=Max('version'))['version'] or 0
+        version = config.get('version', latest + 1)
+        if version <= latest:
+            raise CommandError(f'Config version {version} is not newer than active version {latest}')
+        tiers = config.get('tiers') or {'default': {}}
+        for tier, params in tiers.items():
+            LimitConfig.objects.create(version=version, tier=tier, limits=params.get('limits', {}), dividers=params.get('dividers', {}))
+        self.stdout.write(f'Loaded limits version {version} for tiers: {", ".join(tiers)}')
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:14
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FundLoad',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('customer_id', models.PositiveBigIntegerField(db_index=True)),
+                ('load_amount', models.DecimalField(decimal_places=2, max_digits=7, validators=[django.core.validators.MinValueValidator(0.01), django.core.validators.MaxValueValidator(5000)])),
+                ('time', models.DateTimeField(db_index=True)),
+                ('day', models.IntegerField(editable=False)),
+                ('week', models.IntegerField(editable=False)),
+                ('is_prime', models.BooleanField(default=False, editable=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_id', 'day'], name='funds_fundl_custome_f82068_idx'), models.Index(fields=['customer_id', 'week'], name='funds_fundl_custome_fec6ec_idx'), models.Index(fields=['day', 'is_prime'], name='funds_fundl_day_bb97b8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fundload',
+            name='config_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AlterField(
+            model_name='fundload',
+            name='load_amount',
+            field=models.DecimalField(decimal_places=2, max_digits=7),
+        ),
+        migrations.CreateModel(
+            name='LimitConfig',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveIntegerField()),
+                ('tier', models.CharField(default='default', max_length=32)),
+                ('limits', models.JSONField(blank=True, default=dict)),
+                ('dividers', models.JSONField(blank=True, default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('version', 'tier'), name='unique_limit_config_tier')],
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0002_limit_config'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LimitOverride',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_id', models.PositiveBigIntegerField(unique=True)),
+                ('tier', models.CharField(default='default', max_length=32)),
+                ('limits', models.JSONField(blank=True, default=dict)),
+                ('active', models.BooleanField(default=True)),
+                ('updated', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+        ),
+    ]
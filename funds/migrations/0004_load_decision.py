@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0003_limit_override'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoadDecision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load_id', models.BigIntegerField(db_index=True, null=True)),
+                ('customer_id', models.PositiveBigIntegerField(null=True)),
+                ('accepted', models.BooleanField()),
+                ('reason', models.CharField(blank=True, max_length=32, null=True)),
+                ('config_version', models.PositiveIntegerField(null=True)),
+                ('retry', models.BooleanField(default=False)),
+                ('timings', models.JSONField(blank=True, default=dict)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
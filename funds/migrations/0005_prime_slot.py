@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:41
+
+from django.db import migrations, models
+
+
+def fill_slots(apps, schema_editor):
+    """Slots of days already having prime loads"""
+    FundLoad, PrimeSlot = apps.get_model('funds', 'FundLoad'), apps.get_model('funds', 'PrimeSlot')
+    days = FundLoad.objects.filter(is_prime=True).order_by().values('day').annotate(used=models.Count('id'))
+    PrimeSlot.objects.bulk_create(PrimeSlot(day=row['day'], used=row['used']) for row in days)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0004_load_decision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrimeSlot',
+            fields=[
+                ('day', models.IntegerField(primary_key=True, serialize=False)),
+                ('used', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(fill_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:07
+
+from django.db import migrations, models
+
+
+def fill_days(apps, schema_editor):
+    """Usage of days already having loads, aggregated by the database"""
+    FundLoad, CustomerDay = apps.get_model('funds', 'FundLoad'), apps.get_model('funds', 'CustomerDay')
+    days = FundLoad.objects.order_by().values('customer_id', 'day', 'week').annotate(
+        count=models.Count('id'), amount=models.Sum('load_amount'))
+    CustomerDay.objects.bulk_create((CustomerDay(**row) for row in days.iterator()), batch_size=10_000)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0005_prime_slot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer_id', models.PositiveBigIntegerField()),
+                ('day', models.IntegerField()),
+                ('week', models.IntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_id', 'week'], name='funds_custo_custome_b6d015_idx')],
+                'constraints': [models.UniqueConstraint(fields=('customer_id', 'day'), name='unique_customer_day')],
+            },
+        ),
+        migrations.RunPython(fill_days, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0006_customer_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RejectedLoad',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('load_id', models.BigIntegerField()),
+                ('customer_id', models.PositiveBigIntegerField()),
+                ('reason', models.CharField(blank=True, max_length=32, null=True)),
+                ('config_version', models.PositiveIntegerField(null=True)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('load_id', 'customer_id'), name='unique_rejected_load')],
+            },
+        ),
+    ]
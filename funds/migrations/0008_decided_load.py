@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def claim_accepted_loads(apps, schema_editor):
+    """Accepted loads stored before the claim table get their claim rows"""
+    FundLoad, DecidedLoad = apps.get_model('funds', 'FundLoad'), apps.get_model('funds', 'DecidedLoad')
+    rows = FundLoad.objects.values_list('id', 'customer_id', 'config_version')
+    batch = []
+    for load_id, customer_id, config_version in rows.iterator(chunk_size=10_000):
+        batch.append(DecidedLoad(load_id=load_id, customer_id=customer_id, accepted=True, config_version=config_version))
+        if len(batch) == 10_000:
+            DecidedLoad.objects.bulk_create(batch)
+            batch = []
+    DecidedLoad.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('funds', '0007_rejected_load'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='rejectedload',
+            name='unique_rejected_load',
+        ),
+        migrations.RenameModel(
+            old_name='RejectedLoad',
+            new_name='DecidedLoad',
+        ),
+        migrations.AddField(
+            model_name='decidedload',
+            name='accepted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddConstraint(
+            model_name='decidedload',
+            constraint=models.UniqueConstraint(fields=('load_id', 'customer_id'), name='unique_decided_load'),
+        ),
+        migrations.RunPython(claim_accepted_loads, migrations.RunPython.noop),
+    ]
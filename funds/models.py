@@ -1,63 +1,203 @@
-from django.db import models
-from django.core.validators import MinValueValidator, MaxValueValidator
-from sympy import is_prime
-from  django.utils.timezone import now
+from django.db import IntegrityError, models, transaction
 from django.utils.functional import cached_property
 
+from .calendars import CALENDAR
 
-class FundLoadQuerySet(models.QuerySet):
 
-    def weekly_total(self, *args, **kwargs):
-        return self.weekly(*args, **kwargs).total()
+def is_prime(number):
+    # sympy is heavy and needed only on load adjudication, import it on first call
+    global is_prime
+    from sympy.ntheory import isprime as is_prime
+    return is_prime(number)
 
-    def daily_total(self, *args, **kwargs):
-        return self.daily(*args, **kwargs).total()
 
-    def total(self, *args, **kwargs):
-        return self.aggregate(models.Sum('load_amount')).get('sum') or 0
+class LimitConfig(models.Model):
+    """
+    Limits and weekday multipliers per customer tier, not given values are taken from default tier and FundLoad.LIMITS.
+    Latest version is active, a change is a new version: rows are not updated, so every decision refers to one version.
+    """
+    version = models.PositiveIntegerField()
+    tier = models.CharField(max_length=32, default='default')
+    limits = models.JSONField(default=dict, blank=True)
+    dividers = models.JSONField(default=dict, blank=True)
+    created = models.DateTimeField(auto_now_add=True)
 
-    def weekly(self, *args, time=None, **kwargs):
-        week = time and time.date or now().date
-        week = time and time.date or now().date
-        return self.weekly(week)
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['version', 'tier'], name='unique_limit_config_tier')]
 
-    def daily(self, *args, time=None, **kwargs):
-        day = time and time.date or now().date
-        return self.filter(time__date=day)
+    def __str__(self):
+        return f'{self.tier} v{self.version}'
 
-    def daily_count(self, *args, **kwargs):
-        return self.daily(*args, **kwargs).count()
 
-    def daily_primes_count(self, *args, **kwargs):
-        return self.daily(*args, **kwargs).primes().count()
+class LimitOverride(models.Model):
+    """
+    Customer tier and own limits on top of tier limits of active LimitConfig version.
+    Deactivate instead of delete: running workers refresh their index by updated time, deleted rows are not seen.
+    """
+    customer_id = models.PositiveBigIntegerField(unique=True)
+    tier = models.CharField(max_length=32, default='default')
+    limits = models.JSONField(default=dict, blank=True)
+    active = models.BooleanField(default=True)
+    updated = models.DateTimeField(auto_now=True, db_index=True)
 
-    def primes(self, *args, **kwargs):
-        return self.filter(is_prime=True)
-
-    def by_customer(self, customer=None):
-        return self.filter(customer_id=getattr(customer, 'pk', None) or customer or 0)
+    def __str__(self):
+        return f'{self.customer_id}: {self.tier}'
 
 
 class FundLoad(models.Model):
-    LIMITS = {'MIN_AMOUNT': 0.01, 'DAILY': 5000, 'WEEKLY': 20000, 'PRIME': 9999, 'LOADS_PER_DAY': 3, 'PRIMES_PER_DAY': 1 }
-    customer_id = models.ForeignKey('auth.User', on_delete=models.DO_NOTHING, index=True)
-    load_amount = models.DecimalField(max_digits=7, decimal_places=2, validators=[MinValueValidator(LIMITS['MIN_AMOUNT']), MaxValueValidator(LIMITS['DAILY'])], index=True)
-    time = models.DateTimeField(index=True)
-    is_prime = models.BooleanField(default=False, index=True, editable=False)
-
-    objects = FundLoadQuerySet.as_manager()
+    LIMITS = {'MIN_AMOUNT': 0.01, 'MAX_AMOUNT': 5000, 'DAILY': 5000, 'WEEKLY': 20000, 'PRIME': 9999, 'LOADS_PER_DAY': 3, 'PRIMES_PER_DAY': 1 }
+    id = models.BigIntegerField(primary_key=True)
+    customer_id = models.PositiveBigIntegerField(db_index=True)
+    load_amount = models.DecimalField(max_digits=7, decimal_places=2)
+    time = models.DateTimeField(db_index=True)
+    day = models.IntegerField(editable=False)  # epoch-day, see calendars.CALENDAR
+    week = models.IntegerField(editable=False)  # ISO year-week, e.g. 200052
+    is_prime = models.BooleanField(default=False, editable=False)
+    config_version = models.PositiveIntegerField(default=0, editable=False)  # LimitConfig version used for decision
+
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer_id', 'day']),
+            models.Index(fields=['customer_id', 'week']),
+            models.Index(fields=['day', 'is_prime']),
+        ]
 
     @cached_property
     def is_prime_id(self):
         return is_prime(self.id or 0)
 
     def get_day_of_week(self):
-        return self.time.isoweekday()
+        return CALENDAR.weekday(self.day) + 1
 
     def get_week_of_year(self):
-        return self.time.isocalendar()[1] # year, week, weekday
+        return self.week % 100
 
-
-    def save(self):
+    def clean(self):
+        super().clean()
+        if self.time:
+            self.day = CALENDAR.day(self.time)
+            self.week = CALENDAR.week(self.day)
         self.is_prime = self.is_prime_id
-        super(self).save()
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:  # new loads are inserted (force_insert), stored load is counted in usage of its day
+            usage = getattr(self, 'usage', None)  # read by validators
+            CustomerDay.objects.add(self, first=usage is not None and self.day not in usage.days)
+
+
+class CustomerDayQuerySet(models.QuerySet):
+
+    def add(self, load, first=False):
+        """
+        Counts stored load in its day by conditional update, the first load of the day inserts the row.
+        With first (usage read before had no loads of the day) insert is tried without update.
+        """
+        rows = self.filter(customer_id=load.customer_id, day=load.day)
+        changes = {'count': models.F('count') + 1, 'amount': models.F('amount') + load.load_amount}
+        if not first and rows.update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.create(customer_id=load.customer_id, day=load.day, week=load.week, count=1, amount=load.load_amount)
+        except IntegrityError:  # row is inserted by concurrent load of the day
+            rows.update(**changes)
+
+
+class CustomerDay(models.Model):
+    """
+    Materialized usage of one customer on one day: count and amount of stored loads, maintained by FundLoad.save.
+    Validators and velocity API read days of one week here instead of aggregating FundLoad rows.
+    """
+    customer_id = models.PositiveBigIntegerField()
+    day = models.IntegerField()  # epoch-day, see calendars.CALENDAR
+    week = models.IntegerField()  # ISO year-week, e.g. 200052
+    count = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    objects = CustomerDayQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['customer_id', 'day'], name='unique_customer_day')]
+        indexes = [models.Index(fields=['customer_id', 'week'])]
+
+    def __str__(self):
+        return f'{self.customer_id} {self.day}: {self.count}, {self.amount}'
+
+
+class CustomerUsage:
+    """
+    In-memory loads count and amount per day of one customer, same totals as summed FundLoad rows of the day or week.
+    Read from CustomerDay by one query: all days of customer or days of one week.
+    """
+
+    def __init__(self, customer_id, week=None):
+        rows = CustomerDay.objects.filter(customer_id=customer_id)
+        if week is not None:
+            rows = rows.filter(week=week)
+        self.days = {day: [count, amount] for day, count, amount in rows.values_list('day', 'count', 'amount')}
+
+    def daily_count(self, obj):
+        return self.days.get(obj.day, (0, 0))[0]
+
+    def daily_total(self, obj, calendar=None):
+        return self.amount(obj.day, calendar)
+
+    def weekly_total(self, obj, calendar=None):
+        monday = obj.day - CALENDAR.weekday(obj.day)
+        return sum(self.amount(day, calendar) for day in range(monday, monday + 7))
+
+    def amount(self, day, calendar=None):
+        return self.days.get(day, (0, 0))[1] * (calendar or CALENDAR).multiplier(day)
+
+    def add(self, obj):
+        day = self.days.setdefault(obj.day, [0, 0])
+        day[0] += 1
+        day[1] += obj.load_amount
+
+
+class PrimeSlot(models.Model):
+    """
+    Prime ID allowance of one day for all customers, one row per day.
+    Slot is claimed by single upsert of the row, so prime loads do not count FundLoad rows of the day.
+    """
+    day = models.IntegerField(primary_key=True)  # epoch-day, see calendars.CALENDAR
+    used = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.day}: {self.used}'
+
+
+class DecidedLoad(models.Model):
+    """
+    Decision of load with valid id and customer, accepted or rejected, inserted in the transaction of the decision.
+    Unique key is the claim of the load: a retry decided again by a worker that has not seen the load fails
+    the INSERT whatever its new outcome would be, so it gets the original decision on every worker and after restart.
+    """
+    load_id = models.BigIntegerField()
+    customer_id = models.PositiveBigIntegerField()
+    accepted = models.BooleanField(default=False)
+    reason = models.CharField(max_length=32, blank=True, null=True)  # limit name or field error code
+    config_version = models.PositiveIntegerField(null=True)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['load_id', 'customer_id'], name='unique_decided_load')]
+
+    def __str__(self):
+        return f"{self.load_id} of {self.customer_id}: {'accepted' if self.accepted else self.reason}"
+
+
+class LoadDecision(models.Model):
+    """Every decision on load attempt, accepted or rejected, written by decision log in batches"""
+    load_id = models.BigIntegerField(null=True, db_index=True)
+    customer_id = models.PositiveBigIntegerField(null=True)
+    accepted = models.BooleanField()
+    reason = models.CharField(max_length=32, blank=True, null=True)  # limit name or field error code
+    config_version = models.PositiveIntegerField(null=True)
+    retry = models.BooleanField(default=False)
+    timings = models.JSONField(default=dict, blank=True)  # nanoseconds per checked rule
+    created = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,201 @@
+import json
+import sys
+import threading
+from collections import Counter
+from contextlib import nullcontext
+from math import floor
+from pathlib import Path
+from time import perf_counter_ns
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.urls import Resolver404, resolve
+
+
+class Sample:
+    """
+    Profile of one sampled request. Stages are timed with their nested stages (inclusive time),
+    collapsed stacks get own time of every frame: root;stage[;nested stage...] or root;stage;rule.
+    With traced stacks every Python and builtin call inside stages is a frame too (sys.setprofile).
+    """
+
+    def __init__(self, profiler):
+        self.profiler, self.frames, self.floors, self.starts = profiler, [profiler.root], [], []
+        self.stacks, self.stages, self.rules = Counter(), Counter(), Counter()
+        self.mark = 0
+
+    def stage(self, name):
+        self.frames.append(name)
+        return self
+
+    def __enter__(self):
+        now = perf_counter_ns()
+        if self.floors:  # time before nested stage belongs to parent stage
+            self.stacks[';'.join(self.frames[:-1])] += now - self.mark
+        self.floors.append(len(self.frames))
+        self.starts.append(now)
+        self.mark = now
+        if self.profiler.traced and len(self.floors) == 1:
+            sys.setprofile(self.trace)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.profiler.traced and len(self.floors) == 1:
+            sys.setprofile(None)
+        now = perf_counter_ns()
+        del self.frames[self.floors.pop():]
+        self.stacks[';'.join(self.frames)] += now - self.mark
+        self.stages[self.frames.pop()] += now - self.starts.pop()
+        self.mark = now
+
+    def trace(self, frame, event, arg):
+        """sys.setprofile hook: time since last event is own time of current frame"""
+        module = frame.f_globals.get('__name__')
+        if module == __name__:  # calls of profiler itself are not profiled
+            return
+        self.stacks[';'.join(self.frames)] += perf_counter_ns() - self.mark
+        if event == 'call':
+            self.frames.append(f'{module}.{frame.f_code.co_qualname}')
+        elif event == 'c_call':
+            self.frames.append(f"{getattr(arg, '__module__', None) or 'builtins'}.{getattr(arg, '__qualname__', arg)}")
+        elif len(self.frames) > self.floors[-1]:  # return of call made before stage is not in the stack
+            self.frames.pop()
+        self.mark = perf_counter_ns()  # time of hook itself is not counted
+
+    def add_rules(self, stage, timings):
+        """Nanoseconds of business rules checked in stage, rules are frames of stage in collapsed stacks"""
+        path = ';'.join(self.frames + [stage])
+        for rule, ns in timings.items():
+            self.rules[f'{stage};{rule}'] += ns
+            if not self.profiler.traced:  # traced stacks have validator calls already
+                self.stacks[path] -= ns
+                self.stacks[f'{path};{rule}'] += ns
+
+
+class Profiler:
+    """
+    Profiles fraction of requests: every 1/fraction-th request is sampled, sampling is deterministic and even.
+    Time of stages and business rules is aggregated over samples, collapsed stacks ("frame;frame ns" lines)
+    are written for flame graph tools (flamegraph.pl, speedscope) every `every` samples, report next to them.
+    """
+
+    def __init__(self, path=None, fraction=0.01, traced=False, root='fund-load', every=100):
+        self.path, self.fraction, self.traced, self.root, self.every = path and Path(path), fraction, traced, root, every
+        self.seen, self.samples = 0, 0
+        self.stacks, self.stages, self.rules, self.counts = Counter(), Counter(), Counter(), Counter()
+        self.lock = threading.Lock()
+
+    def sample(self):
+        """New Sample if this request is sampled, else None"""
+        with self.lock:
+            self.seen += 1
+            if floor(self.seen * self.fraction) == floor((self.seen - 1) * self.fraction):
+                return None
+        return Sample(self)
+
+    def merge(self, sample):
+        with self.lock:
+            self.samples += 1
+            self.stacks.update(sample.stacks)
+            self.stages.update(sample.stages)
+            self.rules.update(sample.rules)
+            self.counts.update(sample.stages.keys() | sample.rules.keys())
+            due = self.path and self.samples % self.every == 0
+        if due:
+            self.write()
+
+    def report(self):
+        """Total and mean nanoseconds of every stage and rule over sampled requests"""
+        with self.lock:
+            totals = lambda values: {name: {'total_ns': ns, 'mean_ns': ns // self.counts[name], 'count': self.counts[name]}
+                                     for name, ns in sorted(values.items())}
+            return {'requests': self.seen, 'samples': self.samples, 'stages': totals(self.stages),
+                    'rules': totals(self.rules)}
+
+    def write(self):
+        """Writes collapsed stacks heaviest first to path and report to path with .json suffix"""
+        with self.lock:
+            lines = [f'{stack} {ns}\n' for stack, ns in self.stacks.most_common() if ns > 0]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(''.join(lines))
+        self.path.with_suffix('.json').write_text(json.dumps(self.report()))
+
+
+_CURRENT = threading.local()  # sample of request handled by current thread
+_OFF = nullcontext()
+
+
+def stage(name):
+    """Context timing stage of sampled request handled by current thread, does nothing for other requests"""
+    sample = getattr(_CURRENT, 'sample', None)
+    return _OFF if sample is None else sample.stage(name)
+
+
+def add_rules(stage, timings):
+    """Timings of business rules checked in stage of sampled request"""
+    sample = getattr(_CURRENT, 'sample', None)
+    if sample is not None:
+        sample.add_rules(stage, timings)
+
+
+_PROFILER = []
+_LOCK = threading.Lock()
+
+
+def get_profiler():
+    """Profiler configured by FUNDS_PROFILING setting, created on first use, None if profiling is not configured"""
+    if not _PROFILER:
+        with _LOCK:
+            if not _PROFILER:
+                options = getattr(settings, 'FUNDS_PROFILING', None)
+                profiler = None
+                if options:
+                    options = dict(options)
+                    options.pop('urls', None)
+                    profiler = Profiler(**options)
+                _PROFILER.append(profiler)
+    return _PROFILER[0]
+
+
+def reset_profiler():
+    """Writes collected profile, next get_profiler() reads settings again"""
+    with _LOCK:
+        if _PROFILER and _PROFILER[0] and _PROFILER[0].path and _PROFILER[0].samples:
+            _PROFILER[0].write()
+        _PROFILER.clear()
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in profiling of fund load requests: add 'funds.profiling.ProfilingMiddleware' to MIDDLEWARE
+    and configure FUNDS_PROFILING. Fraction of requests to views named in 'urls' is sampled,
+    stages of FundLoadView (parse, validate, store, serialize, record) are nested in request stage.
+    Without FUNDS_PROFILING middleware is not used at all.
+    """
+
+    def __init__(self, get_response):
+        options = getattr(settings, 'FUNDS_PROFILING', None)
+        if not options:
+            raise MiddlewareNotUsed
+        self.get_response, self.urls = get_response, set(options.get('urls', ['fund-load']))
+
+    def __call__(self, request):
+        profiler = get_profiler()
+        if not self.profiled(request):
+            return self.get_response(request)
+        sample = profiler.sample()
+        if sample is None:
+            return self.get_response(request)
+        _CURRENT.sample = sample
+        try:
+            with sample.stage('request'):
+                return self.get_response(request)
+        finally:
+            _CURRENT.sample = None
+            profiler.merge(sample)
+
+    def profiled(self, request):
+        try:
+            return resolve(request.path_info).url_name in self.urls
+        except Resolver404:
+            return False
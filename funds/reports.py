@@ -0,0 +1,65 @@
+from django.core.paginator import Paginator
+from django.db import connections, router
+from django.utils.functional import cached_property
+
+PAGE_SIZE = 100  # rows of report page
+COUNT_LIMIT = 10_000  # filtered lists are counted up to this number of rows
+
+
+def estimated_count(model):
+    """
+    Rows in table of model from database statistics by one cheap query, COUNT(*) is never run.
+    SQLite: largest rowid (end of table b-tree), deleted rows are still counted.
+    None if database has no estimate (unknown vendor, empty or never analyzed table).
+    """
+    connection = connections[router.db_for_read(model)]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+        elif connection.vendor == 'sqlite':
+            cursor.execute(f'SELECT max(rowid) FROM {connection.ops.quote_name(table)}')
+        else:
+            return None
+        row = cursor.fetchone()
+    return None if not row or row[0] is None or row[0] < 0 else row[0]
+
+
+def limited_count(queryset, limit=COUNT_LIMIT):
+    """Count of queryset rows, but at most limit rows are read"""
+    return queryset[:limit].count()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator of admin changelists: whole table is counted by estimated_count,
+    filtered or searched list by limited_count, so count query does not grow with table.
+    """
+
+    @cached_property
+    def count(self):
+        if not self.object_list.query.where:
+            estimate = estimated_count(self.object_list.model)
+            if estimate is not None:
+                return estimate
+        return limited_count(self.object_list)
+
+
+def keyset_page(queryset, key, after=None, size=None):
+    """
+    Rows of page ordered by unique key ('-id' is descending) and key of its last row if there is next page.
+    Next page starts after that key, `key > after` is index range scan, no OFFSET rows are read and skipped.
+    Rows are model instances or dicts of values().
+    """
+    name, size = key.lstrip('-'), size or PAGE_SIZE
+    if after is not None:
+        queryset = queryset.filter(**{f"{name}__{'lt' if key.startswith('-') else 'gt'}": after})
+    rows = list(queryset.order_by(key)[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    last = rows[-1]
+    return rows, last[name] if isinstance(last, dict) else getattr(last, name)
@@ -0,0 +1,289 @@
+import logging
+import multiprocessing
+import signal
+import threading
+from bisect import bisect
+from hashlib import blake2b
+from multiprocessing.connection import Client, Listener
+from multiprocessing.managers import BaseManager
+from time import monotonic
+
+from django.conf import settings
+from django.db import connection as db_connection, connections
+
+from .forms import adjudicate
+from .idempotency import decision_key
+from .models import CustomerUsage
+
+logger = logging.getLogger(__name__)
+
+class HashRing:
+    """
+    Consistent hash ring of worker nodes, every node has `replicas` points on the ring,
+    customer belongs to the node of the next point clockwise. Joining or leaving node moves only its share of customers.
+    Hash is stable between processes, unlike built-in hash().
+    """
+
+    def __init__(self, nodes=(), replicas=64):
+        self.replicas, self.points, self.owners = replicas, [], []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def hash(key):
+        return int.from_bytes(blake2b(str(key).encode(), digest_size=8).digest(), 'big')
+
+    def add(self, node):
+        for replica in range(self.replicas):
+            point = self.hash(f'{node}#{replica}')
+            index = bisect(self.points, point)
+            self.points.insert(index, point)
+            self.owners.insert(index, node)
+
+    def remove(self, node):
+        kept = [(point, owner) for point, owner in zip(self.points, self.owners) if owner != node]
+        self.points, self.owners = [point for point, _ in kept], [owner for _, owner in kept]
+
+    def owner(self, customer_id):
+        """Node owning customer, None for empty ring"""
+        if not self.points:
+            return None
+        return self.owners[bisect(self.points, self.hash(customer_id)) % len(self.points)]
+
+    @property
+    def nodes(self):
+        return set(self.owners)
+
+
+class Coordinator:
+    """Stand-in membership service: node name -> worker address, version grows with every change"""
+
+    def __init__(self):
+        self.version, self.nodes, self.lock = 0, {}, threading.Lock()
+
+    def join(self, node, address):
+        with self.lock:
+            self.nodes[node] = address
+            self.version += 1
+            return self.version
+
+    def leave(self, node):
+        with self.lock:
+            if self.nodes.pop(node, None) is not None:
+                self.version += 1
+            return self.version
+
+    def members(self):
+        with self.lock:
+            return self.version, dict(self.nodes)
+
+    def current(self):
+        """Membership version only, workers check it before every decision"""
+        return self.version
+
+
+_COORDINATOR = Coordinator()
+
+
+class CoordinatorManager(BaseManager):
+    """Serves Coordinator of one process to routers and workers of other processes"""
+
+
+def get_coordinator():
+    return _COORDINATOR
+
+
+CoordinatorManager.register('coordinator', callable=get_coordinator)
+
+
+def start_coordinator(address=('127.0.0.1', 0), authkey=b''):
+    """Starts stand-in coordinator in own process, returns manager, manager.address is its address"""
+    manager = CoordinatorManager(tuple(address), authkey)
+    manager.start()
+    return manager
+
+
+def connect_coordinator(address, authkey=b''):
+    """Proxy of coordinator running at address, proxy is safe to use from many threads"""
+    manager = CoordinatorManager(tuple(address), authkey)
+    manager.connect()
+    return manager.coordinator()
+
+
+class Worker:
+    """
+    Adjudicates loads of customers owned by node: usage of own customers is kept in memory,
+    accepted loads are stored in FundLoad write-through, so a new owner warms usage from CustomerDay aggregates.
+    Ring follows coordinator membership: on every change usage of all customers is dropped (rebalancing),
+    load of customer owned by other node is answered with "moved" and router asks the new owner.
+    Ownership is fenced by the current coordinator version before every decision, not by ring of the router:
+    a node that has not noticed a change yet never decides for a customer taken over by another node.
+    """
+    stripes = 64
+
+    def __init__(self, node, coordinator):
+        self.node, self.coordinator = node, coordinator
+        self.version, self.ring, self.usage = None, HashRing(), {}
+        self.lock = threading.Lock()  # guards ring and usage swap on membership change
+        # loads of one customer are adjudicated one by one, loads of different customers run in parallel
+        self.locks = [threading.Lock() for _ in range(self.stripes)]
+
+    def sync(self):
+        with self.lock:
+            version, members = self.coordinator.members()
+            if version != self.version:
+                self.version, self.ring = version, HashRing(sorted(members))
+                self.usage.clear()
+
+    def owns(self, customer_id):
+        if self.coordinator.current() != self.version:
+            self.sync()
+        return self.ring.owner(customer_id) == self.node
+
+    def handle(self, message):
+        if message['kind'] == 'stats':
+            return {'node': self.node, 'version': self.version, 'customers': sorted(self.usage)}
+        return self.adjudicate(message['data'])
+
+    def adjudicate(self, data):
+        _, customer_id = decision_key(data)
+        with self.locks[HashRing.hash(customer_id) % self.stripes]:
+            if not self.owns(customer_id):
+                return {'moved': self.version}
+            usage = self.usage.get(customer_id) or self.usage.setdefault(customer_id, CustomerUsage(customer_id))
+            decision = {}
+            decision['accepted'] = adjudicate(data, decision, usage)
+            return decision
+
+    def serve_connection(self, connection):
+        """Answers messages of one router, failed message is answered with error, connection is kept"""
+        try:
+            while True:
+                message = connection.recv()
+                try:
+                    reply = self.handle(message)
+                except Exception as error:
+                    logger.exception('Worker %s failed to handle %s message', self.node, message.get('kind'))
+                    db_connection.close_if_unusable_or_obsolete()
+                    reply = {'error': repr(error)}
+                connection.send(reply)
+        except (EOFError, OSError):  # router has gone
+            pass
+        except Exception:
+            logger.exception('Worker %s dropped connection', self.node)
+        finally:
+            connection.close()
+            db_connection.close()
+
+
+def serve(node, coordinator=None, authkey=None, address=('127.0.0.1', 0)):
+    """Runs worker node: joins coordinator and serves routers until SIGTERM or SIGINT, then leaves"""
+    options = getattr(settings, 'FUNDS_ROUTING', None) or {}
+    authkey = authkey or options.get('authkey', '').encode()
+    coordinator = connect_coordinator(coordinator or options['coordinator'], authkey)
+    worker = Worker(node, coordinator)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    with Listener(tuple(address), authkey=authkey) as listener:
+        coordinator.join(node, listener.address)
+        try:
+            while True:
+                threading.Thread(target=worker.serve_connection, args=(listener.accept(),), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            coordinator.leave(node)
+
+
+def start_worker(node, coordinator, authkey=b''):
+    """Starts worker node in forked process, forked worker shares settings and database of current process"""
+    connections.close_all()  # forked process must not share open database connections
+    process = multiprocessing.get_context('fork').Process(target=serve, args=(node, coordinator, authkey), daemon=True)
+    process.start()
+    return process
+
+
+class Router:
+    """
+    Sends load to worker owning its customer. Ring is refreshed from coordinator not often than interval,
+    and at once when owner is not reachable or answers that customer moved.
+    """
+    attempts = 3
+
+    def __init__(self, coordinator, authkey=b'', interval=1.0):
+        self.coordinator, self.authkey, self.interval = coordinator, authkey, interval
+        self.version, self.ring, self.addresses, self.checked = None, HashRing(), {}, None
+        self.clients, self.lock = {}, threading.Lock()
+
+    def refresh(self, force=False):
+        if not force and self.checked is not None and monotonic() - self.checked < self.interval:
+            return
+        self.checked = monotonic()
+        version, members = self.coordinator.members()
+        if version != self.version:
+            self.version, self.ring, self.addresses = version, HashRing(sorted(members)), members
+
+    def adjudicate(self, data, decision):
+        key = decision_key(data)
+        if key is None:  # invalid load is rejected by form, no owner is needed
+            return adjudicate(data, decision)
+        for attempt in range(self.attempts):
+            self.refresh(force=attempt > 0)
+            node = self.ring.owner(key[1])
+            if node is None:
+                raise RuntimeError('No routing workers')
+            try:
+                reply = self.send(node, {'kind': 'load', 'data': data})
+            except (OSError, EOFError):  # worker has gone, coordinator will show it
+                self.drop(node)
+                continue
+            if 'error' in reply:
+                raise RuntimeError(f'Worker {node} failed: {reply["error"]}')
+            if 'moved' not in reply:
+                decision.update(reply)
+                return decision.pop('accepted')
+        raise RuntimeError(f'Owner of customer {key[1]} is not reachable')
+
+    def send(self, node, message):
+        with self.lock:
+            client = self.clients.get(node)
+            if client is None:
+                client = self.clients[node] = (Client(tuple(self.addresses[node]), authkey=self.authkey), threading.Lock())
+        with client[1]:
+            client[0].send(message)
+            return client[0].recv()
+
+    def drop(self, node):
+        with self.lock:
+            client = self.clients.pop(node, None)
+        if client:
+            client[0].close()
+
+    def close(self):
+        for node in list(self.clients):
+            self.drop(node)
+
+
+_ROUTER = []
+_LOCK = threading.Lock()
+
+
+def get_router():
+    """Router configured by FUNDS_ROUTING setting, created on first use, None if routing is not configured"""
+    if not _ROUTER:
+        with _LOCK:
+            if not _ROUTER:
+                options = getattr(settings, 'FUNDS_ROUTING', None)
+                router = None
+                if options:
+                    authkey = options.get('authkey', '').encode()
+                    router = Router(connect_coordinator(options['coordinator'], authkey), authkey,
+                                    options.get('interval', 1.0))
+                _ROUTER.append(router)
+    return _ROUTER[0]
+
+
+def reset_router():
+    with _LOCK:
+        if _ROUTER and _ROUTER[0]:
+            _ROUTER[0].close()
+        _ROUTER.clear()
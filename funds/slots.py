@@ -0,0 +1,54 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import PrimeSlot
+
+
+class PrimeSlots:
+    """
+    Claims prime ID slots of a day with single upsert of PrimeSlot row: the first claim of a day inserts the row,
+    later claims increment it while slots are left, unique day makes concurrent claims safe.
+    Databases without INSERT ... ON CONFLICT use conditional update, insert and update again.
+    Days seen full are remembered, later prime loads of these days are rejected without query.
+    Claim is part of the transaction of the load, a rolled back load releases its slot.
+    """
+    upsert_vendors = {'postgresql', 'sqlite'}
+
+    def __init__(self):
+        self.full = {}  # epoch-day -> limit the day was full for
+
+    def claim(self, day, limit):
+        """Takes one slot of the day, returns False when all limit slots of the day are taken"""
+        if limit < 1 or limit <= self.full.get(day, 0):
+            return False
+        if connection.vendor in self.upsert_vendors:
+            taken = self.upsert(day, limit)
+        else:
+            taken = self.take(day, limit) or self.insert(day) or self.take(day, limit)
+        if not taken:
+            self.full[day] = max(limit, self.full.get(day, 0))
+        return taken
+
+    def upsert(self, day, limit):
+        table, day_column, used = map(connection.ops.quote_name, (PrimeSlot._meta.db_table, 'day', 'used'))
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {table} ({day_column}, {used}) VALUES (%s, 1) ON CONFLICT ({day_column}) '
+                           f'DO UPDATE SET {used} = {table}.{used} + 1 WHERE {table}.{used} < %s', [day, limit])
+            return cursor.rowcount == 1
+
+    def take(self, day, limit):
+        return PrimeSlot.objects.filter(day=day, used__lt=limit).update(used=F('used') + 1) == 1
+
+    def insert(self, day):
+        try:
+            with transaction.atomic():
+                PrimeSlot.objects.create(day=day, used=1)
+            return True
+        except IntegrityError:  # row exists, day is full or row is inserted by concurrent claim
+            return False
+
+    def reset(self):
+        self.full.clear()
+
+
+PRIME_SLOTS = PrimeSlots()
@@ -0,0 +1,98 @@
+import os
+from statistics import median
+from time import perf_counter
+from unittest import skipUnless
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from funds.calendars import CALENDAR
+from funds.models import CustomerDay, DecidedLoad, FundLoad
+
+BENCHMARK = bool(os.environ.get('FUNDS_BENCHMARK'))  # strict wall-clock budgets and large data sets, opt-in
+benchmark_only = skipUnless(BENCHMARK, 'wall-clock benchmark, set FUNDS_BENCHMARK=1 to run it')
+
+
+class Benchmark:
+    """
+    Benchmark fixture: `benchmark(func, *args)` calls func `rounds` times after `warmup` calls,
+    records wall time and queries of every round and returns result of last call.
+    Budget assertions compare the recorded rounds with exact query count and latency limits.
+    """
+
+    def __init__(self, test, rounds=20, warmup=2):
+        self.test, self.rounds, self.warmup = test, rounds, warmup
+        self.times, self.queries = [], []
+
+    def __call__(self, func, *args, **kwargs):
+        for _ in range(self.warmup):
+            func(*args, **kwargs)
+        self.times, self.queries = [], []
+        for _ in range(self.rounds):
+            with CaptureQueriesContext(connection) as context:
+                start = perf_counter()
+                result = func(*args, **kwargs)
+                self.times.append(perf_counter() - start)
+            self.queries.append([query['sql'] for query in context.captured_queries])
+        return result
+
+    @property
+    def median(self):
+        return median(self.times)
+
+    @property
+    def query_counts(self):
+        return {len(queries) for queries in self.queries}
+
+    def assert_queries(self, count):
+        """Every round made exactly count queries"""
+        self.test.assertEqual(self.query_counts, {count}, '\n'.join(max(self.queries, key=len)))
+
+    def assert_latency(self, median_ms, max_ms=None):
+        self.test.assertLess(self.median * 1000, median_ms)
+        if max_ms is not None:
+            self.test.assertLess(max(self.times) * 1000, max_ms)
+
+
+class BenchmarkMixin:
+    """Adds `benchmark` fixture to TestCase, rounds are taken from FUNDS_BENCHMARK_ROUNDS environment variable"""
+    rounds = int(os.environ.get('FUNDS_BENCHMARK_ROUNDS', 20))
+
+    def setUp(self):
+        super().setUp()
+        self.benchmark = Benchmark(self, self.rounds)
+
+
+def fill_history(size, start_id=10_000_000, customers=100_000, first_day=10_957, days=700):
+    """
+    Inserts size accepted loads by one executemany, spread over customers and days, for history-size checks.
+    Claims and CustomerDay usage of inserted loads are added by INSERT ... SELECT, start_id must be above other loads.
+    """
+    fields = [FundLoad._meta.get_field(name) for name in
+              ('id', 'customer_id', 'load_amount', 'time', 'day', 'week', 'is_prime', 'config_version')]
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        connection.ops.quote_name(FundLoad._meta.db_table),
+        ', '.join(connection.ops.quote_name(field.column) for field in fields), ', '.join(['%s'] * len(fields)))
+    calendar = [(f'{CALENDAR.date(day)} 12:00:00', day, CALENDAR.week(day)) for day in range(first_day, first_day + days)]
+    rows = ((start_id + number, number % customers + 1, '100.00', *calendar[number % days], False, 0)
+            for number in range(size))
+    column = lambda model, name: connection.ops.quote_name(model._meta.get_field(name).column)
+    group = ', '.join(column(FundLoad, name) for name in ('customer_id', 'day', 'week'))
+    count, amount = column(CustomerDay, 'count'), column(CustomerDay, 'amount')
+    aggregate = ('INSERT INTO {} ({}, {}, {}) SELECT {}, COUNT(*), SUM({}) FROM {} WHERE {} >= %s GROUP BY {} '
+                 'ON CONFLICT ({}) DO UPDATE SET {} = {} + excluded.{}, {} = {} + excluded.{}').format(
+        connection.ops.quote_name(CustomerDay._meta.db_table),
+        ', '.join(column(CustomerDay, name) for name in ('customer_id', 'day', 'week')), count, amount,
+        group, column(FundLoad, 'load_amount'), connection.ops.quote_name(FundLoad._meta.db_table), column(FundLoad, 'id'),
+        group, ', '.join(column(CustomerDay, name) for name in ('customer_id', 'day')),
+        count, count, count, amount, amount, amount)
+    claim = 'INSERT INTO {} ({}, {}, {}, {}, {}) SELECT {}, {}, %s, {}, CURRENT_TIMESTAMP FROM {} WHERE {} >= %s'.format(
+        connection.ops.quote_name(DecidedLoad._meta.db_table),
+        *(column(DecidedLoad, name) for name in ('load_id', 'customer_id', 'accepted', 'config_version', 'created')),
+        *(column(FundLoad, name) for name in ('id', 'customer_id', 'config_version')),
+        connection.ops.quote_name(FundLoad._meta.db_table), column(FundLoad, 'id'))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+        # usage of the inserted loads, as FundLoad.save would count it
+        cursor.execute(aggregate, [start_id])
+        cursor.execute(claim, [True, start_id])
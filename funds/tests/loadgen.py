@@ -0,0 +1,63 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of values"""
+    ordered = sorted(values)
+    return ordered[max(0, -(-len(ordered) * percent // 100) - 1)]
+
+
+class Contended:
+    """
+    Handler of simulated overloaded database: every request takes `cost` seconds per request in flight,
+    so latency grows with concurrency the way it does when connections queue for locks and disk.
+    """
+
+    def __init__(self, cost=0.002, status=200):
+        self.cost, self.status, self.inflight = cost, status, 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self.lock:
+            self.inflight += 1
+            load = self.inflight
+        try:
+            sleep(self.cost * load)
+            return self.status
+        finally:
+            with self.lock:
+                self.inflight -= 1
+
+
+class LoadGenerator:
+    """
+    Local load generator: `clients` threads send `requests` requests each back to back (a spike),
+    `send()` returns HTTP status. Latency of every request is recorded by its status.
+    """
+
+    def __init__(self, send, clients=64, requests=10):
+        self.send, self.clients, self.requests = send, clients, requests
+        self.latencies = {}
+        self.lock = threading.Lock()
+
+    def client(self):
+        for _ in range(self.requests):
+            start = perf_counter()
+            status = self.send()
+            latency = perf_counter() - start
+            with self.lock:
+                self.latencies.setdefault(status, []).append(latency)
+
+    def run(self):
+        with ThreadPoolExecutor(self.clients) as pool:
+            for future in [pool.submit(self.client) for _ in range(self.clients)]:
+                future.result()
+        return self
+
+    def p99(self, status=200):
+        return percentile(self.latencies[status], 99)
+
+    def count(self, status):
+        return len(self.latencies.get(status, ()))
@@ -0,0 +1,18 @@
+import json
+
+from django.urls import reverse
+
+
+class FundLoadClientMixin:
+    """Posts fund loads to FundLoadView with test client"""
+
+    def send(self, payload):
+        return self.client.post(reverse('fund-load'), data=json.dumps(payload), content_type='application/json')
+
+    def post_load(self, id, amount='100.00', customer='528', time='2000-01-04T10:00:00Z'):
+        """Posts load, returns response"""
+        return self.send({'id': str(id), 'customer_id': str(customer), 'load_amount': f'${amount}', 'time': time})
+
+    def post(self, *args, **kwargs):
+        """Posts load, returns whether it is accepted"""
+        return json.loads(self.post_load(*args, **kwargs).content)['accepted']
@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from funds.decision_log import reset_decision_log
+from funds.idempotency import DECISIONS
+from funds.limits import RULES
+from funds.slots import PRIME_SLOTS
+
+
+class TestSuite(unittest.TestSuite):
+    """
+    Resets in-memory caches of funds before every test: decisions, full prime days and rules index
+    may hold rows of earlier tests that are rolled back or flushed, test cases need no own reset.
+    """
+
+    def __iter__(self):
+        for test in super().__iter__():
+            DECISIONS.reset()
+            PRIME_SLOTS.reset()
+            RULES.reset()
+            yield test
+
+
+class TestRunner(DiscoverRunner):
+    """Test run writes file decision log into temporary folder, project logs get no test decisions"""
+    test_suite = TestSuite
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.logs = tempfile.TemporaryDirectory()
+        options = getattr(settings, 'FUNDS_DECISION_LOG', None)
+        if options and options.get('sink') == 'file':
+            options = {**options, 'path': Path(self.logs.name) / 'decisions.jsonl'}
+        self.decision_log = override_settings(FUNDS_DECISION_LOG=options)
+        self.decision_log.enable()
+        reset_decision_log()
+
+    def teardown_test_environment(self, **kwargs):
+        reset_decision_log()  # writes buffered decisions and stops writer
+        self.decision_log.disable()
+        self.logs.cleanup()
+        super().teardown_test_environment(**kwargs)
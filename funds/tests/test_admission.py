@@ -0,0 +1,139 @@
+from threading import Thread
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from funds.admission import AdaptiveLimit, AdmissionController, AdmissionMiddleware, get_admission, reset_admission
+from funds.tests.benchmark import benchmark_only
+from funds.tests.loadgen import Contended, LoadGenerator, percentile
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class AdaptiveLimitTestCase(SimpleTestCase):
+
+    def test_additive_increase(self):
+        limit = AdaptiveLimit(initial=10, target=0.05)
+        for _ in range(10):
+            limit.update(0.01)
+        self.assertEqual(limit.current, 10)
+        limit.update(0.01)
+        self.assertEqual(limit.current, 11)
+
+    def test_multiplicative_decrease_once_per_target(self):
+        limit = AdaptiveLimit(initial=10, target=0.05, backoff=0.5)
+        self.assertEqual(limit.update(0.1, now=1.0), 5)
+        self.assertEqual(limit.update(0.1, now=1.01), 5)
+        self.assertEqual(limit.update(0.01, failed=True, now=1.1), 2)
+
+    def test_bounds(self):
+        limit = AdaptiveLimit(initial=2, minimum=1, maximum=3, target=0.05, backoff=0.1)
+        self.assertEqual(limit.update(1, now=1), 1)
+        for _ in range(10):
+            limit.update(0.01)
+        self.assertEqual(limit.current, 3)
+
+
+class AdmissionControllerTestCase(SimpleTestCase):
+
+    def test_queue_full(self):
+        controller = AdmissionController(initial=1, maximum=1, queue=0)
+        self.assertIsNone(controller.acquire())
+        self.assertEqual(controller.acquire(), 'queue_full')
+        controller.release(0.01)
+        self.assertIsNone(controller.acquire())
+        self.assertEqual(controller.stats(), {'limit': 1, 'inflight': 1, 'waiting': 0, 'admitted': 2,
+                                              'shed': {'queue_full': 1}})
+
+    def test_queue_timeout(self):
+        controller = AdmissionController(initial=1, queue_timeout=0.01)
+        controller.acquire()
+        self.assertEqual(controller.acquire(), 'timeout')
+        response = controller.rejection('timeout')
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+
+    def test_waiting_request_gets_released_slot(self):
+        controller = AdmissionController(initial=1, queue_timeout=5)
+        controller.acquire()
+        results = []
+        waiter = Thread(target=lambda: results.append(controller.acquire()))
+        waiter.start()
+        while not controller.stats()['waiting']:
+            pass
+        controller.release(0.01)
+        waiter.join()
+        self.assertEqual(results, [None])
+
+    def test_percentile(self):
+        self.assertEqual(percentile(range(1, 101), 99), 99)
+        self.assertEqual(percentile([5], 99), 5)
+
+
+@benchmark_only
+class SpikeTestCase(SimpleTestCase):
+    """Spike of 64 clients against handler whose latency grows with concurrency, as database under overload"""
+    admission = {'initial': 10, 'target': 0.02, 'queue': 16, 'queue_timeout': 0.02}
+
+    def tearDown(self):
+        reset_admission()
+
+    def test_p99_is_protected(self):
+        url = reverse('fund-load')
+        handler = Contended(cost=0.004)
+        unprotected = LoadGenerator(lambda: HttpResponse(status=handler(RequestFactory().post(url))).status_code).run()
+        with override_settings(FUNDS_ADMISSION=self.admission):
+            middleware = AdmissionMiddleware(lambda request: HttpResponse(status=handler(request)))
+            middleware(RequestFactory().post(url))  # warm up
+            protected = LoadGenerator(lambda: middleware(RequestFactory().post(url)).status_code).run()
+            stats = get_admission().stats()
+        self.assertLess(stats['limit'], 10)
+        self.assertEqual(sum(stats['shed'].values()), protected.count(429) + protected.count(503))
+        self.assertGreater(protected.count(200), 0)
+        self.assertLess(protected.p99(), unprotected.p99() / 2)
+        shed = [latency for status in (429, 503) for latency in protected.latencies.get(status, ())]
+        self.assertLess(percentile(shed, 99), self.admission['queue_timeout'] * 3)
+
+
+class AdmissionMiddlewareTestCase(FundLoadClientMixin, TestCase):
+    middleware = settings.MIDDLEWARE + ['funds.admission.AdmissionMiddleware']
+
+    def setUp(self):
+        reset_admission()
+        self.client.force_login(User.objects.create_user('staff', is_staff=True))
+
+    def tearDown(self):
+        reset_admission()
+
+    def admission(self, **options):
+        return override_settings(MIDDLEWARE=self.middleware, FUNDS_ADMISSION={'queue_timeout': 0.01, **options})
+
+    def test_admitted(self):
+        with self.admission():
+            self.assertEqual(self.post_load(4).status_code, 200)
+            self.assertEqual(self.client.get(reverse('fund-admission')).json()['admitted'], 1)
+
+    def test_shed(self):
+        with self.admission(initial=1, queue=0):
+            get_admission().acquire()  # request in flight
+            response = self.post_load(4)
+            self.assertEqual((response.status_code, response['Retry-After']), (429, '1'))
+            self.assertEqual(self.client.get(reverse('fund-admission')).json()['shed'], {'queue_full': 1})
+
+    def test_other_urls_are_not_controlled(self):
+        with self.admission(initial=1, queue=0):
+            get_admission().acquire()
+            self.assertEqual(self.client.get(reverse('fund-admission')).status_code, 200)
+
+    def test_not_configured(self):
+        with override_settings(MIDDLEWARE=self.middleware, FUNDS_ADMISSION=None):
+            self.assertEqual(self.post_load(4).status_code, 200)
+            self.assertEqual(self.client.get(reverse('fund-admission')).status_code, 404)
+
+    def test_staff_only(self):
+        self.client.logout()
+        with self.admission():
+            response = self.client.get(reverse('fund-admission'))
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn('admitted', response.content.decode())
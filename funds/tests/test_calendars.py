@@ -0,0 +1,19 @@
+from datetime import date, datetime, timezone
+
+from django.test import SimpleTestCase
+
+from funds.calendars import CALENDAR, Calendar
+
+
+class CalendarTestCase(SimpleTestCase):
+
+    def test_day_and_week(self):
+        day = CALENDAR.day(datetime(2000, 1, 3, 10, tzinfo=timezone.utc))  # Monday
+        self.assertEqual(day, 10959)
+        self.assertEqual(CALENDAR[day], (date(2000, 1, 3), 200001, 0, 2))
+        self.assertEqual(CALENDAR.week(day - 1), 199952)
+
+    def test_out_of_range_matches_tables(self):
+        calendar = Calendar(start=date(2000, 1, 1), end=date(2000, 2, 1))
+        for day in range(calendar.first - 10, calendar.last + 10):
+            self.assertEqual(calendar[day], CALENDAR[day])
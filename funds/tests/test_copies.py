@@ -0,0 +1,53 @@
+import ast
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+FUNDS, PLAIN = settings.BASE_DIR / 'funds', settings.BASE_DIR / 'easy_version'
+
+# (funds module, class, plain module, class): methods copied to plain version, see "Plain version" in repo.md
+COPIES = {
+    ('profiling.py', 'Sample', 'profiler.py', 'Sample'): [
+        '__init__', 'stage', '__enter__', '__exit__', 'trace', 'add_rules'],
+    ('profiling.py', 'Profiler', 'profiler.py', 'Profiler'): ['sample'],
+    ('decision_log.py', 'DecisionLog', 'decision_log.py', 'DecisionLog'): ['record', 'close'],
+    ('decision_log.py', 'FileSink', 'decision_log.py', 'DecisionLog'): ['rotate'],
+    ('calendars.py', 'Calendar', 'plain.py', 'Calendar'): [
+        'dates', 'weeks', 'weekdays', 'multipliers', 'with_dividers', '__getitem__', 'date', 'week', 'weekday',
+        'multiplier'],
+}
+CONSTANTS = ('calendars.py', 'plain.py'), ['EPOCH', 'WEEKDAYS', 'DIVIDER_PER_DAY']
+
+
+def definitions(path, name=None):
+    """{name: ast dump without docstring} of module level assignments or of methods of class name"""
+    body = ast.parse(path.read_text()).body
+    if name:
+        body = next(node for node in body if isinstance(node, ast.ClassDef) and node.name == name).body
+    result = {}
+    for node in body:
+        if isinstance(node, ast.FunctionDef):
+            if ast.get_docstring(node) is not None:
+                node.body = node.body[1:]
+            result[node.name] = ast.dump(node)
+        elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
+            result[node.targets[0].id] = ast.dump(node.value)
+    return result
+
+
+class CopiesTestCase(SimpleTestCase):
+    """Plain version is packaged without Django and does not import funds, its copies of funds code stay identical"""
+
+    def test_methods(self):
+        for (module, name, plain_module, plain_name), methods in COPIES.items():
+            ours, theirs = definitions(FUNDS / module, name), definitions(PLAIN / plain_module, plain_name)
+            for method in methods:
+                with self.subTest(f'{module}:{name}.{method}'):
+                    self.assertEqual(ours[method], theirs[method])
+
+    def test_constants(self):
+        (module, plain_module), names = CONSTANTS
+        ours, theirs = definitions(FUNDS / module), definitions(PLAIN / plain_module)
+        for name in names:
+            with self.subTest(name):
+                self.assertEqual(ours[name], theirs[name])
@@ -0,0 +1,130 @@
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+
+from funds.decision_log import DecisionLog, FileSink, get_decision_log, reset_decision_log
+from funds.idempotency import DECISIONS
+from funds.models import LoadDecision
+from funds.slots import PRIME_SLOTS
+from funds.tests.mixins import FundLoadClientMixin
+from funds.tests.runner import TestSuite
+
+
+class DecisionLogTestCase(SimpleTestCase):
+
+    def test_batches(self):
+        batches = []
+        log = DecisionLog(batches.append, batch=3, interval=60)
+        for number in range(7):
+            log.record({'load_id': number})
+        log.close()
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual(log.written, 7)
+
+    def test_flush_interval(self):
+        written = threading.Event()
+        log = DecisionLog(lambda batch: written.set(), batch=100, interval=0.05)
+        log.record({'load_id': 1})
+        self.assertTrue(written.wait(2))
+        log.close()
+
+    def test_backpressure(self):
+        release = threading.Event()
+        log = DecisionLog(lambda batch: release.wait(2), capacity=2, batch=1, interval=60)
+        for number in range(4):
+            threading.Timer(0.05, release.set).start() if number == 3 else None
+            log.record({'load_id': number})
+        log.close()
+        self.assertGreater(log.waits, 0)
+        self.assertEqual(log.written, 4)
+
+    def test_closed(self):
+        log = DecisionLog(lambda batch: None)
+        log.close()
+        with self.assertRaises(ValueError):
+            log.record({'load_id': 1})
+
+    def test_failed_batch_is_dropped(self):
+        batches = []
+
+        def sink(batch):
+            if batch[0]['load_id'] == 0:
+                raise OSError('No space left on device')
+            batches.append(batch)
+        log = DecisionLog(sink, batch=1, interval=60)
+        with self.assertLogs('funds.decision_log', 'ERROR'):
+            for number in range(3):
+                log.record({'load_id': number})
+            log.close()
+        self.assertEqual(batches, [[{'load_id': 1}], [{'load_id': 2}]])
+        self.assertEqual((log.written, log.dropped), (2, 1))
+
+    def test_gone_writer_does_not_block(self):
+        def sink(batch):
+            raise SystemExit  # not an Exception, writer thread ends
+        log = DecisionLog(sink, capacity=1, batch=1, interval=60)
+        log.record({'load_id': 0})
+        log.thread.join(2)
+        for number in range(1, 5):  # buffer is full, record() would wait for writer forever
+            log.record({'load_id': number})
+        self.assertEqual(log.dropped, 4)
+
+    def test_file_sink_rotation(self):
+        with tempfile.TemporaryDirectory() as folder:
+            sink = FileSink(Path(folder) / 'decisions.jsonl', max_bytes=60, backups=2)
+            for number in range(4):
+                sink([{'load_id': number, 'accepted': True, 'reason': None}])
+            self.assertEqual(sorted(path.name for path in Path(folder).iterdir()), ['decisions.jsonl', 'decisions.jsonl.1', 'decisions.jsonl.2'])
+            self.assertEqual(json.loads(sink.path.read_text())['load_id'], 3)
+
+
+class TestRunnerTestCase(SimpleTestCase):
+
+    def test_decisions_of_tests_are_not_in_project_logs(self):
+        self.assertNotEqual(Path(settings.FUNDS_DECISION_LOG['path']).parent, settings.BASE_DIR / 'logs')
+
+    def test_caches_are_reset_before_every_test(self):
+        DECISIONS.recent[(1, 528)] = True
+        PRIME_SLOTS.full[10960] = 1
+        self.assertEqual(list(TestSuite([self])), [self])
+        self.assertEqual((DECISIONS.recent, PRIME_SLOTS.full), ({}, {}))
+
+
+@override_settings(FUNDS_DECISION_LOG={'sink': 'db', 'batch': 100, 'interval': 60})
+class ViewDecisionLogTestCase(FundLoadClientMixin, TransactionTestCase):
+
+    def setUp(self):
+        reset_decision_log()
+
+    def tearDown(self):
+        reset_decision_log()
+
+    def test_every_decision_logged(self):
+        self.post('1', '3000.00')
+        self.post('2', '3000.00')
+        self.post('1', '3000.00')
+        self.post('3', '1.00')
+        self.post('5', '1.00')
+        reset_decision_log()  # flushes buffer
+        decisions = list(LoadDecision.objects.order_by('id').values_list('load_id', 'accepted', 'reason', 'retry'))
+        self.assertEqual(decisions, [
+            (1, True, None, False),
+            (2, False, 'DAILY', False),
+            (1, True, None, True),
+            (3, True, None, False),
+            (5, False, 'PRIMES_PER_DAY', False),
+        ])
+        decision = LoadDecision.objects.first()
+        self.assertEqual(decision.config_version, 0)
+        self.assertIn('DAILY', decision.timings)
+
+    @override_settings(FUNDS_DECISION_LOG=None)
+    def test_disabled(self):
+        reset_decision_log()
+        self.assertIsNone(get_decision_log())
+        self.post('1', '3000.00')
+        self.assertFalse(LoadDecision.objects.exists())
@@ -0,0 +1,117 @@
+import multiprocessing
+
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+
+from funds.idempotency import DECISIONS, BloomFilter
+from funds.limits import RULES
+from funds.models import DecidedLoad, FundLoad, LimitConfig
+from funds.slots import PRIME_SLOTS
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class BloomFilterTestCase(SimpleTestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for key in range(1000):
+            bloom.add((key, 1))
+        self.assertTrue(all((key, 1) in bloom for key in range(1000)))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for key in range(1000):
+            bloom.add((key, 1))
+        false_positives = sum((key, 2) in bloom for key in range(10_000))
+        self.assertLess(false_positives, 300)
+        self.assertEqual(len(bloom.bits), 1199)  # 9.6 bits per key
+
+
+class IdempotencyTestCase(FundLoadClientMixin, TestCase):
+
+    def test_retry_is_not_counted_twice(self):
+        self.assertTrue(self.post('12345', '3000.00'))
+        self.assertTrue(self.post('12345', '3000.00'))
+        self.assertEqual(FundLoad.objects.count(), 1)
+        self.assertTrue(self.post('12346', '2000.00'))
+
+    def test_retry_returns_rejection(self):
+        self.assertFalse(self.post('12345', '6000.00'))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.post('12345', '6000.00'))
+
+    def test_new_load_has_no_duplicate_query(self):
+        self.assertTrue(self.post('12345', '100.00'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(DECISIONS.get((12346, 528)))
+
+    def test_decision_after_restart(self):
+        self.assertTrue(self.post('12345', '100.00'))
+        DECISIONS.reset()
+        PRIME_SLOTS.reset()
+        with self.assertNumQueries(2):  # warm up scan and exact check
+            self.assertTrue(DECISIONS.get((12345, 528)))
+
+    def test_rejection_after_restart(self):
+        self.assertFalse(self.post('12345', '6000.00'))
+        self.assertEqual(DecidedLoad.objects.get(accepted=False).reason, 'MAX_AMOUNT')
+        DECISIONS.reset()
+        self.assertIs(DECISIONS.get((12345, 528)), False)
+
+    def test_retry_unknown_to_filter(self):
+        self.assertTrue(self.post('12345', '3000.00'))
+        DECISIONS.bloom = BloomFilter()  # worker which has not seen the load
+        DECISIONS.recent.clear()
+        self.assertTrue(self.post('12345', '3000.00'))  # daily limit would reject it if it were a new load
+        self.assertEqual(FundLoad.objects.count(), 1)
+        self.assertFalse(DecidedLoad.objects.filter(accepted=False).exists())
+
+    def test_rejected_retry_after_reload(self):
+        self.assertFalse(self.post('12345', '6000.00'))
+        LimitConfig.objects.create(version=2, limits={'MAX_AMOUNT': 9000, 'DAILY': 9000})
+        RULES.refresh(force=True)
+        DECISIONS.bloom = BloomFilter()  # worker which has not seen the load
+        DECISIONS.recent.clear()
+        self.assertFalse(self.post('12345', '6000.00'))  # new limits would accept it if it were a new load
+        self.assertFalse(FundLoad.objects.exists())
+        self.assertTrue(self.post('12346', '6000.00'))
+
+    def test_same_id_other_customer(self):
+        self.assertTrue(self.post('12345', '100.00'))
+        self.assertFalse(self.post('12345', '100.00', customer='529'))
+
+
+def in_other_process(function, *args):
+    """Result of function called in forked process, as if request was served by other worker"""
+    connections.close_all()  # forked process must not share open database connections
+    reader, writer = multiprocessing.Pipe(duplex=False)
+
+    def run():
+        try:
+            writer.send(function(*args))
+        finally:
+            connections.close_all()
+
+    process = multiprocessing.get_context('fork').Process(target=run)
+    process.start()
+    result = reader.recv()
+    process.join()
+    return result
+
+
+class OtherProcessTestCase(FundLoadClientMixin, TransactionTestCase):
+    """Decisions of one process are seen by retries in other process, filter of this one is warmed before"""
+
+    def setUp(self):
+        DECISIONS.warm()
+
+    def test_accepted_on_other_process(self):
+        self.assertTrue(in_other_process(self.post, '12345', '3000.00'))
+        self.assertTrue(self.post('12345', '3000.00'))
+        self.assertEqual(FundLoad.objects.count(), 1)
+
+    def test_rejected_on_other_process(self):
+        self.assertFalse(in_other_process(self.post, '12345', '6000.00'))
+        self.assertIs(DECISIONS.get((12345, 528)), None)  # filter of this process does not know it
+        self.assertFalse(self.post('12345', '6000.00'))
+        self.assertEqual(DecidedLoad.objects.filter(accepted=False).count(), 1)
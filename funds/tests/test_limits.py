@@ -0,0 +1,98 @@
+import json
+import tempfile
+from io import StringIO
+from decimal import Decimal
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from funds.limits import RULES, compile_rules
+from funds.models import FundLoad, LimitConfig, LimitOverride
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class LimitsConfigTestCase(FundLoadClientMixin, TestCase):
+
+    def load_limits(self, config):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as source:
+            json.dump(config, source)
+            source.flush()
+            call_command('load_limits', source.name, stdout=StringIO())
+
+    def test_compile_rules(self):
+        default = compile_rules(2, limits={'DAILY': 7000})
+        rules = compile_rules(2, 'verified', {'WEEKLY': 40000}, base=default)
+        self.assertEqual((rules.daily, rules.weekly, rules.min_amount), (Decimal('7000.00'), Decimal('40000.00'), Decimal('0.01')))
+        with self.assertRaises(TypeError):
+            rules.limits['DAILY'] = 1
+
+    def test_hot_reload(self):
+        self.assertTrue(self.post('12345', '100.00'))
+        self.load_limits({'version': 2, 'tiers': {'default': {'limits': {'LOADS_PER_DAY': 1}}, 'verified': {}}})
+        self.assertFalse(self.post('12346', '100.00'))
+        self.assertEqual(RULES['verified'].loads_per_day, 1)
+        self.assertEqual(FundLoad.objects.get(id=12345).config_version, 0)
+
+    def test_decision_records_version(self):
+        self.load_limits({'version': 4, 'tiers': {'default': {'limits': {'MAX_AMOUNT': 9000, 'DAILY': 9000}}}})
+        self.assertTrue(self.post('12345', '8000.00'))
+        self.assertEqual(FundLoad.objects.get(id=12345).config_version, 4)
+
+    def test_reload_interval(self):
+        RULES.refresh(force=True)
+        LimitConfig.objects.bulk_create([LimitConfig(version=3, limits={'DAILY': 1})])  # no signals
+        with self.assertNumQueries(0):
+            self.assertEqual(RULES['default'].version, 0)
+
+    def test_old_version_rejected(self):
+        self.load_limits({'version': 2})
+        with self.assertRaises(CommandError):
+            self.load_limits({'version': 2})
+
+
+class LimitOverrideTestCase(FundLoadClientMixin, TestCase):
+
+    def setUp(self):
+        LimitConfig.objects.create(version=1, tier='verified', limits={'WEEKLY': 40000})
+        LimitOverride.objects.create(customer_id=528, tier='verified')
+        RULES.refresh(force=True)
+
+    def test_index(self):
+        self.assertEqual(RULES.for_customer(528).weekly, Decimal('40000.00'))
+        self.assertIs(RULES.for_customer(529), RULES['default'])
+
+    def test_no_queries_per_lookup(self):
+        with self.assertNumQueries(0):
+            for customer_id in range(500, 600):
+                RULES.for_customer(customer_id)
+
+    def test_incremental_refresh(self):
+        tiers, customers = RULES.index
+        LimitOverride.objects.bulk_create([LimitOverride(customer_id=7, tier='verified', limits={'DAILY': 100})])  # no signals
+        RULES.invalidate()
+        with self.assertNumQueries(2):
+            self.assertEqual(RULES.for_customer(7).daily, Decimal('100.00'))
+        self.assertIs(RULES.index[0], tiers)
+        self.assertIs(RULES.index[1], customers)
+
+    def test_local_save_does_not_skip_other_process(self):
+        other = LimitOverride(customer_id=7, limits={'DAILY': 100})
+        LimitOverride.objects.bulk_create([other])  # saved by other process, no signal here
+        LimitOverride.objects.create(customer_id=9, limits={'DAILY': 200})
+        self.assertEqual(RULES.for_customer(9).daily, Decimal('200.00'))
+        RULES.invalidate()
+        self.assertEqual(RULES.for_customer(7).daily, Decimal('100.00'))
+
+    def test_signals(self):
+        override = LimitOverride.objects.create(customer_id=9, limits={'LOADS_PER_DAY': 1})
+        self.assertEqual(RULES.for_customer(9).loads_per_day, 1)
+        override.active = False
+        override.save()
+        self.assertIs(RULES.for_customer(9), RULES['default'])
+        LimitOverride.objects.filter(customer_id=528).delete()
+        self.assertIs(RULES.for_customer(528), RULES['default'])
+
+    def test_validators_use_customer_limits(self):
+        LimitOverride.objects.create(customer_id=530, limits={'LOADS_PER_DAY': 1})
+        self.assertEqual([self.post(1, customer=530), self.post(4, customer=530), self.post(6, customer=531),
+                          self.post(8, customer=531)], [True, False, True, True])
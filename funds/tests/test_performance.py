@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import date, timedelta
+from itertools import count
+
+from django.test import TestCase
+
+from funds.idempotency import DECISIONS
+from funds.limits import RULES
+from funds.models import FundLoad, is_prime
+from funds.tests.benchmark import BENCHMARK, BenchmarkMixin, benchmark_only, fill_history
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class FundLoadBenchmarkMixin(FundLoadClientMixin, BenchmarkMixin):
+    """Every round posts loads of a new customer on a new day, so all rounds take the same path through validators"""
+    # ms, median of FundLoadView request on local SQLite; default run only catches gross regressions on slow machines
+    LATENCY_BUDGET = 25 if BENCHMARK else 100
+
+    def setUp(self):
+        super().setUp()
+        RULES.refresh(force=True)  # caches are warm as in running worker
+        DECISIONS.warm()
+        self.customers, self.ids, self.primes = count(1), count(1_000_000, 2), filter(is_prime, count(3))
+
+    def submit(self, payload):
+        return json.loads(self.send(payload).content)['accepted']
+
+    def payload(self, customer, amount='100.00', prime=False):
+        return {'id': str(next(self.primes) if prime else next(self.ids)), 'customer_id': str(customer),
+                'load_amount': f'${amount}', 'time': f'{date(2010, 1, 1) + timedelta(days=customer)}T10:00:00Z'}
+
+    def post_new(self, amount='100.00', prime=False):
+        return self.submit(self.payload(next(self.customers), amount, prime))
+
+
+class FundLoadQueriesTestCase(FundLoadBenchmarkMixin, TestCase):
+    """Exact query count of every FundLoadView path"""
+
+    def test_accepted_load(self):
+        self.assertTrue(self.benchmark(self.post_new))
+        self.benchmark.assert_queries(2 + 6)  # savepoint and release, usage of week, claim insert, insert,
+        # first load of the day: savepoint, usage insert, release
+        self.benchmark.assert_latency(self.LATENCY_BUDGET)
+
+    def test_accepted_prime_load(self):
+        self.assertTrue(self.benchmark(self.post_new, prime=True))
+        self.benchmark.assert_queries(8 + 1)  # slot upsert
+        self.benchmark.assert_latency(self.LATENCY_BUDGET)
+
+    def test_rejected_by_amount(self):
+        self.assertFalse(self.benchmark(self.post_new, amount='5000.01'))
+        self.benchmark.assert_queries(2 + 1)  # claim insert; counters are not queried
+        self.benchmark.assert_latency(self.LATENCY_BUDGET)
+
+    def test_rejected_by_daily_limit(self):
+        def post_twice():
+            customer = next(self.customers)
+            self.submit(self.payload(customer, '3000.00'))
+            return self.submit(self.payload(customer, '3000.00'))
+        self.assertFalse(self.benchmark(post_twice))
+        self.benchmark.assert_queries(7 + 5)  # accepted load, rejected one stops on daily limit and is stored
+
+    def test_prime_slot_taken(self):
+        customer = next(self.customers)
+        self.assertTrue(self.submit(self.payload(customer, prime=True)))
+        self.assertFalse(self.benchmark(lambda: self.submit(self.payload(customer, prime=True))))
+        self.benchmark.assert_queries(2 + 2)  # usage of week, claim insert;
+        # day is known to be full, slot is not queried
+
+    def test_retry(self):
+        payload = self.payload(next(self.customers))
+        self.assertTrue(self.submit(payload))
+        self.assertTrue(self.benchmark(self.submit, payload))
+        self.benchmark.assert_queries(0)  # decision from recent cache
+
+    def test_first_request_warms_decisions(self):
+        DECISIONS.reset()
+        with self.assertNumQueries(1 + 8):  # scan of stored decisions for bloom filter
+            self.post_new()
+
+
+class HistorySizeTestCase(FundLoadBenchmarkMixin, TestCase):
+    """Query count and latency do not depend on number of stored loads"""
+
+    def check_history(self, *sizes):
+        counts, stored = [], 0
+        for size in sizes:
+            fill_history(size - stored, start_id=10_000_000 + stored)
+            stored = size
+            DECISIONS.warm()
+            self.benchmark(self.post_new)
+            counts.append(self.benchmark.query_counts)
+            self.benchmark.assert_latency(self.LATENCY_BUDGET)
+        self.assertEqual(counts, [{8}] * len(sizes))
+        self.assertEqual(FundLoad.objects.count(), sizes[-1] + len(sizes) * (self.benchmark.warmup + self.rounds))
+
+    def test_history_size(self):
+        self.check_history(1_000, 30_000)
+
+    @benchmark_only
+    def test_large_history(self):
+        self.check_history(1_000, int(os.environ.get('FUNDS_BENCHMARK_HISTORY', 1_000_000)))
@@ -0,0 +1,81 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from funds.profiling import Profiler, get_profiler, reset_profiler, stage
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class ProfilerTestCase(SimpleTestCase):
+
+    def test_sampling_is_deterministic(self):
+        profiler = Profiler(fraction=0.25)
+        self.assertEqual([profiler.sample() is not None for _ in range(8)], [False, False, False, True] * 2)
+
+    def test_nested_stages(self):
+        profiler = Profiler(fraction=1, root='test')
+        sample = profiler.sample()
+        with sample.stage('request'):
+            with sample.stage('validate'):
+                pass
+            sample.add_rules('validate', {'DAILY': 5})
+        profiler.merge(sample)
+        self.assertEqual(set(profiler.stacks), {'test;request', 'test;request;validate', 'test;request;validate;DAILY'})
+        self.assertEqual(profiler.rules['validate;DAILY'], 5)
+        self.assertEqual(profiler.report()['stages']['request']['count'], 1)
+
+    def test_off(self):
+        self.assertIsNone(get_profiler())
+        with stage('parse') as sample:
+            self.assertIsNone(sample)
+
+
+class ProfilingMiddlewareTestCase(FundLoadClientMixin, TestCase):
+    middleware = settings.MIDDLEWARE + ['funds.profiling.ProfilingMiddleware']
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = Path(self.folder.name) / 'profile.txt'
+        reset_profiler()
+
+    def tearDown(self):
+        reset_profiler()
+        self.folder.cleanup()
+
+    def profile(self, **options):
+        return override_settings(MIDDLEWARE=self.middleware, FUNDS_PROFILING={'path': self.path, **options})
+
+    def test_stages_and_rules(self):
+        with self.profile(fraction=0.5):
+            for id in range(1, 7):
+                self.assertEqual(self.post_load(id).status_code, 200)
+            report = get_profiler().report()
+            reset_profiler()
+        self.assertEqual((report['requests'], report['samples']), (6, 3))
+        self.assertEqual(set(report['stages']), {'request', 'parse', 'validate', 'store', 'record', 'serialize'})
+        self.assertIn('validate;DAILY', report['rules'])
+        stacks = dict(line.rsplit(' ', 1) for line in self.path.read_text().splitlines())
+        self.assertIn('fund-load;request;validate;DAILY', stacks)
+        self.assertEqual(json.loads(self.path.with_suffix('.json').read_text()), report)
+
+    def test_traced_stacks(self):
+        with self.profile(fraction=1, traced=True):
+            self.post(1)
+            reset_profiler()
+        stacks = [line.rsplit(' ', 1)[0] for line in self.path.read_text().splitlines()]
+        self.assertTrue(any(';funds.forms.adjudicate;validate;' in stack for stack in stacks))
+        self.assertTrue(any(stack.endswith('funds.forms.FundLoadForm._post_clean') for stack in stacks))
+        self.assertFalse(any('funds.profiling' in stack for stack in stacks))
+
+    def test_other_urls_are_not_profiled(self):
+        with self.profile(fraction=1):
+            self.client.get('/api/docs/')
+            self.assertEqual(get_profiler().seen, 0)
+
+    def test_not_configured(self):
+        with override_settings(MIDDLEWARE=self.middleware, FUNDS_PROFILING=None):
+            self.assertEqual(self.post_load(1).status_code, 200)
+            self.assertIsNone(get_profiler())
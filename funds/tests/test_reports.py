@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from funds.admin import ReadOnlyAdmin
+from funds.models import FundLoad
+from funds.reports import EstimatedCountPaginator, estimated_count, keyset_page
+
+
+def add_loads(count, customers=3, first=1, start=datetime(2000, 1, 3, 10, tzinfo=timezone.utc)):
+    for id in range(first, first + count):
+        FundLoad(id=id, customer_id=id % customers, load_amount='10.00', time=start + timedelta(hours=id)).save(
+            force_insert=True)
+
+
+class ReportsTestCase(TestCase):
+
+    def test_estimated_count(self):
+        self.assertIsNone(estimated_count(FundLoad))
+        add_loads(12)
+        self.assertEqual(estimated_count(FundLoad), 12)
+
+    def test_keyset_pages(self):
+        add_loads(12)
+        ids, after = [], None
+        while True:
+            rows, after = keyset_page(FundLoad.objects.all(), '-id', after, size=5)
+            ids += [load.id for load in rows]
+            if after is None:
+                break
+        self.assertEqual(ids, list(range(12, 0, -1)))
+
+    def test_paginator(self):
+        add_loads(12)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(EstimatedCountPaginator(FundLoad.objects.order_by('-id'), 5).count, 12)
+            self.assertEqual(EstimatedCountPaginator(FundLoad.objects.filter(customer_id=1).order_by('-id'), 5).count, 4)
+        self.assertNotIn('COUNT(*) AS "__count" FROM "funds_fundload"', queries[0]['sql'])
+
+
+class ReportViewsTestCase(TestCase):
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('staff', is_staff=True, is_superuser=True))
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return [query['sql'] for query in queries]
+
+    def test_fixed_query_budget(self):
+        add_loads(6)
+        with patch('funds.reports.PAGE_SIZE', 5):
+            small = self.queries(reverse('fund-loads-report'))
+            add_loads(60, first=7)
+            large = self.queries(reverse('fund-loads-report') + '?after=30')
+        self.assertEqual(len(small), len(large))
+        self.assertFalse(any('COUNT(' in sql or 'OFFSET' in sql for sql in small + large))
+
+    def test_loads_of_customer(self):
+        add_loads(12)
+        response = self.client.get(reverse('fund-loads-report'), {'customer_id': 1})
+        self.assertContains(response, '4 loads')
+        self.assertEqual(len(response.context['rows']), 4)
+
+    def test_usage(self):
+        add_loads(30, customers=1)
+        daily = self.client.get(reverse('customer-usage-report', args=[0]))
+        self.assertEqual([row[:2] for row in daily.context['rows'][:2]], [('2000-01-04', 17), ('2000-01-03', 13)])
+        weekly = self.client.get(reverse('customer-usage-report', args=[0]), {'by': 'week'})
+        self.assertEqual(weekly.context['rows'], [('2000-W01', 30, Decimal('300.00'))])
+        self.assertIsNone(weekly.context['next'])
+
+    def test_invalid_page(self):
+        self.assertEqual(self.client.get(reverse('fund-loads-report'), {'after': 'x'}).status_code, 400)
+
+    def test_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('fund-loads-report')).status_code, 302)
+
+    def test_admin_changelists(self):
+        add_loads(12)
+        for model in ('fundload', 'customerday'):
+            sql = self.queries(reverse(f'admin:funds_{model}_changelist'))
+            self.assertFalse(any(f'COUNT(*) AS "__count" FROM "funds_{model}"' in query for query in sql))
+        self.assertEqual(self.client.get(reverse('admin:funds_fundload_changelist'), {'q': '4'}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('admin:funds_fundload_changelist'), {'q': 'x'}).status_code, 200)
+
+    def test_admin_keyset_pages(self):
+        add_loads(12)
+        url = reverse('admin:funds_fundload_changelist')
+        with patch.object(ReadOnlyAdmin, 'list_per_page', 5):
+            first = self.client.get(url, {'q': '1'})
+            self.assertEqual([load.id for load in first.context['cl'].result_list], [10, 7, 4, 1])  # id 1 or customer 1
+            first = self.client.get(url)
+            self.assertEqual([load.id for load in first.context['cl'].result_list], [12, 11, 10, 9, 8])
+            self.assertContains(first, '?after=8')
+            sql = self.queries(url + '?after=3')
+            last = self.client.get(url, {'after': 3})
+        self.assertEqual([load.id for load in last.context['cl'].result_list], [2, 1])
+        self.assertIsNone(last.context['cl'].next_page_url)
+        self.assertContains(last, 'First page')
+        self.assertFalse(any('OFFSET' in query for query in sql))
+        self.assertRedirects(self.client.get(url, {'after': 'x'}), url + '?e=1', fetch_redirect_response=False)
@@ -0,0 +1,184 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+from multiprocessing import Pipe
+from threading import Thread
+from time import monotonic, sleep
+
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+
+from funds.calendars import CALENDAR
+from funds.models import FundLoad
+from funds.routing import (Coordinator, CustomerUsage, HashRing, Worker, get_router, reset_router, start_coordinator,
+                           start_worker)
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class HashRingTestCase(SimpleTestCase):
+    customers = range(1, 3001)
+
+    def owners(self, ring):
+        return {customer: ring.owner(customer) for customer in self.customers}
+
+    def test_balanced(self):
+        owners = list(self.owners(HashRing(['a', 'b', 'c'])).values())
+        for node in 'abc':
+            self.assertGreater(owners.count(node), 600)
+
+    def test_stable(self):
+        self.assertEqual(self.owners(HashRing(['a', 'b', 'c'])), self.owners(HashRing(['c', 'a', 'b'])))
+        self.assertIsNone(HashRing().owner(1))
+
+    def test_joining_node_takes_only_its_share(self):
+        before, ring = self.owners(HashRing(['a', 'b', 'c'])), HashRing(['a', 'b', 'c'])
+        ring.add('d')
+        moved = {customer for customer, node in self.owners(ring).items() if node != before[customer]}
+        self.assertEqual({ring.owner(customer) for customer in moved}, {'d'})
+        self.assertLess(len(moved), len(self.customers) / 3)
+
+    def test_leaving_node_gives_only_its_customers(self):
+        before, ring = self.owners(HashRing(['a', 'b', 'c'])), HashRing(['a', 'b', 'c'])
+        ring.remove('b')
+        moved = {customer for customer, node in self.owners(ring).items() if node != before[customer]}
+        self.assertEqual(moved, {customer for customer, node in before.items() if node == 'b'})
+        self.assertEqual(ring.nodes, {'a', 'c'})
+
+
+class CoordinatorTestCase(SimpleTestCase):
+
+    def test_membership_version(self):
+        coordinator = Coordinator()
+        self.assertEqual(coordinator.join('a', ('127.0.0.1', 1)), 1)
+        self.assertEqual(coordinator.join('b', ('127.0.0.1', 2)), 2)
+        self.assertEqual(coordinator.leave('a'), 3)
+        self.assertEqual(coordinator.leave('a'), 3)
+        self.assertEqual(coordinator.members(), (3, {'b': ('127.0.0.1', 2)}))
+
+
+class CustomerUsageTestCase(TestCase):
+
+    def test_same_totals_as_queryset(self):
+        for id, amount, day, hour in ((1, '100.00', 3, 10), (2, '200.00', 3, 11), (4, '300.00', 5, 10), (6, '400.00', 10, 10)):
+            FundLoad.objects.create(id=id, customer_id=5, load_amount=Decimal(amount),
+                                    time=datetime(2000, 1, day, hour, tzinfo=timezone.utc))
+        usage = CustomerUsage(5)
+        new = FundLoad(id=8, customer_id=5, load_amount=Decimal('50.00'), time=datetime(2000, 1, 3, 12, tzinfo=timezone.utc))
+        new.clean()
+        usage.add(new)
+        new.save()
+        loads = FundLoad.objects.filter(customer_id=5)
+        total = lambda rows: sum(amount * CALENDAR.multiplier(day) for day, amount in
+                                 rows.order_by().values_list('day').annotate(Sum('load_amount')))
+        for load in loads:
+            self.assertEqual(usage.daily_count(load), loads.filter(day=load.day).count())
+            self.assertEqual(usage.daily_total(load), total(loads.filter(day=load.day)))
+            self.assertEqual(usage.weekly_total(load), total(loads.filter(week=load.week)))
+
+
+class WorkerTestCase(TestCase):
+    """Worker with in-process coordinator, without router"""
+
+    def setUp(self):
+        self.coordinator = Coordinator()
+        self.coordinator.join('a', None)
+        self.worker = Worker('a', self.coordinator)
+
+    def load(self, id, customer):
+        return {'id': str(id), 'customer_id': str(customer), 'load_amount': '$100.00', 'time': '2000-01-04T10:00:00Z'}
+
+    def test_ownership_is_fenced_by_coordinator(self):
+        self.assertTrue(self.worker.adjudicate(self.load(10, 1))['accepted'])
+        self.coordinator.join('b', None)  # worker is not told, router may still send it loads of moved customers
+        ring = HashRing(['a', 'b'])
+        moved = next(customer for customer in range(1, 100) if ring.owner(customer) == 'b')
+        kept = next(customer for customer in range(1, 100) if ring.owner(customer) == 'a')
+        self.assertEqual(self.worker.adjudicate(self.load(12, moved)), {'moved': 2})
+        self.assertTrue(self.worker.adjudicate(self.load(14, kept))['accepted'])
+        self.assertFalse(FundLoad.objects.filter(id=12).exists())
+
+    def test_failed_message_is_answered(self):
+        router, worker = Pipe()
+        thread = Thread(target=self.worker.serve_connection, args=(worker,))
+        with self.assertLogs('funds.routing', 'ERROR'):
+            thread.start()
+            router.send({'kind': 'load'})
+            self.assertEqual(router.recv(), {'error': "KeyError('data')"})
+            router.send({'kind': 'stats'})  # connection is kept
+            self.assertEqual(router.recv()['node'], 'a')
+            router.close()
+            thread.join()
+
+
+class RoutingTestCase(FundLoadClientMixin, TransactionTestCase):
+    """Router in front of FundLoadView with local stand-in coordinator and worker processes"""
+    authkey = b'test'
+
+    def setUp(self):
+        self.coordinator = start_coordinator(authkey=self.authkey)
+        self.workers = {}
+        settings = override_settings(FUNDS_ROUTING={'coordinator': self.coordinator.address, 'authkey': 'test'})
+        settings.enable()
+        self.addCleanup(settings.disable)
+        reset_router()
+        self.addCleanup(reset_router)
+        for node in ('node-1', 'node-2'):
+            self.start(node)
+
+    def tearDown(self):
+        for process in self.workers.values():
+            process.terminate()
+            process.join()
+        self.coordinator.shutdown()
+
+    def start(self, node):
+        self.workers[node] = start_worker(node, self.coordinator.address, self.authkey)
+        self.wait(lambda nodes: node in nodes)
+
+    def stop(self, node):
+        self.workers.pop(node).terminate()
+        self.wait(lambda nodes: node not in nodes)
+
+    def wait(self, condition, timeout=10):
+        start = monotonic()
+        while not condition(self.coordinator.coordinator().members()[1]):
+            self.assertLess(monotonic() - start, timeout)
+            sleep(0.01)
+
+    def stats(self, node):
+        router = get_router()
+        router.refresh(force=True)
+        return router.send(node, {'kind': 'stats'})
+
+    def test_loads_are_adjudicated_by_owner(self):
+        for customer in range(1, 11):
+            self.assertTrue(self.post(customer * 10, '3000.00', customer))
+            self.assertFalse(self.post(customer * 10 + 2, '2500.00', customer))  # daily limit
+        self.assertEqual(FundLoad.objects.count(), 10)
+        ring = get_router().ring
+        for node in self.workers:
+            self.assertEqual(self.stats(node)['customers'], [customer for customer in range(1, 11) if ring.owner(customer) == node])
+
+    def test_rebalancing(self):
+        for customer in range(1, 11):
+            self.assertTrue(self.post(customer * 10, '3000.00', customer))
+        self.start('node-3')
+        self.stop('node-1')
+        get_router().refresh(force=True)
+        for customer in range(1, 11):  # new owners warm usage from stored loads
+            self.assertFalse(self.post(customer * 10 + 2, '2500.00', customer))
+            self.assertTrue(self.post(customer * 10 + 4, '2000.00', customer))
+        self.assertEqual(FundLoad.objects.count(), 20)
+        self.assertEqual(get_router().ring.nodes, {'node-2', 'node-3'})
+
+    def test_router_follows_membership_without_refresh(self):
+        self.assertTrue(self.post(10, customer=1))
+        owner = get_router().ring.owner(1)
+        self.stop(owner)  # router still has old ring: owner is unreachable, ring is refreshed
+        self.assertTrue(self.post(12, customer=1))
+        self.assertNotIn(owner, get_router().ring.nodes)
+
+    def test_retry_and_invalid_load(self):
+        self.assertTrue(self.post(10, customer=1))
+        self.assertTrue(self.post(10, customer=1))
+        self.assertFalse(self.post('x', customer=1))
+        self.assertEqual(FundLoad.objects.count(), 1)
@@ -0,0 +1,72 @@
+from unittest.mock import patch
+
+from django.db import transaction
+from django.test import TestCase
+
+from funds.models import FundLoad, PrimeSlot
+from funds.slots import PrimeSlots
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class PrimeSlotsTestCase(TestCase):
+
+    def setUp(self):
+        self.slots = PrimeSlots()
+
+    def test_one_slot_per_day(self):
+        self.assertTrue(self.slots.claim(10960, 1))
+        self.assertFalse(self.slots.claim(10960, 1))
+        self.assertTrue(self.slots.claim(10961, 1))
+        self.assertEqual(PrimeSlot.objects.get(day=10960).used, 1)
+
+    def test_limit(self):
+        self.assertTrue(self.slots.claim(10960, 2))
+        self.assertTrue(self.slots.claim(10960, 2))
+        self.assertFalse(self.slots.claim(10960, 2))
+        self.assertFalse(self.slots.claim(10960, 0))
+
+    def test_full_day_is_rejected_without_query(self):
+        self.slots.claim(10960, 1)
+        self.slots.claim(10960, 1)
+        with self.assertNumQueries(0):
+            self.assertFalse(self.slots.claim(10960, 1))
+
+    def test_day_taken_by_other_worker(self):
+        self.assertTrue(PrimeSlots().claim(10960, 1))
+        self.assertFalse(self.slots.claim(10960, 1))
+        self.assertEqual(self.slots.full, {10960: 1})
+
+    def test_rolled_back_claim_releases_slot(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.assertTrue(self.slots.claim(10960, 1))
+            raise RuntimeError
+        self.assertTrue(self.slots.claim(10960, 1))
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(self.slots.claim(10960, 2))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.slots.claim(10960, 2))
+        with self.assertNumQueries(1):
+            self.assertFalse(self.slots.claim(10960, 2))
+
+
+@patch.object(PrimeSlots, 'upsert_vendors', set())
+class PrimeSlotsWithoutUpsertTestCase(PrimeSlotsTestCase):
+    """Conditional update and insert for databases without INSERT ... ON CONFLICT"""
+
+    def test_single_query(self):
+        with self.assertNumQueries(1 + 3):  # update, savepoint, insert, release
+            self.assertTrue(self.slots.claim(10960, 2))
+        with self.assertNumQueries(1):
+            self.assertTrue(self.slots.claim(10960, 2))
+
+
+class PrimesPerDayTestCase(FundLoadClientMixin, TestCase):
+
+    def test_slot_is_shared_by_customers(self):
+        self.assertTrue(self.post(7, customer=1))
+        self.assertFalse(self.post(11, customer=2))
+        self.assertTrue(self.post(12, customer=2))
+        self.assertEqual(PrimeSlot.objects.get().used, 1)
+        self.assertEqual(FundLoad.objects.count(), 2)
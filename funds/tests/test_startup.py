@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from funds.tests.benchmark import benchmark_only
+
+
+class StartupTestCase(SimpleTestCase):
+    """
+    Django app loading should not pay for dependencies needed on first load only.
+    App modules are loaded by importlib.import_module, which -X importtime does not report,
+    so the budget is checked on the project URLconf that pulls funds views and forms by import statements.
+    """
+    IMPORT_BUDGET = 50_000  # microseconds, cumulative `python -X importtime` for settings.urls
+
+    def importtime(self, statement='import django; django.setup(); import settings.urls'):
+        """Returns {module: cumulative import time in us} for statement run in fresh interpreter"""
+        env = os.environ | {'DJANGO_SETTINGS_MODULE': 'settings.settings'}
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+        lines = (line.split('|') for line in result.stderr.splitlines() if line.startswith('import time:'))
+        return {name.strip(): int(cumulative) for _, cumulative, name in lines if cumulative.strip().isdigit()}
+
+    def test_setup_is_lazy(self):
+        modules = self.importtime()
+        self.assertIn('funds.forms', modules)
+        self.assertNotIn('sympy', modules)
+
+    @benchmark_only
+    def test_import_budget(self):
+        self.assertLess(min(self.importtime()['settings.urls'] for _ in range(3)), self.IMPORT_BUDGET)
@@ -0,0 +1,60 @@
+import json
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from funds.models import CustomerDay
+from funds.tests.mixins import FundLoadClientMixin
+
+
+class CustomerVelocityTestCase(FundLoadClientMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def tearDown(self):
+        cache.clear()
+
+    def get(self, date='2000-01-04', **headers):
+        return self.client.get(reverse('fund-velocity', args=[528]), {'date': date}, headers=headers)
+
+    def test_remaining_limits(self):
+        self.post('4', '1000.00')
+        self.post('6', '500.00')
+        self.post('8', '3000.00', time='2000-01-03T10:00:00Z')
+        body = json.loads(self.get().content)
+        self.assertEqual(body['daily'], {'limit': '5000.00', 'used': '1500.00', 'remaining': '3500.00'})
+        # monday load counts double
+        self.assertEqual(body['weekly'], {'limit': '20000.00', 'used': '7500.00', 'remaining': '12500.00'})
+        self.assertEqual(body['loads'], {'limit': '3', 'used': '2', 'remaining': '1'})
+        self.assertEqual(body['date'], '2000-01-04')
+        self.assertEqual(CustomerDay.objects.get(customer_id=528, day=10960).count, 2)
+
+    def test_prime_slot(self):
+        self.assertTrue(json.loads(self.get().content)['prime_slot']['available'])
+        self.post('7', '100.00')
+        cache.clear()
+        self.assertEqual(json.loads(self.get().content)['prime_slot'], {'limit': 1, 'used': 1, 'available': False})
+
+    def test_aggregates_only(self):
+        self.post('4', '1000.00')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('funds_fundload' in query['sql'] for query in queries))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 200)
+
+    def test_etag(self):
+        response = self.get()
+        self.assertIn('max-age=', response['Cache-Control'])
+        self.assertEqual(self.get(If_None_Match=response['ETag']).status_code, 304)
+        self.post('4', '1000.00')
+        cache.clear()
+        self.assertEqual(self.get(If_None_Match=response['ETag']).status_code, 200)
+
+    def test_invalid_date(self):
+        self.assertEqual(self.get(date='yesterday').status_code, 400)
@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import FundLoadView
+from .views import AdmissionView, CustomerUsageReportView, CustomerVelocityView, FundLoadView, LoadsReportView
 
 urlpatterns = [
     path('load/', FundLoadView.as_view(), name='fund-load'),
+    path('velocity/<int:customer_id>/', CustomerVelocityView.as_view(), name='fund-velocity'),
+    path('admission/', AdmissionView.as_view(), name='fund-admission'),
+    path('reports/loads/', LoadsReportView.as_view(), name='fund-loads-report'),
+    path('reports/usage/<int:customer_id>/', CustomerUsageReportView.as_view(), name='customer-usage-report'),
 ]
\ No newline at end of file
@@ -0,0 +1,36 @@
+import json
+from hashlib import blake2b
+from types import SimpleNamespace
+
+from .limits import RULES
+from .models import CustomerUsage, PrimeSlot
+
+
+def remaining(limit, used):
+    return {'limit': str(limit), 'used': str(used), 'remaining': str(max(limit - used, 0))}
+
+
+def velocity(customer_id, day):
+    """
+    Remaining limits of customer on epoch-day, same values as validators compute for a new load of the day:
+    daily and weekly amount (days counted with multipliers of customer rules), loads count and prime slot.
+    Read from CustomerDay and PrimeSlot aggregates, two queries, FundLoad rows are not touched.
+    """
+    rules = RULES.for_customer(customer_id)
+    probe = SimpleNamespace(day=day)
+    usage = CustomerUsage(customer_id, rules.calendar.week(day))
+    primes = PrimeSlot.objects.filter(day=day).values_list('used', flat=True).first() or 0
+    return {
+        'customer_id': customer_id,
+        'date': rules.calendar.date(day).isoformat(),
+        'config_version': rules.version,
+        'daily': remaining(rules.daily, usage.daily_total(probe, calendar=rules.calendar)),
+        'weekly': remaining(rules.weekly, usage.weekly_total(probe, calendar=rules.calendar)),
+        'loads': remaining(rules.loads_per_day, usage.daily_count(probe)),
+        'prime_slot': {'limit': rules.primes_per_day, 'used': primes, 'available': primes < rules.primes_per_day},
+    }
+
+
+def etag(body):
+    """Strong ETag of response body, equal bodies have equal tags"""
+    return '"{}"'.format(blake2b(json.dumps(body, sort_keys=True).encode(), digest_size=16).hexdigest())
@@ -1,43 +1,238 @@
-from django.http import JsonResponse
-from django.views.generic import CreateView
+from datetime import date
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import cache
+from django.db import OperationalError
+from django.db.models import F, Sum
+from django.http import Http404, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse
+from django.shortcuts import render
+from django.urls import reverse
+from django.views.generic import View
+from django.utils.cache import patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import parse_etags
+from django.utils.timezone import now
 from django.views.decorators.csrf import csrf_exempt
 import json
 
+from .admission import get_admission
+from .calendars import CALENDAR
+from .decision_log import get_decision_log
+from .forms import adjudicate
+from .idempotency import DECISIONS, decision_key
+from .models import CustomerDay, FundLoad
+from .profiling import stage
+from .reports import estimated_count, keyset_page
+from .routing import get_router
+from .velocity import etag, velocity
+
 @method_decorator(csrf_exempt, name='dispatch')
 class FundLoadView(View):
     """
     Process a fund load request.
 
-    This is a placeholder implementation that will be replaced with your actual logic.
-    The tests will guide the implementation of the velocity limits and other requirements.
+    Load is adjudicated by FundLoadForm validators, accepted loads are stored.
+    Retried load (same id and customer) gets its original decision without validation.
+    Every decision is recorded by decision log in background.
+    With FUNDS_ROUTING setting load is adjudicated by worker process owning its customer, see funds.routing.
+    Overload is shed before the view by opt-in funds.admission.AdmissionMiddleware.
+    Stages of sampled requests are profiled by opt-in funds.profiling.ProfilingMiddleware.
     """
 
     def post(self, request, *args, **kwargs):
         try:
             # Parse the request body
-            data = json.loads(request.body)
+            with stage('parse'):
+                data = json.loads(request.body)
 
             # Extract the relevant fields
             load_id = data.get('id')
             customer_id = data.get('customer_id')
-            load_amount = data.get('load_amount')
-            time = data.get('time')
 
-            # This is where your implementation will go to check the velocity limits
-            # For now, we'll just return a placeholder response
+            # Retry returns original decision, new load is checked against velocity limits
+            key = decision_key(data)
+            accepted = DECISIONS.get(key) if key else None
+            decision = {'retry': accepted is not None}
+            if accepted is None:
+                accepted = self.adjudicate(data, decision)
+                if key:
+                    DECISIONS.add(key, accepted)
+            with stage('record'):
+                self.record(key, accepted, decision)
 
             # Return a response
-            return JsonResponse({
-                'id': load_id,
-                'customer_id': customer_id,
-                'accepted': True  # This will be determined by your implementation
-            })
+            with stage('serialize'):
+                return JsonResponse({
+                    'id': load_id,
+                    'customer_id': customer_id,
+                    'accepted': accepted
+                })
 
         except json.JSONDecodeError:
             return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        except OperationalError:  # database is locked or unavailable, client retries later
+            return JsonResponse({'error': 'Service unavailable'}, status=503, headers={'Retry-After': '1'})
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
+    def adjudicate(self, data, decision):
+        """Load is adjudicated by worker owning its customer when routing is configured, else in this process"""
+        router = get_router()
+        if router:
+            return router.adjudicate(data, decision)
+        return adjudicate(data, decision)
+
+    def record(self, key, accepted, decision):
+        log = get_decision_log()
+        if log:
+            load_id, customer_id = key or (None, None)
+            log.record(decision | {'load_id': load_id, 'customer_id': customer_id, 'accepted': accepted})
+
     def get(self, request, *args, **kwargs):
         return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+
+class CustomerVelocityView(View):
+    """
+    Remaining daily and weekly amount, loads count and prime slot availability of customer, see funds.velocity.
+    Day is given by `date` query parameter (YYYY-MM-DD), today by default.
+    Result is cached for FUNDS_VELOCITY_TTL seconds and revalidated by ETag: matching If-None-Match gets 304.
+    """
+
+    def get(self, request, customer_id, *args, **kwargs):
+        try:
+            day = CALENDAR.day(date.fromisoformat(request.GET['date']) if 'date' in request.GET else now())
+        except ValueError:
+            return JsonResponse({'error': 'Invalid date'}, status=400)
+        ttl = getattr(settings, 'FUNDS_VELOCITY_TTL', 2)
+        key = f'funds-velocity:{customer_id}:{day}'
+        cached = cache.get(key)
+        if cached is None:
+            body = velocity(customer_id, day)
+            cached = body, etag(body)
+            cache.set(key, cached, ttl)
+        body, tag = cached
+        if tag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = JsonResponse(body)
+        response['ETag'] = tag
+        patch_cache_control(response, max_age=ttl)
+        return response
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class AdmissionView(View):
+    """Staff page: concurrency limit, in-flight, waiting, admitted and shed requests of funds.admission controller"""
+
+    def get(self, request, *args, **kwargs):
+        admission = get_admission()
+        if admission is None:
+            raise Http404('Admission control is not configured')
+        return JsonResponse(admission.stats())
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class ReportView(View):
+    """
+    Staff report page. Rows are read by keyset pagination, next page link carries key of last row (?after=),
+    so every page costs the same fixed number of queries however large the table is.
+    """
+    template_name = 'funds/report.html'
+    title = ''
+    columns = ()
+    key = '-id'
+
+    def get(self, request, *args, **kwargs):
+        try:
+            after = int(request.GET['after']) if 'after' in request.GET else None
+            queryset = self.get_queryset(request, *args, **kwargs)
+        except ValueError:
+            return HttpResponseBadRequest('Invalid report parameters')
+        rows, last = keyset_page(queryset, self.key, after)
+        params = request.GET.copy()
+        params.pop('after', None)
+        first = f'?{params.urlencode()}' if after is not None else None
+        params['after'] = last
+        context = {
+            **admin.site.each_context(request),
+            'title': self.title,
+            'columns': self.columns,
+            'rows': [self.row(row) for row in rows],
+            'total': self.total(request, *args, **kwargs),
+            'links': self.links(request, *args, **kwargs),
+            'first': first,
+            'next': None if last is None else f'?{params.urlencode()}',
+        }
+        return render(request, self.template_name, context)
+
+    def get_queryset(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    def row(self, obj):
+        raise NotImplementedError
+
+    def total(self, request, *args, **kwargs):
+        return None
+
+    def links(self, request, *args, **kwargs):
+        return ()
+
+
+class LoadsReportView(ReportView):
+    """
+    Stored loads newest first, all or of one customer (?customer_id=).
+    Total is estimated from database statistics or read from CustomerDay aggregates of customer, never counted.
+    """
+    title = 'Fund loads'
+    columns = ('id', 'customer', 'amount', 'time', 'prime', 'config version')
+
+    def get_queryset(self, request, *args, **kwargs):
+        loads = FundLoad.objects.only('id', 'customer_id', 'load_amount', 'time', 'is_prime', 'config_version')
+        if 'customer_id' in request.GET:
+            loads = loads.filter(customer_id=int(request.GET['customer_id']))
+        return loads
+
+    def row(self, load):
+        return load.id, load.customer_id, load.load_amount, load.time, load.is_prime, load.config_version
+
+    def total(self, request, *args, **kwargs):
+        if 'customer_id' in request.GET:
+            days = CustomerDay.objects.filter(customer_id=int(request.GET['customer_id']))
+            return f"{days.aggregate(loads=Sum('count'))['loads'] or 0} loads"
+        count = estimated_count(FundLoad)
+        return None if count is None else f'About {count} loads'
+
+
+class CustomerUsageReportView(ReportView):
+    """Loads count and amount of customer per day, newest first, or per week with ?by=week, read from CustomerDay"""
+    columns = ('period', 'loads', 'amount')
+
+    def get_queryset(self, request, customer_id, *args, **kwargs):
+        days = CustomerDay.objects.filter(customer_id=customer_id)
+        if self.weekly(request):
+            return days.values('week').annotate(loads=Sum('count'), total=Sum('amount'))
+        return days.values('day', loads=F('count'), total=F('amount'))
+
+    @property
+    def key(self):
+        return '-week' if self.weekly(self.request) else '-day'
+
+    @property
+    def title(self):
+        return f"{'Weekly' if self.weekly(self.request) else 'Daily'} usage of customer {self.kwargs['customer_id']}"
+
+    def weekly(self, request):
+        return request.GET.get('by') == 'week'
+
+    def row(self, usage):
+        if 'week' in usage:
+            period = f"{usage['week'] // 100}-W{usage['week'] % 100:02}"
+        else:
+            period = CALENDAR.date(usage['day']).isoformat()
+        return period, usage['loads'], usage['total']
+
+    def links(self, request, customer_id, *args, **kwargs):
+        url = reverse('customer-usage-report', args=[customer_id])
+        return ('Daily', url), ('Weekly', f'{url}?by=week'), ('Loads', f"{reverse('fund-loads-report')}?customer_id={customer_id}")
@@ -78,6 +78,7 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},  # file, so forked routing workers share test database
     }
 }
 
@@ -123,5 +124,32 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Every fund load decision is written in background by funds.decision_log, sink is 'file' or 'db' (LoadDecision table)
+FUNDS_DECISION_LOG = {
+    'sink': 'file',
+    'path': BASE_DIR / 'logs' / 'decisions.jsonl',
+    'batch': 1024,
+    'interval': 1.0,
+}
+
+# Tests write file decision log into temporary folder, see funds.tests.runner
+TEST_RUNNER = 'funds.tests.runner.TestRunner'
+
+# Consistent-hash routing of loads to worker processes owning customers, see funds.routing, None is no routing:
+# FUNDS_ROUTING = {'coordinator': ('127.0.0.1', 7700), 'authkey': 'secret', 'interval': 1.0}
+FUNDS_ROUTING = None
+
+# Seconds velocity API (funds/velocity/<customer_id>/) caches remaining limits of customer day
+FUNDS_VELOCITY_TTL = 2
+
+# Adaptive concurrency limit of fund load requests, see funds.admission, needs 'funds.admission.AdmissionMiddleware'
+# in MIDDLEWARE, state is served by funds/admission/:
+# FUNDS_ADMISSION = {'initial': 20, 'maximum': 200, 'target': 0.05, 'queue': 50, 'queue_timeout': 0.1, 'urls': ['fund-load']}
+FUNDS_ADMISSION = None
+
+# Profiling of sampled fund load requests, see funds.profiling, needs 'funds.profiling.ProfilingMiddleware' in MIDDLEWARE:
+# FUNDS_PROFILING = {'path': BASE_DIR / 'logs' / 'profile.txt', 'fraction': 0.01, 'traced': False, 'urls': ['fund-load']}
+FUNDS_PROFILING = None
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / MEDIA_URL.strip('/')